@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+# bench_failover.py
+
+# Measures leader failover in a cluster of raft.Server processes on
+# this machine, talking over ZeroMQ, with --latency milliseconds added
+# to every message between them (see raft.ZmqTransport).
+#
+# Each run waits for a leader, and lets the cluster run for --warmup
+# seconds, so that the servers can measure their round trips (see
+# raft.Timing). Then it kills the leader, and asks the others for their
+# metrics (raft.Server.metrics) until a majority follows a new one. The
+# killed server is restarted for the next run.
+#
+# Reported for each run are the failover time seen from outside, the
+# slowest failover reported by the servers themselves (from last
+# hearing the old leader to following the new one), the heartbeat
+# interval the leader had settled on, and the election timeout a
+# follower had derived from it. The first election, on a cold start,
+# is timed as well.
+#
+#     $ ./bench_failover.py --nodes 5 --runs 10 --latency 5 15
+#     $ ./bench_failover.py --nodes 5 --runs 10 --latency 5 15 --fixed-timing --no-prevote
+
+import argparse
+import multiprocessing
+import statistics
+import sys
+import time
+
+import zmq
+
+import raft
+
+POLL_INTERVAL = 0.005
+
+
+def run_server(addr, peers, latency, adaptive, prevote):
+    transport = raft.ZmqTransport(addr, latency)
+    raft.Server(addr, peers, transport=transport, verbose=False,
+                adaptive=adaptive, prevote=prevote).run()
+
+
+class Cluster:
+    """Server processes, and a REQ socket to each for Metrics requests"""
+
+    def __init__(self, addrs, latency, adaptive, prevote):
+        self.addrs = addrs
+        self.options = (latency, adaptive, prevote)
+        self.processes = {}
+        self.socks = {}
+        self.ctx = zmq.Context.instance()
+        for addr in addrs:
+            self.start(addr)
+
+    def start(self, addr):
+        peers = [peer for peer in self.addrs if peer != addr]
+        process = multiprocessing.Process(target=run_server, args=(addr, peers, *self.options),
+                                          daemon=True)
+        process.start()
+        self.processes[addr] = process
+
+    def kill(self, addr):
+        self.processes.pop(addr).kill()
+        self.forget(addr)
+
+    def forget(self, addr):
+        sock = self.socks.pop(addr, None)
+        if sock:
+            sock.close(linger=0)
+
+    def metrics(self, addr, timeout=0.5):
+        sock = self.socks.get(addr)
+        if sock is None:
+            sock = self.socks[addr] = self.ctx.socket(zmq.REQ)
+            sock.setsockopt(zmq.RCVTIMEO, int(timeout * 1000))
+            sock.connect(addr)
+        sock.send_json({"type": "Metrics"})
+        try:
+            return sock.recv_json()
+        except zmq.Again:
+            self.forget(addr)   # a REQ socket can't send again until it hears back
+            return None
+
+    def leader(self):
+        """Metrics of the leader of the highest term, if a majority follows it"""
+        metrics = [m for m in map(self.metrics, self.processes) if m]
+        leaders = [m for m in metrics if m["state"] == "leader"]
+        if not leaders:
+            return None
+        leader = max(leaders, key=lambda m: m["term"])
+        followers = sum(1 for m in metrics
+                        if m["term"] == leader["term"] and m["leader"] == leader["addr"])
+        return leader if followers > len(self.addrs) // 2 else None
+
+    def follower(self, leader):
+        """Metrics of a server following leader, if any"""
+        for addr in self.processes:
+            metrics = self.metrics(addr) if addr != leader["addr"] else None
+            if metrics and metrics["leader"] == leader["addr"] and metrics["term"] == leader["term"]:
+                return metrics
+        return None
+
+    def wait_for_leader(self, timeout, old=None):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            leader = self.leader()
+            if leader and leader["addr"] != old:
+                return leader
+            time.sleep(POLL_INTERVAL)
+        return None
+
+    def close(self):
+        for addr in list(self.processes):
+            self.kill(addr)
+
+
+def summarize(name, unit, values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        print(f'{name:>18}: no successful runs')
+        return
+    print(f'{name:>18}: mean {statistics.mean(values):.3f} {unit}, '
+          f'p50 {values[len(values) // 2]:.3f}, max {values[-1]:.3f}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--nodes', type=int, default=5)
+    parser.add_argument('-r', '--runs', type=int, default=10)
+    parser.add_argument('--latency', type=float, nargs=2, default=[5, 15],
+                        metavar=('MIN', 'MAX'), help='one-way latency in ms')
+    parser.add_argument('--warmup', type=float, default=3.0,
+                        help='seconds to let the cluster run before killing its leader')
+    parser.add_argument('--fixed-timing', action='store_true',
+                        help='fixed heartbeat interval and election timeouts')
+    parser.add_argument('--no-prevote', action='store_true')
+    parser.add_argument('-p', '--port', type=int, default=9700)
+    args = parser.parse_args()
+
+    addrs = [f'tcp://127.0.0.1:{args.port + i}' for i in range(args.nodes)]
+    latency = tuple(ms / 1000 for ms in args.latency) if max(args.latency) > 0 else None
+    start = time.perf_counter()
+    cluster = Cluster(addrs, latency, not args.fixed_timing, not args.no_prevote)
+
+    failovers, reported, heartbeats, timeouts = [], [], [], []
+    try:
+        if cluster.wait_for_leader(30):
+            print(f'first election: {time.perf_counter() - start:.3f} s')
+        for run in range(args.runs):
+            if not cluster.wait_for_leader(30):
+                print(f'run {run}: no leader')
+                continue
+            time.sleep(args.warmup)
+            old = cluster.leader()
+            follower = old and cluster.follower(old)
+            if follower is None:
+                print(f'run {run}: lost the leader while warming up')
+                continue
+            timeout = follower["election_timeout"]
+
+            cluster.kill(old["addr"])
+            start = time.perf_counter()
+            new = cluster.wait_for_leader(30, old["addr"])
+            if new is None:
+                print(f'run {run}: no new leader')
+            else:
+                failovers.append(time.perf_counter() - start)
+                # give the last followers time to hear from the new leader
+                time.sleep(timeout)
+                seen = [m["failovers"][-1] for m in map(cluster.metrics, cluster.processes)
+                        if m and m["failovers"] and m["term"] > old["term"]]
+                reported.append(max(seen) if seen else None)
+                heartbeats.append(old["heartbeat_interval"])
+                timeouts.append(timeout)
+                print(f'run {run}: {failovers[-1]:.3f} s, heartbeat {old["heartbeat_interval"]:.3f} s, '
+                      f'election timeout {timeout:.3f} s')
+            cluster.start(old["addr"])
+    finally:
+        cluster.close()
+
+    print(f'{args.runs} runs of {args.nodes} nodes, '
+          f'{args.latency[0]:g}-{args.latency[1]:g} ms one-way latency')
+    summarize('failover', 's', failovers)
+    summarize('reported failover', 's', reported)
+    summarize('heartbeat', 's', heartbeats)
+    summarize('election timeout', 's', timeouts)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
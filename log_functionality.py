@@ -1,20 +1,42 @@
+from enum import Enum
+
+
 class Operation(Enum):
     take = 0
     write = 1
+    # appended by a new leader, so that it can commit (and then serve
+    # reads) before any client writes; never applied to the state machine
+    noop = 2
 
 
-# TODO
 class LogEntry:
     """ An entry in our replicated, distributed log
 
     LogEntries include the current term number and the command to be
-    replicated to the StateMachine
+    replicated to the StateMachine. The optional request_id lets the
+    state machine recognize a command that a client retried after a
+    leader change, so that it is only ever applied once.
 
     """
-    def __init__(self, term, operation, payload):
+    def __init__(self, term, operation, payload, request_id=None):
         self.current_term = term
         self.event_type = Operation(operation)
         self.payload = payload
+        self.request_id = request_id
+
+    def to_dict(self):
+        """Converts the entry into a dictionary that can be sent as JSON"""
+        return { "term": self.current_term,
+                 "operation": self.event_type.value,
+                 "payload": self.payload,
+                 "request_id": self.request_id
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        """Rebuilds an entry received from the network"""
+        return cls(d["term"], d["operation"], d["payload"], d.get("request_id"))
+
 
 # TODO
 class Log:
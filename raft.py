@@ -1,10 +1,431 @@
 #!/usr/bin/env python3
 
+import collections
+import functools
+import heapq
+import itertools
+import json
+import os
 import random
 import sys
-import threading
+import time
 import zmq
 
+from log_functionality import LogEntry, Operation
+
+# interval between leader heartbeats, in seconds, until round trips to
+# the followers have been measured (see Timing), and the longest one
+HEARTBEAT_INTERVAL = 0.5
+
+# shortest heartbeat interval; adaptive intervals are this times a
+# power of two, so that leaders with similar round trips beat together
+MIN_HEARTBEAT_INTERVAL = 0.01
+
+# heartbeat interval, in round trips to the slowest follower
+HEARTBEAT_RTTS = 2
+
+# heartbeats a follower may miss before calling an election; the
+# election timeout is chosen in [T, 2T), with T this many heartbeat
+# intervals plus a round trip to the leader
+ELECTION_HEARTBEATS = 3
+
+# round trips remembered for each peer, and how many are needed before
+# they are used; timing is derived from the 99th percentile
+RTT_SAMPLES = 64
+MIN_RTT_SAMPLES = 3
+RTT_PERCENTILE = 0.99
+
+# most recent failover times kept for metrics()
+FAILOVER_SAMPLES = 100
+
+# seconds to wait before applying an entry again, after the state
+# machine failed to apply it
+APPLY_RETRY_INTERVAL = 1.0
+
+# most log entries shipped to a follower in a single AppendEntries
+MAX_ENTRIES_PER_MESSAGE = 64
+
+# how many request ids (and their results) we remember for spotting
+# client retries of commands that were already applied
+MAX_REMEMBERED_REQUESTS = 10000
+
+# applied entries kept in the log before they are replaced by a
+# snapshot of the state machine
+SNAPSHOT_ENTRIES = 1000
+
+# operations a ClientRequest may carry; reads aren't logged
+READ_OPERATIONS = ("read", "rdall")
+WRITE_OPERATIONS = ("take", "write")
+
+
+class Clock:
+    """ Timers ordered by deadline, run on the server's thread of control
+
+    now() is the monotonic wall clock; the simulator in raftsim.py
+    replaces it with a virtual one.
+
+    """
+    def __init__(self):
+        self.timers = []
+        self.timer_seq = itertools.count()
+
+    def now(self):
+        return time.monotonic()
+
+    def call_later(self, delay, callback):
+        """ Schedule callback to run after delay seconds
+
+        Returns a handle which can be passed to cancel()
+
+        """
+        timer = [self.now() + delay, next(self.timer_seq), callback]
+        heapq.heappush(self.timers, timer)
+        return timer
+
+    def cancel(self, timer):
+        if timer:
+            timer[2] = None
+
+    def next_deadline(self):
+        """ Time of the earliest pending timer, or None """
+        while self.timers and self.timers[0][2] is None:
+            heapq.heappop(self.timers)
+        return self.timers[0][0] if self.timers else None
+
+    def run_due(self):
+        now = self.now()
+        while self.timers and self.timers[0][0] <= now:
+            _, _, callback = heapq.heappop(self.timers)
+            if callback:
+                callback()
+
+
+class ZmqTransport:
+    """ Delivers Raft messages between servers over ZeroMQ
+
+    Every server, peer or client, sends its requests to our ROUTER
+    socket. We keep one DEALER socket per peer for our outgoing
+    messages.
+
+    Messages for the same peer are held until the loop has handled
+    everything that is ready, then sent together as one Batch. With
+    several Raft groups in one process (see MultiServer), this is what
+    lets their heartbeats share a single message per peer.
+
+    latency, if given, is a (min, max) range of seconds by which to
+    delay every message to a peer, to try out a slower network on one
+    machine. As over TCP, messages on the same link stay in order.
+
+    """
+    def __init__(self, addr, latency=None):
+        self.ctx = zmq.Context.instance()
+        self.router = self.ctx.socket(zmq.ROUTER)
+        self.router.bind(addr)
+        self.dealers = {}
+        self.outbox = {}
+        self.latency = latency
+        self.clock = None
+        self.arrivals = {}
+        self.random = random.Random()
+
+    def send(self, peer, message):
+        self.outbox.setdefault(peer, []).append(message)
+
+    def flush(self):
+        for peer, messages in self.outbox.items():
+            if len(messages) == 1:
+                message = messages[0]
+            else:
+                message = {"type": "Batch", "messages": messages}
+            if self.latency:
+                self.send_later(peer, message)
+            else:
+                self.send_now(peer, message)
+        self.outbox = {}
+
+    def send_later(self, peer, message):
+        now = self.clock.now()
+        arrival = max(now + self.random.uniform(*self.latency),
+                      self.arrivals.get(peer, 0))
+        self.arrivals[peer] = arrival
+        self.clock.call_later(arrival - now, functools.partial(self.send_now, peer, message))
+
+    def send_now(self, peer, message):
+        """ Send a one-way message to a peer, dropping it if the peer is
+        not keeping up
+
+        """
+        sock = self.dealers.get(peer) or self.connect(peer)
+        try:
+            sock.send_json(message, zmq.NOBLOCK)
+        except zmq.Again:
+            pass  # Raft tolerates lost messages, the next heartbeat retries
+
+    def connect(self, peer):
+        sock = self.ctx.socket(zmq.DEALER)
+        sock.setsockopt(zmq.LINGER, 0)
+        sock.setsockopt(zmq.SNDHWM, 1000)
+        # drop, rather than queue, messages to a peer that is down:
+        # replies to them would arrive long after they matter, and
+        # look like very slow round trips. Connecting takes a moment,
+        # so serve() connects to every peer before sending anything.
+        sock.setsockopt(zmq.IMMEDIATE, 1)
+        sock.connect(peer)
+        self.dealers[peer] = sock
+        return sock
+
+    def serve(self, server):
+        """ The server loop: wait for the next message or timer, and
+        handle it
+
+        """
+        self.clock = server.clock
+        for peer in server.peers:
+            if peer not in self.dealers:
+                self.connect(peer)
+        poller = zmq.Poller()
+        poller.register(self.router, zmq.POLLIN)
+
+        while True:
+            timeout = None
+            deadline = server.clock.next_deadline()
+            if deadline is not None:
+                timeout = max(0, deadline - server.clock.now()) * 1000
+            if poller.poll(timeout):
+                while True:
+                    try:
+                        frames = self.router.recv_multipart(zmq.NOBLOCK)
+                    except zmq.Again:
+                        break
+                    self.receive(server, frames)
+            server.clock.run_due()
+            self.flush()
+
+    def receive(self, server, frames):
+        """ Dispatch a message received on the ROUTER socket
+
+        The last frame is the JSON body; everything before it is the
+        routing envelope we need to answer a client.
+
+        """
+        envelope, body = frames[:-1], frames[-1]
+        try:
+            message = json.loads(body)
+        except ValueError:
+            return
+
+        if message.get("type") == "Batch":
+            for m in message["messages"]:
+                server.handle_message(m)
+            return
+
+        def reply(response):
+            self.router.send_multipart(envelope + [json.dumps(response).encode()])
+
+        server.handle_message(message, reply)
+
+
+class Timing:
+    """ Heartbeat interval and election timeout, derived from the round
+    trips measured to each peer
+
+    Every AppendEntries, RequestVotes and PreVote carries the time it
+    was sent, which the reply echoes, so the sender can time the round
+    trip on its own clock. The leader beats every HEARTBEAT_RTTS round
+    trips to its slowest follower, and tells each follower that
+    interval and the round trip to it, from which the follower sets its
+    election timeout (see follow()).
+
+    Until enough round trips have been measured, and always with
+    adaptive=False, the fixed HEARTBEAT_INTERVAL is used, and elections
+    time out after 1.5 to 3 seconds.
+
+    """
+    def __init__(self, adaptive=True):
+        self.adaptive = adaptive
+        self.rtts = {}  # peer -> most recent round trips
+        self.heartbeat = HEARTBEAT_INTERVAL
+        self.election_base = ELECTION_HEARTBEATS * HEARTBEAT_INTERVAL
+
+    def sample(self, peer, rtt):
+        if rtt > ELECTION_HEARTBEATS * HEARTBEAT_INTERVAL:
+            return  # held up somewhere, not a round trip worth adapting to
+        samples = self.rtts.get(peer)
+        if samples is None:
+            samples = self.rtts[peer] = collections.deque(maxlen=RTT_SAMPLES)
+        samples.append(rtt)
+
+    def rtt(self, peer):
+        """ The RTT_PERCENTILE round trip to peer, or None if it has not
+        been measured enough
+
+        """
+        samples = self.rtts.get(peer)
+        if samples is None or len(samples) < MIN_RTT_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(RTT_PERCENTILE * len(ordered)))]
+
+    def lead(self):
+        """ The heartbeat interval for the followers measured so far """
+        rtts = [rtt for rtt in map(self.rtt, self.rtts) if rtt is not None]
+        if self.adaptive and rtts:
+            interval = MIN_HEARTBEAT_INTERVAL
+            while interval < HEARTBEAT_RTTS * max(rtts) and interval < HEARTBEAT_INTERVAL:
+                interval *= 2
+            self.heartbeat = min(interval, HEARTBEAT_INTERVAL)
+        else:
+            self.heartbeat = HEARTBEAT_INTERVAL
+        return self.heartbeat
+
+    def follow(self, heartbeat, rtt):
+        """ Time out after missing ELECTION_HEARTBEATS heartbeats of a
+        leader that beats every heartbeat seconds, rtt away
+
+        """
+        if self.adaptive and heartbeat:
+            self.heartbeat = heartbeat
+            self.election_base = ELECTION_HEARTBEATS * heartbeat + (rtt or 0)
+
+    def election_timeout(self, rng):
+        return self.election_base * (1 + rng.random())
+
+
+class DiskStorage:
+    """ Keeps a server's persistent state (term, vote, snapshot and log)
+    in a directory, so that it survives a restart
+
+    The term and vote are rewritten whole (state.json), and so is the
+    latest snapshot (snapshot.json); the log is a file of JSON entries
+    after the snapshot, one per line (log.jsonl), appended to, and cut
+    short when a leader overwrites entries that never committed. Every
+    change is on disk (fsync) before the server sends anything that
+    depends on it.
+
+    Each line carries the index of its entry, so that entries already
+    in the snapshot are skipped if the server stopped between saving a
+    snapshot and rewriting the log without them.
+
+    A restarted server restores its state machine from the snapshot,
+    then applies the rest of its log, so its state machine must start
+    out empty.
+
+    """
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.state_path = os.path.join(directory, 'state.json')
+        self.snapshot_path = os.path.join(directory, 'snapshot.json')
+        self.log_path = os.path.join(directory, 'log.jsonl')
+        self.offsets = []   # where each entry starts in the log file
+        self.base = 0       # index of the last entry in the snapshot
+
+    def load(self):
+        """ The saved (term, voted_for, snapshot, log); snapshot is None
+        if there is none yet
+
+        """
+        term, voted_for = 0, None
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                state = json.load(f)
+            term, voted_for = state["term"], state["voted_for"]
+
+        snapshot = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            self.base = snapshot["idx"]
+
+        log = []
+        self.log_file = open(self.log_path, 'ab+')
+        self.log_file.seek(0)
+        offset = 0
+        for line in self.log_file:
+            if not line.endswith(b'\n'):
+                break       # cut off by a crash while it was written
+            entry = json.loads(line)
+            if entry.get("idx", len(log) + 1) > self.base:
+                log.append(LogEntry.from_dict(entry))
+                self.offsets.append(offset)
+            offset += len(line)
+        self.log_file.truncate(offset)
+        return term, voted_for, snapshot, log
+
+    def save_vote(self, term, voted_for):
+        self.replace(self.state_path, {"term": term, "voted_for": voted_for})
+
+    def replace(self, path, value):
+        """ Write value to path as JSON, all at once """
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(value, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+
+    def save_snapshot(self, snapshot, log):
+        """ Save snapshot, and replace the log with log, the entries
+        after it
+
+        """
+        self.replace(self.snapshot_path, snapshot)
+        self.base = snapshot["idx"]
+        self.offsets = []
+
+        temporary = f'{self.log_path}.tmp'
+        with open(temporary, 'wb') as f:
+            self.offsets = self.write_entries(f, log, 0)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.log_path)
+        self.log_file.close()
+        self.log_file = open(self.log_path, 'ab+')
+
+    def write_entries(self, f, entries, offset):
+        """ Write entries to f, from offset on, returning their offsets """
+        offsets = []
+        idx = self.base + len(self.offsets) + 1
+        for entry in entries:
+            record = entry.to_dict()
+            record["idx"] = idx
+            line = (json.dumps(record) + '\n').encode()
+            offsets.append(offset)
+            offset += len(line)
+            idx += 1
+            f.write(line)
+        return offsets
+
+    def append(self, entries):
+        offset = self.log_file.seek(0, os.SEEK_END)
+        self.offsets.extend(self.write_entries(self.log_file, entries, offset))
+        self.log_file.flush()
+        os.fsync(self.log_file.fileno())
+
+    def truncate(self, length):
+        """ Drop every entry after the first length """
+        if length < len(self.offsets):
+            self.log_file.truncate(self.offsets[length])
+            del self.offsets[length:]
+            self.log_file.flush()
+            os.fsync(self.log_file.fileno())
+
+
+def invalid_request(req):
+    """ Why a ClientRequest can't be served, or None if it can
+
+    Requests come from any client, so a malformed one is answered with
+    an error rather than allowed to raise in the server's loop.
+
+    """
+    operation = req.get("operation")
+    if operation not in READ_OPERATIONS + WRITE_OPERATIONS:
+        return f'unknown operation {operation!r}'
+    if "payload" not in req:
+        return 'missing payload'
+    if not isinstance(req.get("id"), (str, int, type(None))):
+        return f'invalid request id {req["id"]!r}'
+    return None
+
 
 class Server:
     """The default server in a Raft cluster
@@ -14,16 +435,55 @@ class Server:
     cluster.
 
     When first initialized, nodes start off in the Follower state, and
-    spawn a thread for handling a randomized election timer. If the
-    Follower node does not receive a heartbeat response before the
-    thread's timer expires, then the node will transistion into the
-    Candidate state and solicit it's peers for votes. If the node
-    receives a majority of affirmative votes from its peers, then it
-    is promoted to Leader and begins sending its own heartbeat.
+    arm a randomized election timer. If the Follower node does not
+    receive a heartbeat before the timer expires, then the node will
+    transistion into the Candidate state and solicit it's peers for
+    votes. If the node receives a majority of affirmative votes from
+    its peers, then it is promoted to Leader and begins sending its
+    own heartbeat.
+
+    Every server runs on a single thread of control (see run()): all
+    messages and timers are handled one at a time by the same loop, so
+    none of the state below needs to be locked.
+
+    Messages between servers are one-way JSON objects, each carrying
+    the sender's address in "addr". Replies (RequestVotesReply,
+    PreVoteReply, AppendEntriesReply) are ordinary messages sent back
+    to that address, rather than responses on the same socket.
+
+    Messages travel over the transport (ZmqTransport unless given) and
+    timers run on the clock (Clock unless given); raftsim.py swaps both
+    for in-memory versions to simulate a cluster in one process.
+
+    Heartbeat intervals and election timeouts follow the round trips
+    measured between servers (see Timing), unless adaptive=False.
+
+    With prevote=True, a server whose election timer expires first asks
+    its peers whether they would vote for it (PreVote), without
+    changing its term, and only calls an election once a majority
+    would. A server that has heard from a leader within the minimum
+    election timeout refuses both PreVote and RequestVotes, so a server
+    that was cut off, and rejoins, does not force out a working leader.
+
+    A new leader appends a no-op entry of its own term, which commits
+    whatever earlier leaders left uncommitted. Reads are answered by
+    the leader, without being logged, once that entry is committed and
+    a majority has acknowledged an AppendEntries sent after the read
+    arrived (a read index), so a deposed leader cannot answer them
+    from stale state.
+
+    Once snapshot_entries entries have been applied since the last
+    snapshot, and the state machine can take snapshots, the server
+    replaces them with a snapshot of the state machine. A follower
+    that needs entries the leader has already replaced is sent its
+    snapshot instead (InstallSnapshot), so that a restarted or new
+    server catches up in time proportional to the state, not to
+    everything ever written.
 
     ----------------------------------------------------------------------
 
-    Persistent state on all servers:
+    Persistent state on all servers (kept on disk with storage, a
+    DiskStorage, and only in memory without one):
 
     current_term : latest TERM server has seen (initialized to 0,
     increases monotonically
@@ -32,7 +492,10 @@ class Server:
 
     log[] : the log entries, each entry contains a COMMAND for the
     state machine, as well as the term when received by the leader
-    (index starts at 1)
+    (index starts at 1, or after snapshot_idx)
+
+    snapshot : the state machine as of entry snapshot_idx, of term
+    snapshot_term, which replaces every entry up to it (or None)
 
     ----------------------------------------------------------------------
 
@@ -56,155 +519,896 @@ class Server:
     entry known to be replicated on server (initialized to 0,
     increases monotonically)
 
+    ----------------------------------------------------------------------
+
+    The state machine is any object with two methods:
+
+    apply(entry) : apply a committed LogEntry, returning the result
+    that is sent back to the client that proposed it
+
+    query(request) : answer a read-only ClientRequest from local state
+
+    and, optionally, two more to support snapshots:
+
+    snapshot() : the state so far, as a value that can be sent as JSON
+
+    restore(state) : replace the state with one returned by snapshot()
+
     """
 
-    def __init__(self, addr, peers):
-        self.addr = addr  # 127.0.0.1:5555
+    def __init__(self, addr, peers, state_machine=None, transport=None,
+                 clock=None, rng=None, verbose=True, adaptive=True, prevote=True,
+                 storage=None, snapshot_entries=SNAPSHOT_ENTRIES):
+        self.addr = addr  # tcp://127.0.0.1:5555
         self.peers = peers
         self.state = "follower"
+        self.leader = None
+        self.state_machine = state_machine
+        self.random = rng if rng else random.Random()
+        self.verbose = verbose
+        self.prevote = prevote
 
         # Persistent state on ALL servers
         # ----------------------------------------------------------------------
-        self.term = 0
-        self.voted_for = None
-        self.log = []
+        self.storage = storage
+        if storage:
+            self.term, self.voted_for, self.snapshot, self.log = storage.load()
+        else:
+            self.term = 0
+            self.voted_for = None
+            self.snapshot = None
+            self.log = []
+        self.snapshot_idx = self.snapshot["idx"] if self.snapshot else 0
+        self.snapshot_term = self.snapshot["term"] if self.snapshot else 0
+        self.snapshot_entries = snapshot_entries
 
         # Volatile state on ALL servers
         # ----------------------------------------------------------------------
-        self.commit_idx = 0
+        self.commit_idx = self.snapshot_idx
         self.last_applied = 0
 
-        self.vote_count = 0
+        # a snapshot not yet restored into the state machine; entries
+        # after it are applied once it is
+        self.restoring = self.snapshot
+
+        self.votes = set()
         self.majority = ((len(peers) + 1) // 2) + 1
-        self.timeout_thread = None
+        self.election_timer = None
+        self.heartbeat_timer = None
         self.election_time = 0
+        self.apply_timer = None
+        self.timing = Timing(adaptive)
 
-        # TRANSPORT
+        # METRICS
         # ----------------------------------------------------------------------
-        self.ctx = zmq.Context()
-        self.rep_sock = self.ctx.socket(zmq.REP)  # incoming
+        self.last_heard = None      # when the leader was last heard from
+        self.leader_lost = None     # last_heard, when the election timer expired
+        self.failovers = collections.deque(maxlen=FAILOVER_SAMPLES)
+        self.elections = 0
+        self.prevotes = 0
+
+        # results of applied commands, by request id
+        self.results = {}
+
+        # reply callbacks of clients waiting on an uncommitted entry,
+        # by log index
+        self.pending = {}
 
-        # Setup our REP socket to receive incoming requests
-        self.rep_sock.bind(self.addr)
+        # reads waiting for the leadership round after their arrival
+        # to be acknowledged, and for the commit index at that point to
+        # be applied; rounds are numbered by read_round, and sent with
+        # every AppendEntries
+        self.reads = []
+        self.read_round = 0
+        self.read_timer = None
+
+        # TIMERS AND TRANSPORT
+        # ----------------------------------------------------------------------
+        self.clock = clock if clock else Clock()
+        self.transport = transport if transport else ZmqTransport(self.addr)
 
         # LEADER STATE
         # ----------------------------------------------------------------------
         self.next_idxs = None
         self.match_idxs = None
+        self.acked_rounds = None
 
-        # bind the response socket to all known peers
-        for peer in self.peers:
-            self.rep_sock.bind(peer)
+    # ----------------------------------------------------------------------
+    # Running the server
+    # ----------------------------------------------------------------------
+
+    def start(self):
+        """ Arm the first election timer; from here on the server is
+        driven by its clock and its transport
 
-        self.follower_loop()
+        """
+        self.initialize_election_timer()
+        if self.restoring:
+            self.apply_committed()
+
+    def run(self):
+        """ Start the server and handle messages and timers until killed
+
+        """
+        self.start()
+        self.transport.serve(self)
+
+    def handle_message(self, message, reply=None):
+        kind = message.get("type")
+        if kind == "RequestVotes":
+            self.reply_vote(message)
+        elif kind == "RequestVotesReply":
+            self.vote_reply_handler(message)
+        elif kind == "PreVote":
+            self.reply_prevote(message)
+        elif kind == "PreVoteReply":
+            self.prevote_reply_handler(message)
+        elif kind == "AppendEntries":
+            self.append_entries_handler(message)
+        elif kind == "AppendEntriesReply":
+            self.heartbeat_reply_handler(message)
+        elif kind == "InstallSnapshot":
+            self.install_snapshot_handler(message)
+        elif kind == "ClientRequest":
+            self.client_request_handler(message, reply)
+        elif kind == "Metrics" and reply:
+            reply(self.metrics())
+
+    # ----------------------------------------------------------------------
+    # Leader election
+    # ----------------------------------------------------------------------
 
     def randomize_timeout(self):
-        """ Sets server's election time to a random value in [150, 300]
-        milliseconds
+        """ Sets server's election time to a random value in [T, 2T),
+        where T depends on the leader's heartbeat interval and the round
+        trip to it (1.5 seconds until they are known)
 
         """
-        # self.election_time = random.randrange(150, 300) / 1000
-        self.election_time = random.randrange(150, 300) / 100
+        self.election_time = self.timing.election_timeout(self.random)
 
     def initialize_election_timer(self):
-        """ Spawns an election timer thread, with a randomized timeout
+        """ Arms the election timer, with a randomized timeout
 
         """
-        print('Initializing election timer')
-
         # timer has not expired yet, so reinitialize it
-        if self.timeout_thread and self.timeout_thread.is_alive():
-            self.timeout_thread.cancel()
+        self.clock.cancel(self.election_timer)
 
         # timeout is randomized upon each initialization
         self.randomize_timeout()
 
-        # spawn a new timeout thread with a new randomized timeout
-        self.timeout_thread = threading.Timer(self.election_time,
+        self.election_timer = self.clock.call_later(self.election_time,
                                               self.handle_election_timeout)
 
-        self.timeout_thread.start()
-
     def handle_election_timeout(self):
-        """The target function of an election timer thread expiring
-
-        When an election timer expires, the server whose timer expired
-        must transition into the Candidate state and begin an election
-        by requesting votes from its peer group.
-
-        TODO:
+        """The target function of an election timer expiring
 
         If election timeout elapses without receiving AppendEntries
         RPC from current leader OR granting vote to candidate: convert
-        to candidate
+        to candidate and begin an election by requesting votes from
+        our peer group (after a successful PreVote, with prevote=True).
 
         """
+        if self.state == "leader":
+            return
+
+        if self.leader is not None and self.leader_lost is None:
+            self.leader_lost = self.last_heard
+        self.leader = None
 
-        if self.state != "leader" and not self.voted_for:
-            self.state = "candidate"
-            self.term += 1
-            self.vote_count = 0
+        if self.prevote and self.state != "candidate":
+            self.state = "precandidate"
+            self.prevotes += 1
+            self.votes = {self.addr}
             self.initialize_election_timer()
-            self.request_votes()
-
-    def request_votes(self):
-        """ Request votes from every node in the current cluster
-
-        """
-        def request_vote(peer, term):
-            # construct a message to send to the peer
-            message = {
-                "type": "RequestVotes",
-                "addr": self.addr,
-                "term": self.term
-                }
-            print(message)
-            while self.state == "candidate" and self.term == term:
-                # connect to the peer
-                sock = self.ctx.socket(zmq.REQ)
-                print(f'connecting to peer {peer}')
-                sock.connect(peer)
-                sock.send_json(message)
-
-                reply = sock.recv()
-                if reply:
-                    self.heartbeat_reply_handler()
-                print(reply)
-
-        # start a thread of control for each peer in the group
+            if len(self.votes) >= self.majority:
+                self.start_election()
+            else:
+                self.request_votes("PreVote", self.term + 1)
+        else:
+            self.start_election()
+
+    def start_election(self):
+        self.state = "candidate"
+        self.term += 1
+        self.elections += 1
+        self.voted_for = self.addr
+        self.save_vote()
+        self.votes = {self.addr}
+        self.leader = None
+        self.initialize_election_timer()
+
+        if len(self.votes) >= self.majority:
+            self.become_leader()
+        else:
+            self.request_votes("RequestVotes", self.term)
+
+    def request_votes(self, kind, term):
+        """ Request votes (or pre-votes) from every node in the current
+        cluster
+
+        """
+        message = {
+            "type": kind,
+            "addr": self.addr,
+            "term": term,
+            "last_log_idx": self.last_log_idx(),
+            "last_log_term": self.last_log_term(),
+            "sent": self.clock.now()
+            }
         for peer in self.peers:
-            threading.Thread(target=request_vote,
-                             args=(peer, self.term)).start()
+            self.transport.send(peer, message)
 
-    def follower_loop(self):
-        # listen for incoming requests from the leader, or timeout
-        while self.state == "follower":
-            self.initialize_election_timer()
-            while self.timeout_thread.is_alive():
-                req = self.rep_sock.recv_json()
-                if req["type"] == "RequestVotes":
-                    self.reply_vote(req)
+    def up_to_date(self, req):
+        """ True if the candidate's log is at least as up-to-date as ours """
+        return ((req["last_log_term"], req["last_log_idx"]) >=
+                (self.last_log_term(), self.last_log_idx()))
+
+    def leader_recent(self):
+        """ True if we lead, or have heard from the leader within the
+        minimum election timeout
+
+        """
+        if self.state == "leader":
+            return True
+        return (self.leader is not None and self.last_heard is not None and
+                self.clock.now() - self.last_heard < self.timing.election_base)
 
     def reply_vote(self, req):
-        print(f'RequestVotes from {req["addr"]} with term {req["term"]}')
-
-    # def send_heartbeat(self, follower):
-    #     # check if the new follower have same commit index, else we
-    #     # tell them to update to our log level if self.log:
-    #     # self.update_follower_commitIdx(follower)
-
-    #     message = {"term": self.term, "addr": self.addr}
-    #     while self.state == "leader":
-    #         start = time.time()
-    #         # reply = utils.send(follower, route, message)
-    #         # if reply:
-    #         #     pass
-    #             # self.heartbeat_reply_handler(reply.json()["term"],
-    #                                         # reply.json()["commitIdx"])
-    #         delta = time.time() - start
-    #         # keep the heartbeat constant even if the network speed is varying
-    #         print("heartbeating.......")
-    #         time.sleep((300 - delta) / 1000)
+        """ Grant our vote if we have not voted for anyone else this
+        term, and the candidate's log is at least as up-to-date as ours
+
+        """
+        if self.prevote and req["term"] > self.term and self.leader_recent():
+            # our leader is alive: ignore the candidate, term and all
+            granted = False
+        else:
+            if req["term"] > self.term:
+                self.become_follower(req["term"])
+
+            granted = (req["term"] == self.term and
+                       self.voted_for in (None, req["addr"]) and
+                       self.up_to_date(req))
+
+        if granted:
+            self.voted_for = req["addr"]
+            self.save_vote()
+            self.initialize_election_timer()
+
+        self.transport.send(req["addr"], {
+            "type": "RequestVotesReply",
+            "addr": self.addr,
+            "term": self.term,
+            "granted": granted,
+            "echo": req.get("sent")
+            })
+
+    def reply_prevote(self, req):
+        """ Say whether we would vote for the sender in the term it
+        gives, without changing our own term or vote
+
+        """
+        granted = (req["term"] > self.term and
+                   not self.leader_recent() and
+                   self.up_to_date(req))
+
+        self.transport.send(req["addr"], {
+            "type": "PreVoteReply",
+            "addr": self.addr,
+            "term": self.term,
+            "granted": granted,
+            "echo": req.get("sent")
+            })
+
+    def vote_reply_handler(self, reply):
+        self.sample_rtt(reply)
+        if reply["term"] > self.term:
+            self.become_follower(reply["term"])
+            return
+
+        if (self.state == "candidate" and reply["term"] == self.term and
+                reply["granted"]):
+            self.votes.add(reply["addr"])
+            if len(self.votes) >= self.majority:
+                self.become_leader()
+
+    def prevote_reply_handler(self, reply):
+        self.sample_rtt(reply)
+        if reply["term"] > self.term:
+            self.become_follower(reply["term"])
+            return
+
+        if self.state == "precandidate" and reply["granted"]:
+            self.votes.add(reply["addr"])
+            if len(self.votes) >= self.majority:
+                self.start_election()
+
+    def sample_rtt(self, reply):
+        if reply.get("echo") is not None:
+            self.timing.sample(reply["addr"], self.clock.now() - reply["echo"])
+
+    def found_leader(self, leader):
+        """ Note that leader leads, and how long we were without one """
+        if leader != self.leader and self.leader_lost is not None:
+            self.failovers.append(self.clock.now() - self.leader_lost)
+            self.leader_lost = None
+        self.leader = leader
+
+    def become_follower(self, term):
+        if term > self.term:
+            self.term = term
+            self.voted_for = None
+            self.save_vote()
+
+        if self.state == "leader":
+            self.clock.cancel(self.heartbeat_timer)
+            self.clock.cancel(self.read_timer)
+            self.read_timer = None
+            self.fail_pending()
+
+        self.state = "follower"
+        self.initialize_election_timer()
+
+    def save_vote(self):
+        if self.storage:
+            self.storage.save_vote(self.term, self.voted_for)
+
+    def become_leader(self):
+        if self.verbose:
+            print(f'{self.addr} is leader for term {self.term}')
+        self.state = "leader"
+        self.found_leader(self.addr)
+        self.clock.cancel(self.election_timer)
+
+        self.next_idxs = {peer: self.last_log_idx() + 1 for peer in self.peers}
+        self.match_idxs = {peer: 0 for peer in self.peers}
+        self.acked_rounds = {peer: 0 for peer in self.peers}
+
+        # entries of earlier terms only commit along with one of ours
+        # (see advance_commit_idx), so don't wait for a client write
+        entry = LogEntry(self.term, Operation.noop, None)
+        self.log.append(entry)
+        if self.storage:
+            self.storage.append([entry])
+
+        self.send_heartbeat()
+
+        # a cluster of one commits immediately
+        self.advance_commit_idx()
+
+    # ----------------------------------------------------------------------
+    # Log replication
+    # ----------------------------------------------------------------------
+
+    def last_log_idx(self):
+        return self.snapshot_idx + len(self.log)
+
+    def last_log_term(self):
+        return self.log_term(self.last_log_idx())
+
+    def log_term(self, idx):
+        """ Term of the entry at idx, which may be the last one replaced
+        by the snapshot (or 0, before the first entry)
+
+        """
+        if idx == self.snapshot_idx:
+            return self.snapshot_term
+        return self.log[idx - self.snapshot_idx - 1].current_term
+
+    def send_heartbeat(self):
+        """ Send AppendEntries to every follower, then schedule the
+        next round
+
+        """
+        if self.state != "leader":
+            return
+
+        interval = self.timing.lead()
+        for peer in self.peers:
+            self.send_append_entries(peer)
+
+        # line heartbeats up on a common grid, so the groups of a
+        # MultiServer beat together and can share one message per peer;
+        # a tick that is (or, rounded, looks) due already is skipped
+        delay = interval - self.clock.now() % interval
+        if delay < interval / 2:
+            delay += interval
+
+        self.clock.cancel(self.heartbeat_timer)
+        self.heartbeat_timer = self.clock.call_later(delay, self.send_heartbeat)
+
+    def send_append_entries(self, peer):
+        prev_idx = self.next_idxs[peer] - 1
+        if prev_idx < self.snapshot_idx:
+            self.send_snapshot(peer)
+            return
+
+        prev_term = self.log_term(prev_idx)
+        start = prev_idx - self.snapshot_idx
+        entries = self.log[start:start + MAX_ENTRIES_PER_MESSAGE]
+
+        # assume the entries will arrive, so the next call only sends
+        # newer ones; a failed reply backs next_idx up again
+        self.next_idxs[peer] = prev_idx + len(entries) + 1
+
+        self.transport.send(peer, {
+            "type": "AppendEntries",
+            "addr": self.addr,
+            "term": self.term,
+            "prev_log_idx": prev_idx,
+            "prev_log_term": prev_term,
+            "entries": [entry.to_dict() for entry in entries],
+            "leader_commit": self.commit_idx,
+            "round": self.read_round,
+            "sent": self.clock.now(),
+            "heartbeat": self.timing.heartbeat,
+            "rtt": self.timing.rtt(peer)
+            })
+
+    def send_snapshot(self, peer):
+        """ Send our snapshot to a follower that needs entries it replaced
+
+        """
+        # as with AppendEntries, assume it arrives
+        self.next_idxs[peer] = self.snapshot_idx + 1
+
+        self.transport.send(peer, {
+            "type": "InstallSnapshot",
+            "addr": self.addr,
+            "term": self.term,
+            "snapshot": self.snapshot,
+            "round": self.read_round,
+            "sent": self.clock.now(),
+            "heartbeat": self.timing.heartbeat,
+            "rtt": self.timing.rtt(peer)
+            })
+
+    def reply_append(self, req, success, match_idx):
+        """ Answer an AppendEntries or InstallSnapshot """
+        self.transport.send(req["addr"], {
+            "type": "AppendEntriesReply",
+            "addr": self.addr,
+            "term": self.term,
+            "success": success,
+            "match_idx": match_idx,
+            "round": req.get("round"),
+            "echo": req.get("sent")
+            })
+
+    def follow_leader(self, req):
+        """ Stand down for the leader that sent req, unless its term is
+        behind ours; returns whether it was
+
+        """
+        if req["term"] < self.term:
+            self.reply_append(req, False, 0)
+            return False
+
+        self.timing.follow(req.get("heartbeat"), req.get("rtt"))
+        self.last_heard = self.clock.now()
+        self.become_follower(req["term"])
+        self.found_leader(req["addr"])
+        return True
+
+    def append_entries_handler(self, req):
+        """ Append the leader's entries to our log, once we have checked
+        that our logs agree up to the entry before them
+
+        """
+        if not self.follow_leader(req):
+            return
+
+        prev_idx = req["prev_log_idx"]
+        if prev_idx > self.last_log_idx():
+            self.reply_append(req, False, self.last_log_idx())
+            return
+
+        # entries up to our snapshot were committed, so they agree
+        entries = req["entries"]
+        idx = prev_idx
+        if prev_idx < self.snapshot_idx:
+            skipped = min(len(entries), self.snapshot_idx - prev_idx)
+            entries = entries[skipped:]
+            idx += skipped
+        elif prev_idx and self.log_term(prev_idx) != req["prev_log_term"]:
+            self.reply_append(req, False, prev_idx - 1)
+            return
+
+        # skip entries we already have, truncate at the first conflict
+        appended = []
+        for entry in entries:
+            entry = LogEntry.from_dict(entry)
+            position = idx - self.snapshot_idx
+            if position < len(self.log):
+                if self.log[position].current_term == entry.current_term:
+                    idx += 1
+                    continue
+                del self.log[position:]
+                if self.storage:
+                    self.storage.truncate(position)
+            self.log.append(entry)
+            appended.append(entry)
+            idx += 1
+        if appended and self.storage:
+            self.storage.append(appended)
+
+        if req["leader_commit"] > self.commit_idx:
+            self.commit_idx = max(self.commit_idx, min(req["leader_commit"], idx))
+            self.apply_committed()
+
+        self.reply_append(req, True, idx)
+
+    def install_snapshot_handler(self, req):
+        """ Replace our state with the leader's snapshot, keeping any
+        entries we have after it
+
+        """
+        if not self.follow_leader(req):
+            return
+
+        snapshot = req["snapshot"]
+        idx = snapshot["idx"]
+        if idx <= self.commit_idx:
+            # we have every entry it replaces already
+            self.reply_append(req, True, idx)
+            return
+
+        if idx <= self.last_log_idx() and self.log_term(idx) == snapshot["term"]:
+            del self.log[:idx - self.snapshot_idx]
+        else:
+            self.log = []
+        self.snapshot = snapshot
+        self.snapshot_idx = idx
+        self.snapshot_term = snapshot["term"]
+        if self.storage:
+            self.storage.save_snapshot(snapshot, self.log)
+
+        self.commit_idx = idx
+        self.restoring = snapshot
+        self.apply_committed()
+
+        self.reply_append(req, True, idx)
+
+    def heartbeat_reply_handler(self, reply):
+        self.sample_rtt(reply)
+        if reply["term"] > self.term:
+            self.become_follower(reply["term"])
+            return
+
+        if self.state != "leader" or reply["term"] != self.term:
+            return
+
+        peer = reply["addr"]
+        # any answer in our term means the peer still follows us
+        self.acked_rounds[peer] = max(self.acked_rounds[peer], reply.get("round") or 0)
+
+        if reply["success"]:
+            self.match_idxs[peer] = max(self.match_idxs[peer], reply["match_idx"])
+            self.next_idxs[peer] = max(self.next_idxs[peer],
+                                       self.match_idxs[peer] + 1)
+            self.advance_commit_idx()
+        else:
+            # back up to where the follower says our logs may agree
+            self.next_idxs[peer] = max(1, min(self.next_idxs[peer] - 1,
+                                              reply["match_idx"] + 1))
+
+        if self.next_idxs[peer] <= self.last_log_idx():
+            self.send_append_entries(peer)
+
+        self.serve_reads()
+
+    def advance_commit_idx(self):
+        """ Commit the highest entry from our term stored on a majority
+
+        """
+        for n in range(self.last_log_idx(), self.commit_idx, -1):
+            if self.log_term(n) != self.term:
+                break
+            replicas = 1 + sum(1 for m in self.match_idxs.values() if m >= n)
+            if replicas >= self.majority:
+                self.commit_idx = n
+                self.apply_committed()
+                break
+
+    def apply_committed(self):
+        """ Apply newly committed entries to the state machine in log
+        order, answering any client waiting on them
+
+        If the state machine raises (say, its tuplespace is down), the
+        entry is applied again APPLY_RETRY_INTERVAL seconds later. Later
+        entries wait for it, so every replica still applies the log in
+        the same order, and the server keeps running meanwhile. The
+        same goes for restoring a snapshot.
+
+        """
+        if self.restoring:
+            try:
+                if self.state_machine:
+                    self.state_machine.restore(self.restoring["state"])
+            except Exception as e:
+                if self.verbose:
+                    print(f'{self.addr} failed to restore snapshot {self.restoring["idx"]}: {e}')
+                if self.apply_timer is None:
+                    self.apply_timer = self.clock.call_later(APPLY_RETRY_INTERVAL,
+                                                             self.retry_apply)
+                return
+            self.results = dict(self.restoring["results"])
+            self.last_applied = self.restoring["idx"]
+            self.restoring = None
+
+        while self.last_applied < self.commit_idx:
+            entry = self.log[self.last_applied - self.snapshot_idx]
+
+            if entry.event_type == Operation.noop:
+                result = None
+            elif entry.request_id is not None and entry.request_id in self.results:
+                # a retried command: apply it once, answer it twice
+                result = self.results[entry.request_id]
+            else:
+                result = None
+                if self.state_machine:
+                    try:
+                        result = self.state_machine.apply(entry)
+                    except Exception as e:
+                        if self.verbose:
+                            print(f'{self.addr} failed to apply entry {self.last_applied + 1}: {e}')
+                        if self.apply_timer is None:
+                            self.apply_timer = self.clock.call_later(APPLY_RETRY_INTERVAL,
+                                                                     self.retry_apply)
+                        return
+                if entry.request_id is not None:
+                    self.remember_result(entry.request_id, result)
+
+            self.last_applied += 1
+            reply = self.pending.pop(self.last_applied, None)
+            if reply:
+                reply({"success": True, "result": result})
+
+        self.take_snapshot()
+        self.serve_reads()
+
+    def take_snapshot(self):
+        """ Replace the applied entries with a snapshot of the state
+        machine, once there are snapshot_entries of them
+
+        """
+        if (self.last_applied - self.snapshot_idx < self.snapshot_entries or
+                not hasattr(self.state_machine, "snapshot")):
+            return
+
+        self.snapshot = {
+            "idx": self.last_applied,
+            "term": self.log_term(self.last_applied),
+            "state": self.state_machine.snapshot(),
+            "results": dict(self.results)
+            }
+        del self.log[:self.last_applied - self.snapshot_idx]
+        self.snapshot_idx = self.snapshot["idx"]
+        self.snapshot_term = self.snapshot["term"]
+        if self.storage:
+            self.storage.save_snapshot(self.snapshot, self.log)
+
+    def retry_apply(self):
+        self.apply_timer = None
+        self.apply_committed()
+
+    def remember_result(self, request_id, result):
+        self.results[request_id] = result
+        if len(self.results) > MAX_REMEMBERED_REQUESTS:
+            # dicts keep insertion order, so this drops the oldest
+            del self.results[next(iter(self.results))]
+
+    # ----------------------------------------------------------------------
+    # Clients
+    # ----------------------------------------------------------------------
+
+    def client_request_handler(self, req, reply):
+        """ Propose a client's command to the cluster
+
+        Only the leader accepts commands; everyone else redirects the
+        client to the leader they know of (which may be None during an
+        election). Reads are answered from the leader's state machine
+        without being logged, once it has confirmed that it still leads
+        (see serve_reads()).
+
+        """
+        error = invalid_request(req)
+        if error:
+            reply({"success": False, "leader": self.leader, "error": error})
+            return
+
+        if self.state != "leader":
+            reply({"success": False, "leader": self.leader})
+            return
+
+        if req["operation"] in READ_OPERATIONS:
+            # reads arriving together share the next round
+            self.reads.append({"round": self.read_round + 1, "idx": None,
+                               "request": req, "reply": reply})
+            if self.read_timer is None:
+                self.read_timer = self.clock.call_later(0, self.confirm_leadership)
+            return
+
+        request_id = req.get("id")
+        if request_id is not None and request_id in self.results:
+            reply({"success": True, "result": self.results[request_id]})
+            return
+
+        entry = LogEntry(self.term, Operation[req["operation"]], req["payload"], request_id)
+        self.log.append(entry)
+        if self.storage:
+            self.storage.append([entry])
+        self.pending[self.last_log_idx()] = reply
+
+        for peer in self.peers:
+            self.send_append_entries(peer)
+
+        # a cluster of one commits immediately
+        self.advance_commit_idx()
+
+    def confirm_leadership(self):
+        """ Start a new round of AppendEntries, whose acknowledgement by
+        a majority shows that we still led after the reads waiting for
+        it arrived
+
+        """
+        self.read_timer = None
+        if self.state != "leader":
+            return
+
+        self.read_round += 1
+        for peer in self.peers:
+            self.send_append_entries(peer)
+
+        # a cluster of one needs no acknowledgements
+        self.serve_reads()
+
+    def serve_reads(self):
+        """ Answer the reads whose round a majority has acknowledged
+
+        A read is answered from the state machine once it has applied
+        the commit index as of its round. Until an entry of our own
+        term commits (the no-op from become_leader()), our commit index
+        may lag behind entries an earlier leader acknowledged, so no
+        read is answered before then.
+
+        """
+        if self.state != "leader" or not self.reads:
+            return
+        if not self.commit_idx or self.log_term(self.commit_idx) != self.term:
+            return
+
+        rounds = sorted([self.read_round] + list(self.acked_rounds.values()), reverse=True)
+        confirmed = rounds[self.majority - 1]
+
+        waiting = []
+        for read in self.reads:
+            if read["idx"] is None and read["round"] <= confirmed:
+                read["idx"] = self.commit_idx
+            if read["idx"] is None or read["idx"] > self.last_applied:
+                waiting.append(read)
+                continue
+
+            try:
+                result = self.state_machine.query(read["request"]) if self.state_machine else None
+            except Exception as e:
+                read["reply"]({"success": False, "leader": self.leader, "error": str(e)})
+                continue
+            read["reply"]({"success": True, "result": result})
+        self.reads = waiting
+
+    def fail_pending(self):
+        """ Tell waiting clients to retry with the new leader
+
+        The entry may still commit; the request id keeps the retry from
+        being applied a second time. Waiting reads are retried, too.
+
+        """
+        for reply in self.pending.values():
+            reply({"success": False, "leader": None})
+        self.pending = {}
+
+        for read in self.reads:
+            read["reply"]({"success": False, "leader": None})
+        self.reads = []
+
+    # ----------------------------------------------------------------------
+    # Metrics
+    # ----------------------------------------------------------------------
+
+    def metrics(self):
+        """ Timing and failover figures, as answered to a Metrics message
+
+        failovers are the most recent times, in seconds, from last
+        hearing from a leader to following (or becoming) the next one.
+
+        """
+        return {
+            "addr": self.addr,
+            "state": self.state,
+            "term": self.term,
+            "leader": self.leader,
+            "heartbeat_interval": self.timing.heartbeat,
+            "election_timeout": self.timing.election_base,
+            "rtt": {peer: self.timing.rtt(peer) for peer in self.peers},
+            "elections": self.elections,
+            "prevotes": self.prevotes,
+            "failovers": list(self.failovers)
+            }
+
+
+class GroupTransport:
+    """ Sends the messages of one Raft group over the transport shared
+    by every group hosted in the process
+
+    """
+    def __init__(self, transport, group):
+        self.transport = transport
+        self.group = group
+
+    def send(self, peer, message):
+        message["group"] = self.group
+        self.transport.send(peer, message)
+
+
+class MultiServer:
+    """ Hosts several independent Raft groups in one process
+
+    Each group is an ordinary Server with its own term, log and
+    leader, so writes to different groups are ordered (and limited by)
+    different leaders. Every process in the cluster hosts a member of
+    each group; messages carry a "group" field to find it.
+
+    All groups share one transport and one clock. Their heartbeats
+    fire on the same ticks, and ZmqTransport sends everything bound for
+    the same peer in one Batch message.
+
+    To spread the leaders over the cluster, member (group mod N) of
+    each group calls an election as soon as it starts.
+
+    With a directory, each group keeps its state in a DiskStorage in
+    its own subdirectory of it.
+
+    """
+
+    def __init__(self, addr, peers, groups, state_machines=None,
+                 transport=None, clock=None, verbose=True, adaptive=True,
+                 prevote=True, directory=None, snapshot_entries=SNAPSHOT_ENTRIES):
+        self.addr = addr
+        self.peers = peers
+        self.clock = clock if clock else Clock()
+        self.transport = transport if transport else ZmqTransport(self.addr)
+
+        if state_machines is None:
+            state_machines = [None] * groups
+
+        self.servers = [Server(addr, peers, state_machines[group],
+                               transport=GroupTransport(self.transport, group),
+                               clock=self.clock, verbose=verbose,
+                               adaptive=adaptive, prevote=prevote,
+                               snapshot_entries=snapshot_entries,
+                               storage=directory and
+                               DiskStorage(os.path.join(directory, f'group-{group}')))
+                        for group in range(groups)]
+
+    def start(self):
+        members = sorted([self.addr] + self.peers)
+        for group, server in enumerate(self.servers):
+            server.start()
+            if members[group % len(members)] == self.addr:
+                server.handle_election_timeout()
+
+    def run(self):
+        self.start()
+        self.transport.serve(self)
+
+    def handle_message(self, message, reply=None):
+        group = message.get("group", 0)
+        if not 0 <= group < len(self.servers):
+            if reply:
+                reply({"success": False, "leader": None,
+                       "error": f'no such group {group}'})
+            return
+        self.servers[group].handle_message(message, reply)
 
 
 if __name__ == "__main__":
@@ -220,14 +1424,8 @@ if __name__ == "__main__":
         my_ip = ip_list.pop(index)
         print(f'my_ip: {my_ip}')
 
-        http, host, port = my_ip.split(':')
         # initialize node with ip list and its own ip
         s = Server(my_ip, ip_list)
+        s.run()
     else:
         print("usage: python raft.py <index> <ip_list_file>")
-
-# if __name__ == "__main__":
-#     print("START")
-#     args = sys.argv[1:]
-#     print(f"Starting raft server ({sys.argv[1]})")
-#     s = Server(sys.argv[1], sys.argv[2])
@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+
+# raftsim.py
+
+# Deterministic, in-process simulator for a Raft cluster.
+#
+# Runs N raft.Server instances in this process, with their clock and
+# transport replaced: every timer and every message in flight is an
+# event on one VirtualClock, which jumps straight from one event to
+# the next. Latency and loss come from a seeded random number
+# generator, so a run is fully determined by its seed, and thousands
+# of seconds of cluster time simulate in well under a second.
+#
+#     $ ./raftsim.py --nodes 5 --runs 1000 --latency 1 5 --loss 0.01
+#
+# Client load dominates the cost of a run; use --duration 0 to measure
+# only elections and failovers.
+#
+# For each seed, the simulator measures:
+#
+#   election : time from a cold start until a majority follows one leader
+#   throughput : commits per (virtual) second from closed-loop clients
+#   disruption : with --isolate, time without a leader after a follower
+#                that was cut off for that long rejoins
+#   failover : time from crashing (or partitioning away) the leader
+#              until a majority follows a new one
+#
+# The servers measure round trips and adapt their timing (see
+# raft.Timing) during --warmup seconds after the election. Compare with
+# --fixed-timing and --no-prevote:
+#
+#     $ ./raftsim.py --duration 0 --isolate 5 --fixed-timing --no-prevote
+
+import argparse
+import heapq
+import random
+import statistics
+import sys
+import time
+
+import raft
+
+
+class VirtualClock(raft.Clock):
+    """A clock that only moves when the simulator steps it"""
+
+    def __init__(self):
+        super().__init__()
+        self.time = 0.0
+
+    def now(self):
+        return self.time
+
+    def step(self, until=None):
+        """Jump to the earliest timer and run it
+
+        Returns False, without moving past `until`, if there is no
+        timer due by then.
+
+        """
+        deadline = self.next_deadline()
+        if deadline is None or (until is not None and deadline > until):
+            if until is not None:
+                self.time = max(self.time, until)
+            return False
+
+        self.time = max(self.time, deadline)
+        _, _, callback = heapq.heappop(self.timers)
+        callback()
+        return True
+
+
+class NodeClock:
+    """The shared virtual clock as seen by one server
+
+    Timers of a crashed server don't fire.
+
+    """
+    def __init__(self, clock, network, addr):
+        self.clock = clock
+        self.network = network
+        self.addr = addr
+
+    def now(self):
+        return self.clock.now()
+
+    def call_later(self, delay, callback):
+        def fire():
+            if self.addr not in self.network.crashed:
+                callback()
+        return self.clock.call_later(delay, fire)
+
+    def cancel(self, timer):
+        self.clock.cancel(timer)
+
+
+class SimTransport:
+    """Transport for one server, sending through the SimNetwork"""
+
+    def __init__(self, network, addr):
+        self.network = network
+        self.addr = addr
+
+    def send(self, peer, message):
+        self.network.send(self.addr, peer, message,
+                          lambda m: self.network.servers[peer].handle_message(m))
+
+
+class SimNetwork:
+    """In-memory network with random latency, loss, crashes and partitions
+
+    Like the TCP connections under ZeroMQ, each link delivers its
+    messages in the order they were sent. Messages are never modified
+    after being sent, so they are delivered as the same object instead
+    of being serialized.
+
+    """
+    # clients are never crashed or partitioned
+    CLIENT = "client"
+
+    def __init__(self, clock, rng, latency=(0.001, 0.005), loss=0.0):
+        self.clock = clock
+        self.random = rng
+        self.latency = latency
+        self.loss = loss
+        self.servers = {}
+        self.crashed = set()
+        self.groups = None
+        self.arrivals = {}
+        self.sent = 0
+        self.dropped = 0
+
+    def transport(self, addr):
+        return SimTransport(self, addr)
+
+    def reachable(self, src, dst):
+        if src in self.crashed or dst in self.crashed:
+            return False
+        if self.groups is None or self.CLIENT in (src, dst):
+            return True
+        return any(src in group and dst in group for group in self.groups)
+
+    def send(self, src, dst, message, handler):
+        self.sent += 1
+        if not self.reachable(src, dst) or self.random.random() < self.loss:
+            self.dropped += 1
+            return
+
+        def deliver():
+            # the destination may have crashed while the message was in flight
+            if self.reachable(src, dst):
+                handler(message)
+            else:
+                self.dropped += 1
+
+        # never overtake a message sent earlier on the same link
+        arrival = max(self.clock.now() + self.random.uniform(*self.latency),
+                      self.arrivals.get((src, dst), 0))
+        self.arrivals[(src, dst)] = arrival
+        self.clock.call_later(arrival - self.clock.now(), deliver)
+
+    def crash(self, addr):
+        """Stop a server: it neither sends, receives, nor times out"""
+        self.crashed.add(addr)
+
+    def recover(self, addr):
+        """Restart a crashed server as a follower, keeping its log"""
+        self.crashed.discard(addr)
+        self.servers[addr].become_follower(self.servers[addr].term)
+
+    def partition(self, *groups):
+        """Only let messages through between servers in the same group"""
+        self.groups = [set(group) for group in groups]
+
+    def heal(self):
+        self.groups = None
+
+
+class LogStateMachine:
+    """Remembers the payload of every entry applied to it, in order"""
+
+    def __init__(self):
+        self.applied = []
+
+    def apply(self, entry):
+        self.applied.append(entry.payload)
+        return len(self.applied)
+
+    def query(self, request):
+        return len(self.applied)
+
+    def snapshot(self):
+        return list(self.applied)
+
+    def restore(self, state):
+        self.applied = list(state)
+
+
+class Cluster:
+    """N simulated Raft servers, all determined by one seed"""
+
+    def __init__(self, size=5, seed=0, latency=(0.001, 0.005), loss=0.0,
+                 adaptive=True, prevote=True, snapshot_entries=raft.SNAPSHOT_ENTRIES):
+        rng = random.Random(seed)
+        self.clock = VirtualClock()
+        self.network = SimNetwork(self.clock, random.Random(rng.random()),
+                                  latency, loss)
+        self.servers = []
+
+        addrs = [f'sim://{i}' for i in range(size)]
+        for addr in addrs:
+            server = raft.Server(addr, [p for p in addrs if p != addr],
+                                 state_machine=LogStateMachine(),
+                                 transport=self.network.transport(addr),
+                                 clock=NodeClock(self.clock, self.network, addr),
+                                 rng=random.Random(rng.random()),
+                                 verbose=False, adaptive=adaptive,
+                                 prevote=prevote, snapshot_entries=snapshot_entries)
+            self.network.servers[addr] = server
+            self.servers.append(server)
+
+        for server in self.servers:
+            server.start()
+
+        self.majority = self.servers[0].majority
+
+    def now(self):
+        return self.clock.now()
+
+    def live(self):
+        return [s for s in self.servers if s.addr not in self.network.crashed]
+
+    def leader(self):
+        """The leader of the highest term, if a majority follows it"""
+        leaders = [s for s in self.live() if s.state == "leader"]
+        if not leaders:
+            return None
+        leader = max(leaders, key=lambda s: s.term)
+        followers = sum(1 for s in self.live()
+                        if s.term == leader.term and s.leader == leader.addr)
+        return leader if followers >= self.majority else None
+
+    def run_until(self, predicate, timeout):
+        """Step the simulation until predicate() holds, for at most
+        timeout (virtual) seconds
+
+        """
+        end = self.now() + timeout
+        while not predicate():
+            if not self.clock.step(until=end):
+                return predicate()
+        return True
+
+    def run_for(self, duration):
+        end = self.now() + duration
+        while self.clock.step(until=end):
+            pass
+
+    def submit(self, operation, payload, request_id, callback):
+        """Send a ClientRequest to whoever we think leads; callback gets
+        the reply, unless it is lost
+
+        """
+        leader = self.leader()
+        target = leader.addr if leader else self.live()[0].addr
+        message = {
+            "type": "ClientRequest",
+            "id": request_id,
+            "operation": operation,
+            "payload": payload
+            }
+
+        def reply(response):
+            self.network.send(target, SimNetwork.CLIENT, response, callback)
+
+        self.network.send(SimNetwork.CLIENT, target, message,
+                          lambda m: self.network.servers[target].handle_message(m, reply))
+
+    def check_consistency(self):
+        """Every server's applied entries must be a prefix of the longest"""
+        logs = sorted((s.state_machine.applied for s in self.servers), key=len)
+        longest = logs[-1]
+        for applied in logs:
+            assert applied == longest[:len(applied)], "replicas diverged"
+
+
+class Client:
+    """A closed-loop client: sends a write, waits for the reply, repeats
+
+    A lost or rejected request is retried with the same request id.
+
+    """
+    RETRY_INTERVAL = 0.05
+    REQUEST_TIMEOUT = 1.0
+
+    def __init__(self, cluster, name):
+        self.cluster = cluster
+        self.name = name
+        self.seq = 0
+        self.attempt = 0
+        self.committed = 0
+        self.timer = None
+
+    def start(self):
+        self.send()
+
+    def send(self):
+        self.attempt += 1
+        attempt = self.attempt
+
+        def on_reply(response):
+            if attempt != self.attempt:
+                return  # a reply to an attempt we gave up on
+            self.cluster.clock.cancel(self.timer)
+            if response["success"]:
+                self.committed += 1
+                self.seq += 1
+                self.send()
+            else:
+                self.timer = self.cluster.clock.call_later(self.RETRY_INTERVAL, self.send)
+
+        self.cluster.submit("write", [self.name, self.seq],
+                            f'{self.name}-{self.seq}', on_reply)
+        self.timer = self.cluster.clock.call_later(self.REQUEST_TIMEOUT, self.send)
+
+
+def measure_election(cluster, timeout=60):
+    """Seconds from a cold start until a majority follows one leader"""
+    start = cluster.now()
+    if not cluster.run_until(cluster.leader, timeout):
+        return None
+    return cluster.now() - start
+
+
+def measure_throughput(cluster, clients=8, duration=5.0):
+    """Commits per second from closed-loop clients over duration seconds"""
+    workers = [Client(cluster, f'c{i}') for i in range(clients)]
+    for worker in workers:
+        worker.start()
+    cluster.run_for(duration)
+    committed = sum(worker.committed for worker in workers)
+    for worker in workers:
+        cluster.clock.cancel(worker.timer)
+        worker.attempt += 1  # ignore replies still in flight
+    return committed / duration
+
+
+def measure_disruption(cluster, isolation, settle=5.0):
+    """Seconds without a leader, over settle seconds after a follower
+    that was cut off for isolation seconds rejoins
+
+    """
+    leader = cluster.leader()
+    follower = next(s for s in cluster.live() if s is not leader)
+    cluster.network.partition([follower.addr],
+                              [s.addr for s in cluster.servers if s is not follower])
+    cluster.run_for(isolation)
+    cluster.network.heal()
+
+    leaderless = 0.0
+    end = cluster.now() + settle
+    last, had_leader = cluster.now(), cluster.leader() is not None
+    while cluster.clock.step(until=end):
+        if not had_leader:
+            leaderless += cluster.now() - last
+        last, had_leader = cluster.now(), cluster.leader() is not None
+    if not had_leader:
+        leaderless += end - last
+    return leaderless
+
+
+def measure_failover(cluster, fault="crash", timeout=60):
+    """Seconds from losing the leader until a majority follows a new one"""
+    old = cluster.leader()
+    if fault == "crash":
+        cluster.network.crash(old.addr)
+    else:
+        cluster.network.partition([old.addr],
+                                  [s.addr for s in cluster.servers if s is not old])
+    start = cluster.now()
+
+    def new_leader():
+        leader = cluster.leader()
+        return leader is not None and leader is not old
+
+    if not cluster.run_until(new_leader, timeout):
+        return None
+    return cluster.now() - start
+
+
+def simulate(seed, args):
+    cluster = Cluster(args.nodes, seed, tuple(ms / 1000 for ms in args.latency),
+                      args.loss, adaptive=not args.fixed_timing,
+                      prevote=not args.no_prevote,
+                      snapshot_entries=args.snapshot_entries)
+    election = measure_election(cluster)
+    if election is None:
+        return None, None, None, None, None
+    cluster.run_for(args.warmup)
+    throughput = None
+    if args.duration > 0:
+        throughput = measure_throughput(cluster, args.clients, args.duration)
+    disruption = None
+    if args.isolate > 0 and cluster.leader():
+        disruption = measure_disruption(cluster, args.isolate)
+    heartbeat = cluster.leader().timing.heartbeat if cluster.leader() else None
+    failover = measure_failover(cluster, args.fault) if cluster.leader() else None
+    cluster.check_consistency()
+    return election, throughput, disruption, failover, heartbeat
+
+
+def summarize(name, unit, values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        print(f'{name:>10}: no successful runs')
+        return
+
+    def pct(p):
+        return values[min(len(values) - 1, int(p * len(values)))]
+
+    print(f'{name:>10}: mean {statistics.mean(values):.3f} {unit}, '
+          f'p50 {pct(0.5):.3f}, p90 {pct(0.9):.3f}, p99 {pct(0.99):.3f}, '
+          f'max {values[-1]:.3f}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--nodes', type=int, default=5)
+    parser.add_argument('-r', '--runs', type=int, default=100)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, nargs=2, default=[1, 5],
+                        metavar=('MIN', 'MAX'), help='one-way latency in ms')
+    parser.add_argument('--loss', type=float, default=0.0,
+                        help='probability of dropping each message')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=0.5,
+                        help='virtual seconds of client load per run (0 skips it)')
+    parser.add_argument('--fault', choices=['crash', 'partition'], default='crash')
+    parser.add_argument('--warmup', type=float, default=2.0,
+                        help='virtual seconds to run after the election, before measuring')
+    parser.add_argument('--isolate', type=float, default=0.0,
+                        help='cut a follower off for this many seconds (0 skips it)')
+    parser.add_argument('--fixed-timing', action='store_true',
+                        help='fixed heartbeat interval and election timeouts')
+    parser.add_argument('--no-prevote', action='store_true')
+    parser.add_argument('--snapshot-entries', type=int, default=raft.SNAPSHOT_ENTRIES,
+                        help='applied entries kept before they are replaced by a snapshot')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = [simulate(args.seed + run, args) for run in range(args.runs)]
+    elapsed = time.perf_counter() - started
+
+    print(f'{args.runs} runs of {args.nodes} nodes in {elapsed:.2f} s')
+    summarize('election', 's', [r[0] for r in results])
+    if args.duration > 0:
+        summarize('throughput', 'commits/s', [r[1] for r in results])
+    if args.isolate > 0:
+        summarize('disruption', 's', [r[2] for r in results])
+    summarize('failover', 's', [r[3] for r in results])
+    summarize('heartbeat', 's', [r[4] for r in results])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
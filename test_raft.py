@@ -0,0 +1,40 @@
+# test_raft.py
+
+import raftsim
+
+
+def elected(size=3):
+    cluster = raftsim.Cluster(size=size, seed=1)
+    assert cluster.run_until(cluster.leader, timeout=30)
+    return cluster
+
+
+def test_malformed_client_requests_are_refused():
+    cluster = elected()
+    leader = cluster.leader()
+    requests = [
+        {"type": "ClientRequest", "payload": ["a"]},
+        {"type": "ClientRequest", "operation": "take2", "payload": ["a"]},
+        {"type": "ClientRequest", "operation": "noop", "payload": None},
+        {"type": "ClientRequest", "operation": "write"},
+        {"type": "ClientRequest", "operation": "read"},
+        {"type": "ClientRequest", "id": ["x"], "operation": "write", "payload": ["a"]},
+    ]
+    replies = []
+    for request in requests:
+        leader.handle_message(request, replies.append)
+
+    assert len(replies) == len(requests)
+    assert all(not reply["success"] and reply["error"] for reply in replies)
+    assert leader.state == "leader" and leader.last_applied == leader.commit_idx
+
+
+def test_leader_serves_requests_after_a_malformed_one():
+    cluster = elected()
+    cluster.leader().handle_message({"type": "ClientRequest", "operation": "take2"},
+                                    lambda reply: None)
+    replies = []
+    cluster.submit("write", ["a"], "r1", replies.append)
+    assert cluster.run_until(lambda: replies, timeout=5)
+    assert replies[0]["success"]
+    cluster.check_consistency()
@@ -57,7 +57,8 @@ config = read_config
 ts_name = config['name']
 ts_uri  = config['uri']
 
-notify_addrs = config['notify']
+# the adapter only announces itself by multicast
+notify_addrs = config['notify'].select { |dest| dest.key? 'address' }
 
 adapter_host        = config['adapter']['host']
 adapter_port        = config['adapter']['port']
@@ -72,10 +73,19 @@ puts "Adapter for tuplespace #{ts_name} started at #{adapter_uri}"
 
 begin
   sock = open_multicast_socket
-  notify_addrs.each do |dest|
-    puts "Sending notifications to udp://#{dest['address']}:#{dest['port']}"
+  if config['subscriptions']
+    # the tuplespace passes it on, numbered, to its multicast groups and
+    # to subscribers
+    ts_host = config['subscriptions'].fetch('host', 'localhost')
+    ts_port = config['subscriptions']['port']
+    puts "Announcing adapter to udp://#{ts_host}:#{ts_port}"
+    sock.send "ANNOUNCE #{ts_name} adapter #{adapter_uri}", 0, ts_host, ts_port
+  else
+    notify_addrs.each do |dest|
+      puts "Sending notifications to udp://#{dest['address']}:#{dest['port']}"
+    end
+    notify_all notify_addrs, sock, "#{ts_name} adapter #{adapter_uri}"
   end
-  notify_all notify_addrs, sock, "#{ts_name} adapter #{adapter_uri}"
 ensure
   sock.close
 end
@@ -105,9 +115,11 @@ server.add_handler('_rdall') do |tuple|
 end
 
 
-server.add_handler('_out') do |tuple|
-    ts.write map_symbols_in(tuple)
+# a lambda, so that its arity is -2 and XMLRPC accepts calls with or
+# without a lease (a block with an optional argument has arity 1)
+server.add_handler('_out', &lambda { |tuple, sec = nil|
+    ts.write map_symbols_in(tuple), sec
     nil
-end
+})
 
 server.serve
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+# bench_join.py
+
+# Measures how long a new tupleserver.py node takes to become useful,
+# for histories of increasing length, when
+#
+#   eager: the whole history is replayed into it first, one _out at a
+#          time, as recovery.py does, and
+#   lazy:  it joins from a statetransfer.py service (`join:`), and
+#          fetches tuples as they are needed.
+#
+# "first serve" is the time from the node accepting connections to its
+# answer to a read of the `users` bindings, which every client starts
+# with (see nameserver.py). For the lazy node, "cold miss" is a read of
+# an old post, which has to be fetched, and "synced" the time from
+# joining until the background sync has finished.
+#
+#     $ ./bench_join.py --history 1000 10000 50000
+
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+import proxy
+import statetransfer
+
+HOST = 'localhost'
+USERS = 50
+
+
+def history(length):
+    yield ['users', {f'user{i}': f'http://{HOST}:{9000 + i}' for i in range(USERS)}]
+    for i in range(length):
+        yield [f'user{i % USERS}', 'topic', f'post {i}']
+
+
+def run_state(port, length):
+    state = statetransfer.LiveState()
+    for tupl in history(length):
+        state.write(tupl)
+    statetransfer.serve_state(state, HOST, port).serve_forever()
+
+
+def start_node(port, join=None):
+    conf = {'name': 'joiner', 'notify': [], 'filters': [],
+            'adapter': {'host': HOST, 'port': port}}
+    if join:
+        conf['join'] = join
+    config_file = tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False)
+    yaml.safe_dump(conf, config_file)
+    config_file.close()
+
+    node = subprocess.Popen([sys.executable, '-u', 'tupleserver.py', '-c', config_file.name],
+                            stdout=subprocess.PIPE, text=True)
+    wait_for(node, 'started at')
+    return node, config_file.name
+
+
+def wait_for(node, text):
+    for line in node.stdout:
+        if text in line:
+            return line
+    raise RuntimeError(f'{text!r} never printed')
+
+
+def stop(node, config_file):
+    node.terminate()
+    node.wait()
+    os.unlink(config_file)
+
+
+def eager(port, length):
+    node, config_file = start_node(port)
+    start = time.perf_counter()
+    ts = proxy.TupleSpaceAdapter(f'http://{HOST}:{port}')
+    for tupl in history(length):
+        ts._out(tupl)
+    assert ts._rdp(('users', None))
+    first_serve = time.perf_counter() - start
+    stop(node, config_file)
+    return first_serve
+
+
+def lazy(port, state_port, length):
+    node, config_file = start_node(port, f'http://{HOST}:{state_port}')
+    start = time.perf_counter()
+    ts = proxy.TupleSpaceAdapter(f'http://{HOST}:{port}')
+    assert ts._rdp(('users', None))
+    first_serve = time.perf_counter() - start
+
+    miss_start = time.perf_counter()
+    assert ts._rdp(('user7', 'topic', 'post 7'))
+    cold_miss = time.perf_counter() - miss_start
+
+    # "Synced n tuples from uri in t s"
+    synced = float(wait_for(node, 'Synced').split()[-2])
+    stop(node, config_file)
+    return first_serve, cold_miss, synced
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-H', '--history', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--max-eager', type=int, default=20000,
+                        help='longest history to replay eagerly')
+    parser.add_argument('-p', '--port', type=int, default=8300)
+    args = parser.parse_args()
+
+    for i, length in enumerate(args.history):
+        state_port = args.port + 100 + i
+        state = multiprocessing.Process(target=run_state, args=(state_port, length), daemon=True)
+        state.start()
+        time.sleep(1 + length / 50000)  # let it load the history
+
+        if length <= args.max_eager:
+            print(f'{length:>7} writes   eager: first serve {eager(args.port, length):7.3f} s')
+        first_serve, cold_miss, synced = lazy(args.port + 1, state_port, length)
+        print(f'{length:>7} writes    lazy: first serve {first_serve:7.3f} s, '
+              f'cold miss {cold_miss:.3f} s, synced {synced:.2f} s')
+
+        state.terminate()
+        state.join()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
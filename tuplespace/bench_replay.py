@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+# bench_replay.py
+
+# Measures replay throughput (see replay.py) as the number of worker
+# connections grows.
+#
+# Generates a log of posts by many users, some of them taken again
+# later, and replays it into a fresh tupleserver.py node for each
+# worker count. The node answers every request after --delay seconds,
+# standing in for the round trip to a remote adapter. After each
+# replay, checks that the node holds exactly the tuples a serial replay
+# would leave.
+#
+#     $ ./bench_replay.py --operations 5000 --users 200 --workers 1 2 4 8 16
+
+import argparse
+import asyncio
+import collections
+import json
+import multiprocessing
+import random
+import sys
+import time
+
+import proxy
+import replay
+import tupleserver
+
+HOST = 'localhost'
+
+
+class DelayedAdapter(tupleserver.Adapter):
+    def __init__(self, ts, delay):
+        super().__init__(ts)
+        self.delay = delay
+
+    def call(self, method, params):
+        return asyncio.ensure_future(self.delayed(super().call(method, params)))
+
+    async def delayed(self, result):
+        await asyncio.sleep(self.delay)
+        if isinstance(result, asyncio.Future):
+            return await result
+        return result
+
+
+def run_node(port, delay):
+    async def serve():
+        adapter = DelayedAdapter(tupleserver.TupleSpace(), delay)
+        server = await asyncio.get_running_loop().create_server(
+            lambda: tupleserver.HttpProtocol(adapter), HOST, port)
+        await server.serve_forever()
+    asyncio.run(serve())
+
+
+def make_log(operations, users, seed):
+    rng = random.Random(seed)
+    live = []
+    events = []
+    for i in range(operations):
+        if live and rng.random() < 0.2:
+            tupl = live.pop(rng.randrange(len(live)))
+            event = 'take'
+        else:
+            tupl = [f'user{rng.randrange(users)}', 'topic', f'post {i}']
+            live.append(tupl)
+            event = 'write'
+        events.append({'name': 'alice', 'event': event, 'message': json.dumps(tupl)})
+    return events, live
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--operations', type=int, default=5000)
+    parser.add_argument('-u', '--users', type=int, default=200)
+    parser.add_argument('-w', '--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('-d', '--delay', type=float, default=0.002,
+                        help='seconds the node takes to answer each request')
+    parser.add_argument('-p', '--port', type=int, default=8400)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    events, live = make_log(args.operations, args.users, args.seed)
+    expected = collections.Counter(json.dumps(tupl) for tupl in live)
+
+    baseline = None
+    for i, workers in enumerate(args.workers):
+        port = args.port + i
+        node = multiprocessing.Process(target=run_node, args=(port, args.delay), daemon=True)
+        node.start()
+        time.sleep(0.5)
+
+        address = f'http://{HOST}:{port}'
+        stats = replay.replay_history(address, events, workers)
+        held = proxy.TupleSpaceAdapter(address)._rdall((None, None, None))
+        assert collections.Counter(json.dumps(tupl) for tupl in held) == expected
+
+        rate = stats['ops_per_second']
+        baseline = baseline or rate
+        print(f'{workers:>3} workers: {rate:8.1f} ops/s ({rate / baseline:.2f}x), '
+              f'{stats["partitions"]} partitions')
+
+        node.terminate()
+        node.join()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
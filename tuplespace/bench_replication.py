@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+# bench_replication.py
+
+# Measures write throughput of a replicated tuplespace, either with
+# multicast replication (Procfile_TSM) or with Raft (Procfile_Raft).
+#
+# N tuples are written through the first configuration's node, then
+# every replica's adapter is polled until it holds all N. Two rates
+# are reported: how fast the writes were accepted, and how fast they
+# were visible on every replica.
+#
+#     $ ./bench_replication.py multicast -n 1000 alice.yaml bob.yaml chuck.yaml
+#     $ ./bench_replication.py raft -n 1000 alice.yaml bob.yaml chuck.yaml
+
+import argparse
+import sys
+import time
+import uuid
+
+import yaml
+
+import proxy
+
+
+def adapter_uri(conf):
+    return f'http://{conf["adapter"]["host"]}:{conf["adapter"]["port"]}'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('mode', choices=['multicast', 'raft'])
+    parser.add_argument('configs', metavar='file', nargs='+')
+    parser.add_argument('-n', '--count', type=int, default=1000)
+    parser.add_argument('-t', '--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    confs = []
+    for filename in args.configs:
+        with open(filename, 'r') as stream:
+            confs.append(yaml.safe_load(stream))
+
+    if args.mode == 'raft':
+        import raftspace
+        ts = raftspace.RaftTupleSpaceAdapter([c['raft']['addr'] for c in confs])
+    else:
+        ts = proxy.TupleSpaceAdapter(adapter_uri(confs[0]))
+
+    replicas = [proxy.TupleSpaceAdapter(adapter_uri(c)) for c in confs]
+
+    # a fresh tag per run keeps earlier runs from being counted
+    tag = uuid.uuid4().hex
+
+    start = time.perf_counter()
+    for i in range(args.count):
+        ts._out(('bench', tag, i))
+    written = time.perf_counter() - start
+
+    waiting = list(replicas)
+    while waiting and time.perf_counter() - start < args.timeout:
+        waiting = [r for r in waiting
+                   if len(r._rdall(('bench', tag, int))) < args.count]
+        if waiting:
+            time.sleep(0.05)
+    replicated = time.perf_counter() - start
+
+    print(f'{args.mode}: {args.count} writes to {len(replicas)} replicas')
+    print(f'  accepted:   {written:.3f} s ({args.count / written:.1f} writes/s)')
+    if waiting:
+        print(f'  replicated: TIMED OUT, {len(waiting)} replicas incomplete')
+        return 1
+    print(f'  replicated: {replicated:.3f} s ({args.count / replicated:.1f} writes/s)')
+
+    # clean up after ourselves on every replica
+    for _ in range(args.count):
+        ts._inp(('bench', tag, int))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
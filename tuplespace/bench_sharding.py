@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+# bench_sharding.py
+
+# Measures Raft commit throughput as the number of groups grows.
+#
+# For each group count, starts a cluster of Raft nodes (one process
+# each, hosting every group, see raft.MultiServer) and a number of
+# client processes. Each client writes (user, 'bench', i) tuples
+# through a ShardedTupleSpaceAdapter for a fixed time, cycling through
+# many users so that writes land on every group.
+#
+# Nodes apply entries to a counter instead of a tuplespace, so this
+# measures Raft alone and needs no Ruby processes.
+#
+#     $ ./bench_sharding.py --groups 1 2 4 --nodes 3 --clients 16
+
+import argparse
+import multiprocessing
+import sys
+import time
+
+import raftspace  # also puts raft.py on the path
+import raft
+
+
+class CountingStateMachine:
+    def __init__(self):
+        self.applied = 0
+
+    def apply(self, entry):
+        self.applied += 1
+
+    def query(self, request):
+        return self.applied
+
+
+def run_node(addr, peers, groups):
+    state_machines = [CountingStateMachine() for _ in range(groups)]
+    raft.MultiServer(addr, peers, groups, state_machines, verbose=False).run()
+
+
+def run_client(nodes, groups, client, duration, counts):
+    ts = raftspace.ShardedTupleSpaceAdapter(nodes, groups)
+
+    # wait for every group to elect a leader before starting the clock
+    for group in ts.groups:
+        group.request('read', [])
+
+    written = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        ts._out((f'user{client}-{written % 100}', 'bench', written))
+        written += 1
+    counts.put(written)
+
+
+def bench(groups, args):
+    nodes = [f'tcp://127.0.0.1:{args.port + i}' for i in range(args.nodes)]
+
+    servers = [multiprocessing.Process(target=run_node,
+                                       args=(node, [p for p in nodes if p != node], groups),
+                                       daemon=True)
+               for node in nodes]
+    for server in servers:
+        server.start()
+
+    counts = multiprocessing.Queue()
+    clients = [multiprocessing.Process(target=run_client,
+                                       args=(nodes, groups, client, args.duration, counts))
+               for client in range(args.clients)]
+    for client in clients:
+        client.start()
+
+    written = sum(counts.get() for _ in clients)
+    for client in clients:
+        client.join()
+    for server in servers:
+        server.terminate()
+        server.join()
+
+    return written / args.duration
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-g', '--groups', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('-n', '--nodes', type=int, default=3)
+    parser.add_argument('-c', '--clients', type=int, default=16)
+    parser.add_argument('-d', '--duration', type=float, default=10)
+    parser.add_argument('-p', '--port', type=int, default=9100)
+    args = parser.parse_args()
+
+    baseline = None
+    for groups in args.groups:
+        rate = bench(groups, args)
+        baseline = baseline or rate
+        print(f'{groups} groups: {rate:.1f} writes/s ({rate / baseline:.2f}x)')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+# bench_startup.py
+
+# Measures how long the Python entry points take to start.
+#
+# Runs each command --runs times, in a fresh interpreter, and reports
+# the median wall time until it is ready: until it exits, for one-shot
+# commands such as mblog.py, or until it prints its "Listening on"
+# line, for daemons. Then runs it once more under `python -X importtime`
+# and reports the time spent importing modules, and the slowest ones.
+#
+# With --cli, the commands are run as `python3 -m tuplespace COMMAND`
+# instead of as scripts.
+#
+# The manager and the recovery service truncate their logs (a node's
+# .replicationLog-NAME, .manifest) in the directory they run in, so
+# each command runs in a temporary directory, with a copy of alice.yaml
+# renamed to a throwaway node, and never touches a real node's files.
+#
+#     $ ./bench_startup.py --runs 20
+#     $ ./bench_startup.py --runs 20 --cli
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+NODE = 'bench-startup'
+
+# name, script, arguments, line printed once it is ready (None: wait for exit)
+COMMANDS = [
+    ('workshop', 'workshop.py', ['-c', f'{NODE}.yaml'], None),
+    ('manager', 'tuplespaceManager.py', ['224.0.0.1', '54390', '-c', f'{NODE}.yaml'], 'Listening on'),
+    ('recovery', 'recovery.py', ['224.0.0.1', '54391'], 'Listening on'),
+    ('mblog', 'mblog.py', ['nobody', 'distsys', 'hello'], None),
+]
+
+
+def command_line(name, script, args, cli, *options):
+    if cli:
+        return [sys.executable, *options, '-u', '-m', 'tuplespace', name, *args]
+    return [sys.executable, *options, '-u', os.path.join(HERE, script), *args]
+
+
+def scratch(directory):
+    """Copy alice.yaml into directory as the configuration of NODE"""
+    with open(os.path.join(HERE, 'alice.yaml')) as stream:
+        conf = re.sub(r'^name: .*$', f'name: {NODE}', stream.read(), count=1, flags=re.M)
+    with open(os.path.join(directory, f'{NODE}.yaml'), 'w') as stream:
+        stream.write(conf)
+
+
+def run(argv, ready, directory):
+    """Wall time until argv prints ready, or exits, and what it wrote to stderr"""
+    # the scripts import their sibling modules, and -m needs the package
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        filter(None, [HERE, os.environ.get('PYTHONPATH')])))
+    start = time.perf_counter()
+    process = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, text=True, cwd=directory, env=env)
+    if ready:
+        for line in process.stdout:
+            if ready in line:
+                break
+        elapsed = time.perf_counter() - start
+        process.terminate()
+    else:
+        process.stdout.read()
+        elapsed = time.perf_counter() - start
+    stderr = process.stderr.read()
+    process.wait()
+    return elapsed, stderr
+
+
+def imports(stderr):
+    """Total and per-module cumulative import times, in microseconds"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not name[1:].startswith(' '):     # only top-level imports
+            modules.append((int(cumulative), name.strip()))
+    return sum(us for us, _ in modules), sorted(modules, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--runs', type=int, default=20)
+    parser.add_argument('--cli', action='store_true',
+                        help='run the commands with python3 -m tuplespace')
+    parser.add_argument('-s', '--slowest', type=int, default=3,
+                        help='number of slowest imports to show')
+    args = parser.parse_args()
+
+    for name, script, arguments, ready in COMMANDS:
+        with tempfile.TemporaryDirectory(prefix=f'{NODE}-') as directory:
+            scratch(directory)
+            argv = command_line(name, script, arguments, args.cli)
+            times = [run(argv, ready, directory)[0] for _ in range(args.runs)]
+            _, stderr = run(command_line(name, script, arguments, args.cli, '-X', 'importtime'),
+                            ready, directory)
+        total, modules = imports(stderr)
+        slowest = ', '.join(f'{module} {us / 1000:.1f}' for us, module in modules[:args.slowest])
+        print(f'{name:>9}: {statistics.median(times) * 1000:6.1f} ms to ready, '
+              f'{total / 1000:5.1f} ms importing ({slowest})')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+# bench_storage.py
+
+# Measures how much memory tupleserver.py holds on to as posts pile up,
+# with and without a memory budget (see tuplestore.py), and what it
+# costs to read them back.
+#
+# For each budget, starts a server, writes --posts microblog posts by
+# --users users (with system.multicall, --batch at a time), and
+# reports the growth in the server's resident memory, and how many
+# tuples were spilled. Then times _rdp of the newest post of a user
+# (in memory) and of the oldest (spilled, once there is a budget).
+#
+#     $ ./bench_storage.py --posts 200000 --memory none 16M 4M
+
+import argparse
+import asyncio
+import multiprocessing
+import random
+import sys
+import time
+import xmlrpc.client
+
+import tupleserver
+
+HOST = 'localhost'
+
+
+def run_server(port, memory, policy):
+    conf = {'name': 'bench', 'notify': [], 'filters': [],
+            'adapter': {'host': HOST, 'port': port}}
+    if memory != 'none':
+        conf['storage'] = {'memory': memory, 'policy': policy}
+    asyncio.run(tupleserver.serve(conf))
+
+
+def rss(pid):
+    """Resident memory of a process, in bytes"""
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+
+
+def post(i, users):
+    return [f'user{i % users}', 'distsys', f'post {i}: ' + 'x' * 100]
+
+
+def timed(ts, template, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        assert ts._rd(template, 0) is not None
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--posts', type=int, default=200000)
+    parser.add_argument('-u', '--users', type=int, default=100)
+    parser.add_argument('-m', '--memory', nargs='+', default=['none', '16M', '4M'],
+                        help="budgets to try ('none' for no limit)")
+    parser.add_argument('--policy', choices=['lru', 'age'], default='lru')
+    parser.add_argument('-b', '--batch', type=int, default=1000,
+                        help='writes per system.multicall')
+    parser.add_argument('-r', '--repeat', type=int, default=200)
+    parser.add_argument('-p', '--port', type=int, default=8600)
+    args = parser.parse_args()
+
+    for i, memory in enumerate(args.memory):
+        port = args.port + i
+        server = multiprocessing.Process(target=run_server, args=(port, memory, args.policy),
+                                         daemon=True)
+        server.start()
+        time.sleep(1)
+
+        ts = xmlrpc.client.ServerProxy(f'http://{HOST}:{port}', allow_none=True)
+        before = rss(server.pid)
+        start = time.perf_counter()
+        for first in range(0, args.posts, args.batch):
+            ts.system.multicall([{'methodName': '_out', 'params': [post(j, args.users)]}
+                                 for j in range(first, min(first + args.batch, args.posts))])
+        elapsed = time.perf_counter() - start
+        grown = rss(server.pid) - before
+
+        user = random.randrange(args.users)
+        newest = args.posts - args.users + user
+        hot = timed(ts, [f'user{user}', 'distsys', post(newest, args.users)[2]], args.repeat)
+        cold = timed(ts, [f'user{user}', 'distsys', post(user, args.users)[2]], args.repeat)
+        print(f'{memory:>6}: +{grown / 1e6:6.1f} MB for {args.posts} posts '
+              f'({args.posts / elapsed:.0f} writes/s), '
+              f'newest {hot * 1000:.2f} ms, oldest {cold * 1000:.2f} ms')
+
+        server.terminate()
+        server.join()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
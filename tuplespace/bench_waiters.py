@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+# bench_waiters.py
+
+# Measures what blocked clients cost tupleserver.py.
+#
+# For each count N, starts a server, opens N keep-alive connections,
+# and has each of them call _in((f'waiter{i}', int), None), which
+# blocks. Once they are all parked, it reports how much the server's
+# resident memory has grown, per waiter, then writes the N tuples they
+# are waiting for (with system.multicall, --batch at a time) and times
+# how long it takes for every waiter to get its answer.
+#
+#     $ ./bench_waiters.py --waiters 1000 5000 10000
+
+import argparse
+import asyncio
+import multiprocessing
+import sys
+import time
+import xmlrpc.client
+
+import tupleserver
+
+HOST = 'localhost'
+
+
+def run_server(port):
+    conf = {'name': 'bench', 'notify': [], 'filters': [],
+            'adapter': {'host': HOST, 'port': port}}
+    tupleserver.raise_fd_limit()
+    asyncio.run(tupleserver.serve(conf))
+
+
+def rss(pid):
+    """Resident memory of a process, in bytes"""
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+
+
+def request(method, *params):
+    body = xmlrpc.client.dumps(params, method, allow_none=True).encode()
+    return (f'POST /RPC2 HTTP/1.1\r\nHost: {HOST}\r\nContent-Type: text/xml\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n').encode() + body
+
+
+async def call(reader, writer, method, *params):
+    writer.write(request(method, *params))
+    head = await reader.readuntil(b'\r\n\r\n')
+    length = int(head.lower().split(b'content-length:')[1].split(b'\r\n')[0])
+    return xmlrpc.client.loads(await reader.readexactly(length))[0][0]
+
+
+async def bench(port, pid, waiters, batch):
+    connections = []
+    for _ in range(waiters):
+        connections.append(await asyncio.open_connection(HOST, port))
+
+    before = rss(pid)
+    pending = [asyncio.ensure_future(call(reader, writer, '_in', [f'waiter{i}', {'class': 'Numeric'}], None))
+               for i, (reader, writer) in enumerate(connections)]
+
+    # let the server take in every request
+    reader, writer = await asyncio.open_connection(HOST, port)
+    await asyncio.sleep(1)
+    await call(reader, writer, '_rdall', ['nothing'])
+    parked = rss(pid)
+
+    start = time.perf_counter()
+    for first in range(0, waiters, batch):
+        calls = [{'methodName': '_out', 'params': [[f'waiter{i}', i]]}
+                 for i in range(first, min(first + batch, waiters))]
+        await call(reader, writer, 'system.multicall', calls)
+    results = await asyncio.gather(*pending)
+    elapsed = time.perf_counter() - start
+
+    assert [result[1] for result in results] == list(range(waiters))
+    for _, w in connections + [(reader, writer)]:
+        w.close()
+    return parked - before, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-w', '--waiters', type=int, nargs='+', default=[1000, 5000, 10000])
+    parser.add_argument('-b', '--batch', type=int, default=500,
+                        help='writes per system.multicall')
+    parser.add_argument('-p', '--port', type=int, default=8200)
+    args = parser.parse_args()
+
+    tupleserver.raise_fd_limit()
+    for i, waiters in enumerate(args.waiters):
+        port = args.port + i
+        server = multiprocessing.Process(target=run_server, args=(port,), daemon=True)
+        server.start()
+        time.sleep(1)
+
+        grown, elapsed = asyncio.run(bench(port, server.pid, waiters, args.batch))
+        print(f'{waiters:>6} waiters: +{grown / 1e6:6.1f} MB, {grown / waiters:6.0f} bytes each, '
+              f'all woken in {elapsed:.2f} s ({waiters / elapsed:.0f}/s)')
+
+        server.terminate()
+        server.join()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
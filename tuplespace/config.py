@@ -1,12 +1,101 @@
-import yaml
-import argparse
+# config.py
 
-def read_config():
+# Reads the YAML configuration named by -c/--config.
+#
+# Importing yaml and argparse takes longer than most of the commands
+# that read a configuration take to do their work, so neither is
+# imported unless needed:
+#
+#   - The command line is scanned for -c/--config directly. argparse is
+#     only used when there is something else to handle (-h, an unknown
+#     option, more than two positionals), so usage and errors are
+#     reported as before.
+#
+#   - The parsed configuration is cached as JSON in __pycache__ next to
+#     the YAML file, keyed on its modification time and size, much as
+#     Python caches bytecode. yaml is only imported when the file has
+#     changed since it was cached (or a configuration can't be stored
+#     as JSON).
+
+import json
+import os
+import sys
+
+DEFAULT = 'tuplespace.yaml'
+CACHE_DIR = '__pycache__'
+
+
+def parse_args(argv):
+    import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('group', type = str, nargs='?')
-    parser.add_argument('port', type = int, nargs='?')
-    parser.add_argument('-c', '--config', metavar='file', type=str, default='tuplespace.yaml')
-    args = parser.parse_args()
+    parser.add_argument('port', type = str, nargs='?')
+    parser.add_argument('-c', '--config', metavar='file', type=str, default=DEFAULT)
+    return parser.parse_args(argv)
+
+
+def config_file(argv):
+    """The -c/--config argument in argv, or None if argparse is needed"""
+    filename = DEFAULT
+    positionals = []
+    args = iter(argv)
+    for arg in args:
+        if arg in ('-c', '--config'):
+            filename = next(args, None)
+            if filename is None or filename.startswith('-'):
+                return None
+        elif arg.startswith('--config='):
+            filename = arg[len('--config='):]
+        elif arg.startswith('-'):
+            return None
+        else:
+            positionals.append(arg)
+    if len(positionals) > 2:
+        return None
+    return filename
+
+
+def read_config():
+    filename = config_file(sys.argv[1:])
+    if filename is None:
+        filename = parse_args(sys.argv[1:]).config
+    return load_config(filename)
+
+
+def cache_file(filename):
+    directory, name = os.path.split(os.path.abspath(filename))
+    return os.path.join(directory, CACHE_DIR, f'{name}.json')
+
+
+def load_config(filename):
+    """The configuration in filename, parsed only when it has changed"""
+    stat = os.stat(filename)
+    key = [os.path.abspath(filename), stat.st_mtime_ns, stat.st_size]
+    cache = cache_file(filename)
+    try:
+        with open(cache) as cached:
+            entry = json.load(cached)
+        if entry['key'] == key:
+            return entry['config']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    import yaml
+    with open(filename, 'r') as stream:
+        config = yaml.safe_load(stream)
+    store(cache, key, config)
+    return config
+
 
-    with open(args.config, 'r') as stream:
-        return yaml.safe_load(stream)
+def store(cache, key, config):
+    try:
+        text = json.dumps({'key': key, 'config': config})
+        if json.loads(text)['config'] != config:
+            return      # e.g. integer keys, which JSON turns into strings
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        temporary = f'{cache}.{os.getpid()}'
+        with open(temporary, 'w') as cached:
+            cached.write(text)
+        os.replace(temporary, cache)
+    except (OSError, TypeError, ValueError):
+        pass            # not cached; it will be parsed again next time
@@ -1,9 +1,7 @@
 #!/usr/bin/env python3
 
 import sys
-import socket
 import proxy
-import config
 
 
 # the third argument must be surrounded by quotations when invoked
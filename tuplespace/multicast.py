@@ -0,0 +1,407 @@
+# multicast.py
+
+# Receives notifications sent by the tuplespace (see multicast.rb) in
+# order, without gaps.
+#
+# Every notification from a ReliableNotifier carries a sequence number.
+# The Receiver keeps track of the next one expected from each sender,
+# and holds back anything that arrives early. When it sees a gap, it
+# asks the sender to retransmit what is missing (NACK from to), and
+# asks again if nothing arrives within nack_timeout. After max_nacks
+# attempts, or if the sender no longer has them, the missing
+# notifications are counted as lost and delivery carries on.
+#
+# Notifications without a sequence number (such as the one-shot
+# `adapter` notification) are delivered as soon as they arrive.
+#
+# While a notification is handled, last_id is [sender, seq]: the same
+# for every Receiver in the group, so that two listeners can tell they
+# saw the same event (see statetransfer.py). It is None for unnumbered
+# notifications, and for subscriptions, which are numbered for each
+# subscriber.
+#
+#     receiver = multicast.Receiver('224.0.0.1', 54321)
+#     for notification in receiver:
+#         print(notification)
+#
+# or, equivalently:
+#
+#     receiver.run(print)
+#
+# Instead of joining a multicast group, a Receiver can subscribe to a
+# node's events (see ReliableNotifier in multicast.rb), so that only
+# the events it asks for are sent to it:
+#
+#     receiver = multicast.Receiver('localhost', 54400,
+#                                   subscribe=[['write', ['alice', None, None]]])
+#
+# Listeners use open_receiver(), which also accepts the endpoint of a
+# ZeroMQ publisher (see zmqnotify.py), or udp://HOST:PORT to subscribe
+# to a node, in place of a multicast group.
+#
+# Notifier is the sending side, for tuplespaces written in Python (see
+# tupleserver.py). It speaks the same protocol as ReliableNotifier.
+
+import collections
+import json
+import socket
+import struct
+import time
+
+# per <https://en.wikipedia.org/wiki/User_Datagram_Protocol>
+MAX_UDP_PAYLOAD = 65507
+
+# a subscription to every event, from any tuplespace
+EVERYTHING = [[None, None]]
+
+
+def notif_to_dict(notification):
+    """Converts a notification decoded from the network into a dictionary"""
+    notification = notification.replace(" ", ",", 2) # comma separate our three fields
+    notification = notification.split(",", 2)
+
+    return { "name": notification[0],
+             "event": notification[1],
+             "message": notification[2]
+    }
+
+
+def open_receiver(address, port=None, subscriptions=None, **kwargs):
+    """Opens a Receiver for a multicast group and port, a Receiver
+    subscribed to a node at udp://HOST:PORT, or a zmqnotify.Receiver for
+    a ZeroMQ endpoint and optional topic prefix
+
+    For a node, port may be a JSON list of subscriptions, which is used
+    instead of the listener's own. Without either, every event is sent.
+
+    kwargs may hold options for either kind of receiver (see Receiver.OPTIONS);
+    each is given only those it takes.
+
+    """
+    if address.startswith('udp://'):
+        host, _, node_port = address[len('udp://'):].rpartition(':')
+        if port:
+            subscriptions = json.loads(port)
+        return Receiver(host, node_port, subscribe=subscriptions or EVERYTHING,
+                        **options(Receiver, kwargs))
+    if '://' in address:
+        # only needs pyzmq when it is used
+        import zmqnotify
+        topics = [port] if port else None
+        return zmqnotify.Receiver(address, topics, **options(zmqnotify.Receiver, kwargs))
+    return Receiver(address, port, **options(Receiver, kwargs))
+
+
+def options(receiver, kwargs):
+    return {name: value for name, value in kwargs.items() if name in receiver.OPTIONS}
+
+
+class Notifier:
+    """Sends numbered notifications and answers NACKs, like
+    ReliableNotifier in multicast.rb
+
+    The socket never blocks, so the owner can poll fileno() and call
+    handle_requests() when it is readable, and heartbeat() about once a
+    second.
+
+    """
+
+    def __init__(self, addrs, history=1024):
+        self.addrs = [(dest['address'], int(dest['port'])) for dest in addrs]
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        self.sock.setblocking(False)
+
+        self.history = history
+        self.ring = [None] * history
+        self.seq = 0
+        self.idle = True        # nothing sent since the last heartbeat
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def notify_all(self, notification):
+        self.seq += 1
+        self.ring[self.seq % self.history] = notification
+        self.send_all(f'{self.seq} {notification}')
+        self.idle = False
+
+    def send_all(self, datagram):
+        for addr in self.addrs:
+            self.send(datagram, addr)
+
+    def send(self, datagram, addr):
+        try:
+            self.sock.sendto(datagram.encode(), addr)
+        except BlockingIOError:
+            pass                # dropped, as if lost on the network
+
+    def heartbeat(self):
+        if self.idle and self.seq > 0:
+            self.send_all(f'HEARTBEAT {self.seq}')
+        self.idle = True
+
+    def handle_requests(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(MAX_UDP_PAYLOAD)
+            except BlockingIOError:
+                return
+            request, *fields = data.decode().split()
+            if request == 'NACK' and len(fields) == 2:
+                self.retransmit(int(fields[0]), int(fields[1]), addr)
+
+    def retransmit(self, first, last, addr):
+        last = min(last, self.seq)
+        oldest = max(self.seq - self.history + 1, 1)
+        if first < oldest:
+            self.send(f'EXPIRED {first} {min(last, oldest - 1)}', addr)
+            first = oldest
+        for seq in range(first, last + 1):
+            self.send(f'{seq} {self.ring[seq % self.history]}', addr)
+
+    def close(self):
+        self.sock.close()
+
+
+class Sender:
+    """What the Receiver knows about one sender"""
+
+    def __init__(self, next_seq, key=None):
+        self.key = key          # names the sender in last_id
+        self.next_seq = next_seq
+        self.early = {}         # notifications past a gap, by seq
+        self.gap_end = 0        # highest seq known to exist
+        self.nacks = 0          # retransmission requests for the first gap
+        self.nacked_seq = None  # next_seq when nacks was last reset
+        self.deadline = None    # when to ask again
+
+
+class Receiver:
+    """Delivers multicast notifications in order, per sender
+
+    With subscribe, a list of [event, template] pairs, address and port
+    are those of a node to subscribe to rather than of a multicast
+    group. The subscription is renewed every lease / 3 seconds.
+
+    """
+    OPTIONS = ('rcvbuf', 'nack_timeout', 'max_nacks', 'lease')
+
+    def __init__(self, address, port, rcvbuf=None, nack_timeout=0.05, max_nacks=5,
+                 subscribe=None, lease=30):
+        # See <https://pymotw.com/3/socket/multicast.html> for details
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if rcvbuf:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+
+        self.node = None
+        if subscribe is None:
+            self.sock.bind(('', int(port)))
+            group = socket.inet_aton(address)
+            mreq = struct.pack('4sL', group, socket.INADDR_ANY)
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+        else:
+            self.node = (socket.gethostbyname(address), int(port))
+            self.subscriptions = subscribe
+            self.lease = lease
+            self.renew_at = 0
+            self.subscribed = False
+
+        self.uri = f'udp://{address}:{port}'
+        self.nack_timeout = nack_timeout
+        self.max_nacks = max_nacks
+        self.senders = {}
+        self.ready = collections.deque()    # (id, notification)
+        self.last_id = None
+
+        self.received = 0       # datagrams carrying a notification
+        self.delivered = 0
+        self.duplicates = 0
+        self.nacked = 0         # retransmission requests sent
+        self.lost = 0
+
+    def __iter__(self):
+        while True:
+            while self.ready:
+                self.delivered += 1
+                self.last_id, notification = self.ready.popleft()
+                yield notification
+            self.receive()
+
+    def run(self, callback):
+        for notification in self:
+            callback(notification)
+
+    def close(self):
+        if self.node:
+            self.sock.sendto(b'UNSUBSCRIBE', self.node)
+        self.sock.close()
+
+    def stats(self):
+        expected = self.delivered + len(self.ready) + self.lost
+        return { "received": self.received,
+                 "delivered": self.delivered,
+                 "duplicates": self.duplicates,
+                 "nacked": self.nacked,
+                 "lost": self.lost,
+                 "loss_rate": self.lost / expected if expected else 0.0
+        }
+
+    def receive(self):
+        """Waits for one datagram, or until the next NACK is due"""
+        deadlines = [s.deadline for s in self.senders.values() if s.deadline]
+        if self.node:
+            if self.renew_at <= time.monotonic():
+                self.renew()
+            deadlines.append(self.renew_at)
+        timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+        self.sock.settimeout(timeout)
+        try:
+            data, addr = self.sock.recvfrom(MAX_UDP_PAYLOAD)
+        except (socket.timeout, BlockingIOError):
+            data = None
+
+        if data:
+            self.handle(data.decode(), addr)
+
+        now = time.monotonic()
+        for addr, sender in self.senders.items():
+            if sender.deadline and sender.deadline <= now:
+                self.request_missing(addr, sender)
+
+    def renew(self):
+        self.sock.sendto(f'SUBSCRIBE {self.lease} {json.dumps(self.subscriptions)}'.encode(),
+                         self.node)
+        # keep asking until the node answers, in case it isn't up yet
+        interval = self.lease / 3 if self.subscribed else 1
+        self.renew_at = time.monotonic() + interval
+        self.subscribed = False
+
+    def handle(self, datagram, addr):
+        head, _, rest = datagram.partition(' ')
+
+        if head == 'HEARTBEAT':
+            sender = self.senders.get(addr)
+            if sender:
+                self.expect(addr, sender, int(rest))
+            return
+
+        if head == 'SUBSCRIBED':
+            seq = int(rest)
+            sender = self.senders.get(addr)
+            if sender is None or seq < sender.next_seq - 1:
+                # a new subscription, or the node has forgotten the old one
+                self.senders[addr] = Sender(seq + 1)   # numbered for us alone
+            self.subscribed = True
+            return
+
+        if head == 'EXPIRED':
+            sender = self.senders.get(addr)
+            if sender:
+                _, last = rest.split()
+                self.skip(sender, int(last))
+            return
+
+        if not head.isdigit():
+            # an unnumbered notification
+            self.received += 1
+            self.ready.append((None, datagram))
+            return
+
+        self.received += 1
+        seq = int(head)
+        sender = self.senders.get(addr)
+        if sender is None:
+            # we can't replay what was sent before we started listening
+            key = None if self.node else f'{addr[0]}:{addr[1]}'
+            sender = self.senders[addr] = Sender(seq, key)
+
+        if seq < sender.next_seq or seq in sender.early:
+            self.duplicates += 1
+            return
+
+        sender.early[seq] = rest
+        self.expect(addr, sender, seq)
+        self.drain(sender)
+
+    def expect(self, addr, sender, seq):
+        """Notes that the sender has sent up to seq, asking for anything
+        we haven't got
+
+        """
+        if seq > sender.gap_end:
+            sender.gap_end = seq
+        if sender.deadline is None and self.missing(sender):
+            self.request_missing(addr, sender)
+
+    def missing(self, sender):
+        return any(seq not in sender.early
+                   for seq in range(sender.next_seq, sender.gap_end + 1))
+
+    def request_missing(self, addr, sender):
+        if not self.missing(sender):
+            sender.deadline = None
+            return
+
+        if sender.nacked_seq != sender.next_seq:
+            # the first gap has changed since we last asked
+            sender.nacks = 0
+            sender.nacked_seq = sender.next_seq
+
+        if sender.nacks >= self.max_nacks:
+            # give up on the first gap and deliver what comes after it
+            if sender.early:
+                self.skip(sender, min(sender.early) - 1)
+            else:
+                self.skip(sender, sender.gap_end)
+            return
+
+        for first, last in self.gaps(sender):
+            self.sock.sendto(f'NACK {first} {last}'.encode(), addr)
+            self.nacked += 1
+        sender.nacks += 1
+        sender.deadline = time.monotonic() + self.nack_timeout
+
+    def gaps(self, sender, limit=16):
+        """The first few ranges of missing sequence numbers"""
+        gaps = []
+        seq = sender.next_seq
+        while seq <= sender.gap_end and len(gaps) < limit:
+            if seq in sender.early:
+                seq += 1
+                continue
+            first = seq
+            while seq + 1 <= sender.gap_end and seq + 1 not in sender.early:
+                seq += 1
+            gaps.append((first, seq))
+            seq += 1
+        return gaps
+
+    def skip(self, sender, last):
+        """Gives up on every notification up to last"""
+        if last < sender.next_seq:
+            return
+        self.lost += sum(1 for seq in range(sender.next_seq, last + 1)
+                         if seq not in sender.early)
+        for seq in range(sender.next_seq, last + 1):
+            notification = sender.early.pop(seq, None)
+            if notification is not None:
+                self.ready.append((self.event_id(sender, seq), notification))
+        sender.next_seq = last + 1
+        sender.nacks = 0
+        sender.deadline = None
+        self.drain(sender)
+
+    def drain(self, sender):
+        """Moves notifications that are now in order to the ready queue"""
+        while sender.next_seq in sender.early:
+            notification = sender.early.pop(sender.next_seq)
+            self.ready.append((self.event_id(sender, sender.next_seq), notification))
+            sender.next_seq += 1
+        if sender.deadline and not self.missing(sender):
+            sender.deadline = None
+        elif sender.deadline is None and self.missing(sender):
+            sender.deadline = time.monotonic() + self.nack_timeout
+
+    def event_id(self, sender, seq):
+        return [sender.key, seq] if sender.key else None
@@ -1,5 +1,7 @@
+require 'json'
 require 'socket'
 
+MAX_UDP_PAYLOAD = 65507
 
 def open_multicast_socket
   sock = UDPSocket.open
@@ -14,3 +16,254 @@ def notify_all(addrs, sock, notification)
   puts notification
 end
 
+# Sends numbered notifications, and keeps the most recent ones so that
+# listeners can ask for the ones they missed.
+#
+# Each datagram is "seq notification", with seq counting up from 1.
+# Listeners (see multicast.py) send requests back to the socket the
+# notifications came from:
+#
+#   NACK from to            resend notifications from..to
+#   SUBSCRIBE lease json    send me only the events matching json
+#   UNSUBSCRIBE
+#
+# NACKs are answered with the notifications themselves, or with
+# "EXPIRED from to" for those no longer kept. SUBSCRIBE is answered
+# with "SUBSCRIBED seq", the last number sent to the subscriber. Every `heartbeat`
+# seconds, "HEARTBEAT seq" tells listeners the latest sequence number,
+# so they notice if the last ones were lost.
+#
+# Subscriptions:
+#
+# With a `port`, the socket is bound to it, so listeners can find it
+# and subscribe instead of joining a multicast group. The json is a
+# list of [event, template] pairs, where a null event matches any
+# event, a null template any payload, and a template otherwise matches
+# tuples of its length whose items are equal, or null in the template:
+#
+#   SUBSCRIBE 30 [["write", ["alice", null, null]], ["adapter", null]]
+#
+# Each subscriber gets its own numbered stream of just the events it
+# asked for, sent to the address it subscribed from, with its own
+# history for NACKs. A subscription lapses unless it is renewed within
+# `lease` seconds.
+#
+# Listeners can also send "ANNOUNCE notification", which is passed to
+# the block given to new, so that a node can publish a notification on
+# behalf of another process (see adapter.rb).
+class ReliableNotifier
+  def initialize(addrs, history = 1024, heartbeat = 1, port: nil, &on_announce)
+    @addrs = addrs
+    @sock = open_multicast_socket
+    @sock.bind '0.0.0.0', port if port
+    @history = history
+    @heartbeat = heartbeat
+    @ring = Array.new(history)
+    @seq = 0
+    @subscribers = {}
+    @index = SubscriptionIndex.new
+    @on_announce = on_announce
+    @lock = Mutex.new
+    @thread = Thread.new { serve_requests }
+  end
+
+  # event and tuple (decoded from JSON) are matched against
+  # subscriptions; without them only subscribers to every event get
+  # the notification
+  def notify_all(notification, event = nil, tuple = nil)
+    @lock.synchronize do
+      unless @addrs.empty?
+        @seq += 1
+        @ring[@seq % @history] = [@seq, notification]
+        send_all "#{@seq} #{notification}"
+      end
+
+      @index.match(event, tuple).each do |subscriber|
+        seq = subscriber.record notification
+        @sock.send "#{seq} #{notification}", 0, *subscriber.addr
+      end
+    end
+  end
+
+  def close
+    @thread.kill
+    @sock.close
+  end
+
+  private
+
+  def send_all(datagram)
+    @addrs.each do |dest|
+      @sock.send datagram, 0, dest['address'], dest['port']
+    end
+  end
+
+  def serve_requests
+    next_tick = now + @heartbeat
+    loop do
+      if IO.select([@sock], nil, nil, [next_tick - now, 0].max)
+        data, addr = @sock.recvfrom(MAX_UDP_PAYLOAD)
+        handle_request data, [addr[3], addr[1]]
+      end
+
+      if now >= next_tick
+        @lock.synchronize { tick }
+        next_tick = now + @heartbeat
+      end
+    end
+  end
+
+  def handle_request(data, addr)
+    request, rest = data.split(' ', 2)
+    case request
+    when 'NACK'
+      from, to = rest.split.map(&:to_i)
+      @lock.synchronize do
+        subscriber = @subscribers[addr]
+        if subscriber
+          subscriber.retransmit(@sock, from, to)
+        else
+          retransmit from, to, *addr
+        end
+      end
+    when 'SUBSCRIBE'
+      lease, json = rest.split(' ', 2)
+      @lock.synchronize { subscribe addr, lease.to_f, JSON.parse(json) }
+    when 'UNSUBSCRIBE'
+      @lock.synchronize { unsubscribe addr }
+    when 'ANNOUNCE'
+      @on_announce&.call rest
+    end
+  rescue StandardError => e
+    puts "Bad request from #{addr.join(':')}: #{e.message}"
+  end
+
+  def subscribe(addr, lease, subscriptions)
+    subscriber = @subscribers[addr] ||= Subscriber.new(addr, @history)
+    subscriber.expires = now + lease
+    @sock.send "SUBSCRIBED #{subscriber.seq}", 0, *addr
+    return if subscriber.subscriptions == subscriptions
+
+    @index.remove subscriber
+    subscriber.subscriptions = subscriptions
+    @index.add subscriber
+  end
+
+  def unsubscribe(addr)
+    subscriber = @subscribers.delete addr
+    @index.remove subscriber if subscriber
+  end
+
+  def tick
+    send_all "HEARTBEAT #{@seq}" if @seq > 0
+    @subscribers.values.each do |subscriber|
+      if subscriber.expires < now
+        unsubscribe subscriber.addr
+      elsif subscriber.seq > 0
+        @sock.send "HEARTBEAT #{subscriber.seq}", 0, *subscriber.addr
+      end
+    end
+  end
+
+  def retransmit(from, to, host, port)
+    to = [to, @seq].min
+    oldest = [@seq - @history + 1, 1].max
+    if from < oldest
+      @sock.send "EXPIRED #{from} #{[to, oldest - 1].min}", 0, host, port
+      from = oldest
+    end
+    (from..to).each do |seq|
+      @sock.send "#{seq} #{@ring[seq % @history][1]}", 0, host, port
+    end
+  end
+
+  def now
+    Process.clock_gettime(Process::CLOCK_MONOTONIC)
+  end
+end
+
+# A listener that subscribed to a ReliableNotifier, with its own
+# numbered stream
+class Subscriber
+  attr_reader :addr, :seq
+  attr_accessor :subscriptions, :expires
+
+  def initialize(addr, history)
+    @addr = addr
+    @history = history
+    @ring = Array.new(history)
+    @seq = 0
+    @subscriptions = []
+  end
+
+  def record(notification)
+    @seq += 1
+    @ring[@seq % @history] = notification
+    @seq
+  end
+
+  def retransmit(sock, from, to)
+    to = [to, @seq].min
+    oldest = [@seq - @history + 1, 1].max
+    if from < oldest
+      sock.send "EXPIRED #{from} #{[to, oldest - 1].min}", 0, *@addr
+      from = oldest
+    end
+    (from..to).each do |seq|
+      sock.send "#{seq} #{@ring[seq % @history]}", 0, *@addr
+    end
+  end
+end
+
+# Finds the subscribers to an event without looking at every
+# subscription. Subscriptions are filed under their event and the
+# first item of their template (nil for either when it is a wildcard),
+# so an event only needs to look in four places.
+class SubscriptionIndex
+  def initialize
+    @buckets = Hash.new { |hash, key| hash[key] = [] }
+  end
+
+  def add(subscriber)
+    subscriber.subscriptions.each do |event, template|
+      @buckets[key(event, template)] << [subscriber, template]
+    end
+  end
+
+  def remove(subscriber)
+    subscriber.subscriptions.each do |event, template|
+      bucket_key = key(event, template)
+      @buckets[bucket_key].reject! { |entry| entry[0].equal? subscriber }
+      @buckets.delete bucket_key if @buckets[bucket_key].empty?
+    end
+  end
+
+  def match(event, tuple)
+    first = tuple.is_a?(Array) ? tuple.first : nil
+    found = []
+    [event, nil].uniq.each do |e|
+      [first, nil].uniq.each do |f|
+        bucket = @buckets.fetch([e, f], nil)
+        next unless bucket
+
+        bucket.each do |subscriber, template|
+          found << subscriber if matches?(template, tuple)
+        end
+      end
+    end
+    found.uniq
+  end
+
+  private
+
+  def key(event, template)
+    [event, template.is_a?(Array) ? template.first : nil]
+  end
+
+  def matches?(template, tuple)
+    return true if template.nil?
+    return false unless tuple.is_a?(Array) && template.size == tuple.size
+
+    template.zip(tuple).all? { |t, v| t.nil? || t == v }
+  end
+end
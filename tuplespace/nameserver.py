@@ -18,37 +18,18 @@
 
 
 import sys
-import struct
-import socket
-import proxy
-
-MAX_UDP_PAYLOAD = 65507
-
-def main(address, port):
-
-    def notif_to_dict(notification):
-        """Converts a notification decoded from the network into a dictionary"""
-        notification = notification.replace(" ", ",", 2) # comma separate our three fields
-        notification = notification.split(",", 2)
-
-        return { "name": notification[0],
-                 "event": notification[1],
-                 "message": notification[2]
-        }
 
+import multicast
+import proxy
 
-    server_address = ('', int(port))
-
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-
-    sock.bind(server_address)
+# when subscribing to a node (udp://HOST:PORT), only these are sent
+SUBSCRIPTIONS = [['start', None], ['adapter', None]]
 
-    group = socket.inet_aton(address)
-    mreq = struct.pack('4sL', group, socket.INADDR_ANY)
+def main(address, port=None):
 
-    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    receiver = multicast.open_receiver(address, port, SUBSCRIPTIONS)
 
-    print(f'Listening on udp://{address}:{port}')
+    print(f'Listening on {receiver.uri}')
 
     try:
 
@@ -67,11 +48,8 @@ def main(address, port):
         # connect to our tuplespace
         ts = proxy.TupleSpaceAdapter("http://localhost:8001")
 
-        while True:
-            data, _ = sock.recvfrom(MAX_UDP_PAYLOAD)
-            notification = data.decode()
-            notif_dict = notif_to_dict(notification)
-
+        for notification in receiver:
+            notif_dict = multicast.notif_to_dict(notification)
 
             if notif_dict["event"] == "start":
                 print(f'nameserver: {notif_dict}')
@@ -100,15 +78,16 @@ def main(address, port):
 
     except Exception as e:
         print(e)
-        sock.close()
+        print(receiver.stats())
+        receiver.close()
 
 def usage(program):
-    print(f'Usage: {program} ADDRESS PORT', file=sys.stderr)
+    print(f'Usage: {program} ADDRESS PORT | ENDPOINT [TOPIC]', file=sys.stderr)
     sys.exit(1)
 
 
 if __name__ == '__main__':
-    if len(sys.argv) != 3:
+    if len(sys.argv) not in (2, 3):
         usage(sys.argv[0])
 
     sys.exit(main(*sys.argv[1:]))
@@ -1,6 +1,4 @@
 import re
-import typing
-import xmlrpc.client
 
 # Credit to Yu Kou (<yuki.coco@csu.fullerton.edu>)
 # for making this suggestion and working on type mappings.
@@ -16,15 +14,24 @@ class TupleSpaceAdapter:
 
     def __init__(self, uri):
         self.uri = uri
-        self.ts = xmlrpc.client.ServerProxy(self.uri, allow_none=True)
+        self._ts = None
+
+    @property
+    def ts(self):
+        # the connection is made on first use, so that clients that
+        # never call the adapter don't pay for importing xmlrpc.client
+        if self._ts is None:
+            import xmlrpc.client
+            self._ts = xmlrpc.client.ServerProxy(self.uri, allow_none=True)
+        return self._ts
 
     def map_template_out(self, item):
-        if isinstance(item, typing.Type):
+        if isinstance(item, type):
             python_type = item.__name__
             ruby_type = self.PYTHON_TO_RUBY[python_type]
             if ruby_type is not None:
                 return { 'class': ruby_type }
-        elif isinstance(item, typing.Pattern):
+        elif isinstance(item, re.Pattern):
             return { 'regexp': item.pattern }
         elif isinstance(item, self.RANGE_TYPE):
             return { 'from': item.start, 'to': item.stop - 1 }
@@ -48,5 +55,9 @@ class TupleSpaceAdapter:
     def _rdp(self, tupl):
         return self.ts._rd(self.map_templates_out(tupl), 0)
 
-    def _out(self, tupl):
-        self.ts._out(tupl)
+    def _out(self, tupl, sec=None):
+        if sec is None:
+            self.ts._out(tupl)
+        else:
+            # a lease: the tuple expires after sec seconds
+            self.ts._out(tupl, sec)
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+
+# raftspace.py
+
+# Raft-replicated tuplespace.
+#
+# Instead of multicasting every event and re-playing it on each node
+# (see tuplespaceManager.py), each tuplespace/adapter pair is paired
+# with a raft.Server. Clients send their writes and takes to the Raft
+# leader, which appends them to the replicated log as
+# LogEntry(term, Operation, payload). Once an entry is committed,
+# every replica applies it to its own tuplespace, in log order, so all
+# replicas hold the same tuples.
+#
+# Reads are answered by the leader from its own tuplespace, once a
+# majority has confirmed that it still leads, and it has applied every
+# entry committed before the read arrived (see raft.Server.serve_reads),
+# so a read never misses an acknowledged write.
+#
+# Each node keeps its Raft term, vote and log on disk, in the `dir` of
+# its `raft` section (.raft-NAME by default), so that a restarted node
+# neither votes twice in a term nor forgets entries it acknowledged.
+# Every raft.SNAPSHOT_ENTRIES entries, the log is replaced by a
+# snapshot of the tuples it left behind; a node that falls behind the
+# snapshot, or joins empty, is sent the snapshot instead of the whole
+# history. A restarted node writes its snapshot, then the rest of its
+# log, to its tuplespace again, so the tuplespace must be restarted
+# with it (as foreman does), or it would hold every tuple twice.
+# Delete the directory to start a node from scratch.
+#
+# The node is started with the usual configuration file, which needs a
+# `raft` section listing its address and its peers:
+#
+#     $ ./raftspace.py -c alice.yaml
+#
+# Clients use RaftTupleSpaceAdapter, which has the same API as
+# proxy.TupleSpaceAdapter, but is given the list of Raft addresses
+# instead of an adapter URI.
+#
+# Sharding:
+#
+# With `groups: N` in the `raft` section, each node hosts N independent
+# Raft groups (see raft.MultiServer), each with its own leader. Tuples
+# are assigned to a group by hashing their first field (the user name,
+# for microblog posts), so writes for different users are spread over
+# several leaders. Clients use ShardedTupleSpaceAdapter to route their
+# requests to the right group.
+
+import collections
+import json
+import os
+import sys
+import time
+import uuid
+import xmlrpc.client
+import zlib
+
+import zmq
+
+import proxy
+
+# raft.py lives in the top level of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import raft
+from log_functionality import Operation
+
+
+def is_literal(item):
+    """True unless a marshaled template item matches more than one value"""
+    return item is not None and not isinstance(item, dict)
+
+
+def shard_of(item, groups):
+    """The Raft group responsible for tuples whose first field is item"""
+    return zlib.crc32(json.dumps(item).encode()) % groups
+
+
+class TupleSpaceStateMachine:
+    """Applies committed log entries to a local tuplespace/adapter pair
+
+    Payloads are already marshaled for XML-RPC (see
+    TupleSpaceAdapter.map_templates_out), so they are passed straight
+    to the adapter.
+
+    When the tuplespace is sharded, every group on the node shares
+    the same tuplespace, so each group only takes and reads tuples
+    from its own shard.
+
+    An entry (or, restoring a snapshot, a tuple) the adapter refuses
+    with a Fault is skipped, since every replica refuses it alike. Any other error (the adapter is down)
+    is raised, so that raft.Server applies the entry again later.
+
+    Every tuple written or taken through the log is counted in tuples,
+    so that a snapshot of them can be taken without reading the whole
+    tuplespace back.
+
+    """
+    def __init__(self, uri, group=0, groups=1):
+        self.ts = proxy.TupleSpaceAdapter(uri).ts
+        self.group = group
+        self.groups = groups
+        self.tuples = collections.Counter()   # JSON of each tuple -> copies
+
+    def owns(self, tupl):
+        return (self.groups == 1 or
+                (tupl and shard_of(tupl[0], self.groups) == self.group))
+
+    def apply(self, entry):
+        try:
+            return self.apply_operation(entry)
+        except xmlrpc.client.Fault as fault:
+            print(f'skipping {entry.event_type.name} {entry.payload}: {fault.faultString}')
+            return None
+
+    def apply_operation(self, entry):
+        if entry.event_type == Operation.write:
+            self.write(entry.payload)
+            return None
+        elif entry.event_type == Operation.take:
+            # takes must not block, or a replica missing the tuple
+            # would stall the log; every replica holds the same tuples,
+            # so they all take the same one (or none at all)
+            if self.groups > 1 and not (entry.payload and is_literal(entry.payload[0])
+                                        and self.owns(entry.payload)):
+                return None  # could take a tuple from another group's shard
+            return self.take(entry.payload)
+
+    def write(self, tupl):
+        self.ts._out(tupl)
+        self.tuples[json.dumps(tupl)] += 1
+
+    def take(self, template):
+        tupl = self.ts._in(template, 0)
+        if tupl is not None:
+            key = json.dumps(tupl)
+            self.tuples[key] -= 1
+            if self.tuples[key] <= 0:
+                del self.tuples[key]
+        return tupl
+
+    def snapshot(self):
+        return [json.loads(key) for key, copies in self.tuples.items()
+                for _ in range(copies)]
+
+    def restore(self, state):
+        # take what we hold by value, then write the snapshot; tuples
+        # is kept up to date as we go, so that a restore interrupted
+        # by the adapter going down can simply be started again. As in
+        # apply(), a tuple the adapter refuses with a Fault is skipped,
+        # or the install would be retried forever
+        for key in list(self.tuples):
+            while key in self.tuples:
+                try:
+                    tupl = self.take(json.loads(key))
+                except xmlrpc.client.Fault as fault:
+                    print(f'skipping take {key}: {fault.faultString}')
+                    tupl = None
+                if tupl is None:
+                    del self.tuples[key]   # gone already, or refused
+        for tupl in state:
+            try:
+                self.write(tupl)
+            except xmlrpc.client.Fault as fault:
+                print(f'skipping write {tupl}: {fault.faultString}')
+
+    def query(self, request):
+        payload = request['payload']
+        if self.groups == 1 or (payload and is_literal(payload[0])):
+            # a literal first field matches only tuples of one shard
+            if not self.owns(payload):
+                return [] if request['operation'] == 'rdall' else None
+            if request['operation'] == 'rdall':
+                return self.ts._rdall(payload)
+            return self.ts._rd(payload, 0)
+
+        # a wildcard first field may match any shard's tuples
+        tuples = [t for t in self.ts._rdall(payload) if self.owns(t)]
+        if request['operation'] == 'rdall':
+            return tuples
+        return tuples[0] if tuples else None
+
+
+class RaftTupleSpaceAdapter(proxy.TupleSpaceAdapter):
+    """TupleSpaceAdapter for a Raft-replicated tuplespace
+
+    Requests are sent to the node we believe to be the leader. A node
+    that is not the leader answers with the address of the one it
+    knows about, and the request is retried there.
+
+    """
+    # how long to wait for a node before trying the next one, in seconds
+    REQUEST_TIMEOUT = 5
+
+    # how long to sleep between retries of a blocking _in or _rd
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, nodes, group=None):
+        self.nodes = list(nodes)
+        self.uri = self.nodes[0]
+        self.group = group
+        self.ctx = zmq.Context.instance()
+        self.sock = None
+
+    def connect(self, node):
+        if self.sock:
+            self.sock.close(linger=0)
+        self.uri = node
+        self.sock = self.ctx.socket(zmq.REQ)
+        self.sock.connect(node)
+
+    def next_node(self):
+        idx = (self.nodes.index(self.uri) + 1) % len(self.nodes) if self.uri in self.nodes else 0
+        self.connect(self.nodes[idx])
+
+    def request(self, operation, payload):
+        """Sends a ClientRequest to the leader, following redirects"""
+        message = {
+            "type": "ClientRequest",
+            "id": uuid.uuid4().hex,
+            "operation": operation,
+            "payload": payload
+            }
+        if self.group is not None:
+            message["group"] = self.group
+
+        if self.sock is None:
+            self.connect(self.uri)
+
+        while True:
+            self.sock.send_json(message)
+            if not self.sock.poll(self.REQUEST_TIMEOUT * 1000):
+                # node is down or partitioned; REQ sockets can't be
+                # reused after a lost reply, so start over on the next
+                self.next_node()
+                continue
+
+            reply = self.sock.recv_json()
+            if reply["success"]:
+                return reply["result"]
+            if reply.get("error"):
+                raise RuntimeError(reply["error"])
+
+            if reply["leader"] and reply["leader"] != self.uri:
+                self.connect(reply["leader"])
+            else:
+                # election in progress, give it a moment
+                time.sleep(self.POLL_INTERVAL)
+                self.next_node()
+
+    def _in(self, tupl):
+        # every take is logged, so wait with reads, which aren't, and
+        # only try to take once one finds a match
+        while True:
+            if self._rdp(tupl) is not None:
+                result = self._inp(tupl)
+                if result is not None:
+                    return result
+            time.sleep(self.POLL_INTERVAL)
+
+    def _inp(self, tupl):
+        return self.request('take', self.map_templates_out(tupl))
+
+    def _rd(self, tupl):
+        while True:
+            result = self._rdp(tupl)
+            if result is not None:
+                return result
+            time.sleep(self.POLL_INTERVAL)
+
+    def _rdall(self, tupl):
+        return self.request('rdall', self.map_templates_out(tupl))
+
+    def _rdp(self, tupl):
+        return self.request('read', self.map_templates_out(tupl))
+
+    def _out(self, tupl):
+        self.request('write', list(tupl))
+
+
+class ShardedTupleSpaceAdapter(proxy.TupleSpaceAdapter):
+    """TupleSpaceAdapter for a tuplespace sharded over several Raft groups
+
+    Requests whose first field is a literal value go to the one group
+    holding that shard. Templates with a wildcard first field are sent
+    to every group; a wildcard take first reads a matching tuple, then
+    takes it by value from its own group.
+
+    """
+    POLL_INTERVAL = RaftTupleSpaceAdapter.POLL_INTERVAL
+
+    def __init__(self, nodes, groups):
+        self.nodes = list(nodes)
+        self.uri = self.nodes[0]
+        self.groups = [RaftTupleSpaceAdapter(nodes, group) for group in range(groups)]
+
+    def route(self, tupl):
+        """The group adapter for tupl, or None if any group could match"""
+        mapped = self.map_templates_out(tupl)
+        if mapped and is_literal(mapped[0]):
+            return self.groups[shard_of(mapped[0], len(self.groups))]
+        return None
+
+    def _in(self, tupl):
+        # every take is logged, so wait with reads, which aren't, and
+        # only try to take once one finds a match
+        while True:
+            if self._rdp(tupl) is not None:
+                result = self._inp(tupl)
+                if result is not None:
+                    return result
+            time.sleep(self.POLL_INTERVAL)
+
+    def _inp(self, tupl):
+        group = self.route(tupl)
+        if group:
+            return group._inp(tupl)
+
+        for group in self.groups:
+            # someone else may take the tuple between our read and our
+            # take, so keep looking until this group has none left, or
+            # only one that can't be taken by value (its first field
+            # isn't a literal, see TupleSpaceStateMachine.apply)
+            refused = None
+            while True:
+                found = group._rdp(tupl)
+                if found is None or found == refused:
+                    break
+                taken = group._inp(found)
+                if taken is not None:
+                    return taken
+                refused = found
+        return None
+
+    def _rd(self, tupl):
+        while True:
+            result = self._rdp(tupl)
+            if result is not None:
+                return result
+            time.sleep(self.POLL_INTERVAL)
+
+    def _rdall(self, tupl):
+        group = self.route(tupl)
+        if group:
+            return group._rdall(tupl)
+        return [t for group in self.groups for t in group._rdall(tupl)]
+
+    def _rdp(self, tupl):
+        group = self.route(tupl)
+        if group:
+            return group._rdp(tupl)
+        for group in self.groups:
+            result = group._rdp(tupl)
+            if result is not None:
+                return result
+        return None
+
+    def _out(self, tupl):
+        self.groups[shard_of(tupl[0], len(self.groups))]._out(tupl)
+
+
+def main():
+    import config
+    conf = config.read_config()
+
+    ts_name      = conf['name']
+    adapter_host = conf['adapter']['host']
+    adapter_port = conf['adapter']['port']
+    raft_addr    = conf['raft']['addr']
+    raft_peers   = conf['raft']['peers']
+    raft_groups  = conf['raft'].get('groups', 1)
+    raft_dir     = conf['raft'].get('dir', f'.raft-{ts_name}')
+
+    adapter_uri = f'http://{adapter_host}:{adapter_port}'
+
+    print(f'Replicating tuplespace {ts_name} on {adapter_uri} from {raft_addr}')
+
+    if raft_groups > 1:
+        print(f'Sharded over {raft_groups} Raft groups')
+        state_machines = [TupleSpaceStateMachine(adapter_uri, group, raft_groups)
+                          for group in range(raft_groups)]
+        server = raft.MultiServer(raft_addr, raft_peers, raft_groups, state_machines,
+                                  directory=raft_dir)
+    else:
+        server = raft.Server(raft_addr, raft_peers, TupleSpaceStateMachine(adapter_uri),
+                             storage=raft.DiskStorage(raft_dir))
+    server.run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+# replay.py
+
+# Replays logged write and take events to an adapter, in parallel.
+#
+# Events on tuples with different keys (arity and first field) never
+# affect each other: a take can only remove a tuple with its own key.
+# So the log is split into one partition per key, each kept in log
+# order, and the partitions are replayed concurrently by a pool of
+# threads, each with its own proxy (and so its own keep-alive
+# connection to the adapter). Larger partitions are started first, so
+# that one long partition doesn't hold up the end of the replay.
+#
+#     events = replay.read_log('.manifest')
+#     stats = replay.replay_history('http://localhost:8000', events, workers=8)
+#     print(stats)
+
+import collections
+import json
+import threading
+import time
+
+import proxy
+
+WORKERS = 8
+
+
+def read_log(filename):
+    """The write and take events in a log written by recovery.py or
+    tuplespaceManager.py, leaving out the nameserver's
+
+    """
+    with open(filename) as log_file:
+        events = [json.loads(line) for line in log_file if line.strip()]
+    return [event for event in events
+            if event['name'] != 'nameserv' and event['event'] in ('write', 'take')]
+
+
+def key_of(tupl):
+    first = json.dumps(tupl[0]) if tupl else None
+    return (len(tupl), first)
+
+
+def partition(events):
+    """Splits events into lists of (event, tuple) with the same key, in log order"""
+    partitions = collections.defaultdict(list)
+    for event in events:
+        tupl = json.loads(event['message'])
+        partitions[key_of(tupl)].append((event['event'], tupl))
+    return list(partitions.values())
+
+
+def replay_history(address, events, workers=WORKERS, verbose=False):
+    """Replays events to the adapter at address, returning throughput stats"""
+    # only needed once a node joins, and it brings in logging
+    import concurrent.futures
+
+    local = threading.local()
+
+    def replay_partition(operations):
+        if not hasattr(local, 'ts'):
+            local.ts = proxy.TupleSpaceAdapter(address)
+        for event, tupl in operations:
+            if verbose:
+                print(f'replaying {event} {tupl} to {address}')
+            if event == 'write':
+                local.ts._out(tupl)
+            else:
+                local.ts._inp(tupl)     # we don't care about the return value
+        return len(operations)
+
+    partitions = sorted(partition(events), key=len, reverse=True)
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        replayed = sum(pool.map(replay_partition, partitions))
+    elapsed = time.perf_counter() - start
+
+    return { "operations": replayed,
+             "partitions": len(partitions),
+             "workers": workers,
+             "seconds": elapsed,
+             "ops_per_second": replayed / elapsed if elapsed else 0.0
+    }
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+
+# statetransfer.py
+
+# Lazy state transfer for joining nodes.
+#
+# recovery.py replays the whole history to a node as soon as its
+# adapter starts, so the node has nothing useful to serve until every
+# write and take has been replayed, one XML-RPC call at a time.
+#
+# Instead, this service follows write and take notifications like
+# recovery.py does, but keeps the tuples that are live (written and
+# not yet taken), each numbered by the position of its write in the
+# history. A joining node (tupleserver.py with `join: URI`) then
+#
+#   1. starts serving at once, empty,
+#   2. fetches the tuples most likely to be asked for first: the
+#      `users` bindings (see nameserver.py), and the most recent writes,
+#   3. fetches the tuples matching any template it can't match
+#      locally, before answering (or blocking),
+#   4. pages through everything else in the background, after which it
+#      stops asking.
+#
+# The node calls begin() first, which fixes a cutoff: the node is sent
+# the tuples as they were at the cutoff, and sees later events itself,
+# forwarded by its tuplespaceManager.py. Tuples written before the
+# cutoff and taken after it are kept until the join ends (end()), so
+# that the forwarded take finds them. Tuples are transferred as
+# [id, tuple] pairs, so the node can tell which ones it already has.
+#
+# The service follows one tuplespace (--name), the one the joining node
+# takes over, and the `users` bindings (PREFETCH) from the name
+# server's tuplespace, nameserv. Each node publishes its own writes, so
+# following several nodes would store a replicated write once for each.
+#
+# Events that reached this service before the cutoff may still be on
+# their way to the node. begin() also returns the last event seen from
+# each sender (see multicast.Receiver.last_id), and the node ignores
+# forwarded events up to it, since their effect is in the transfer.
+# This needs a multicast group or a ZeroMQ endpoint, on which every
+# listener sees the same numbers; a subscription (udp://HOST:PORT) is
+# numbered for each subscriber, so its events can't be matched up.
+#
+#     $ ./statetransfer.py 224.0.0.1 54321 --name alice --serve 8500
+#
+# and `join: http://localhost:8500` in the joining node's
+# configuration. The group must be one that nameserv publishes to
+# (see nameserver.yaml).
+
+import argparse
+import array
+import asyncio
+import bisect
+import itertools
+import json
+import socketserver
+import sys
+import threading
+import time
+import xmlrpc.client
+import xmlrpc.server
+
+import multicast
+import tupleserver
+
+# when subscribing to a node (udp://HOST:PORT), only these are sent
+SUBSCRIPTIONS = [['write', None], ['take', None]]
+
+NAMESERV = 'nameserv'           # the name server's tuplespace, see nameserver.py
+PREFETCH = [['users', None]]    # templates fetched before anything else, from NAMESERV
+RECENT = 1000                   # most recent writes fetched next
+PAGE = 1000                     # tuples per request during the full sync
+JOIN_TIMEOUT = 600              # seconds after which a join that never ended is forgotten
+
+
+class LiveState:
+    """The tuples written and not yet taken, in the order they were written
+
+    Writes, takes and cutoffs are numbered from the same counter, so a
+    tuple was live at a cutoff if it was written before it, and not
+    taken before it.
+
+    """
+
+    def __init__(self):
+        self.tuples = {}        # id -> tuple, live or kept for a join
+        self.index = {}         # (arity, first field) -> {id: tuple}
+        self.by_value = {}      # JSON of a live tuple -> ids, oldest first
+        self.order = array.array('q')   # ids in order, with taken ones until compacted
+        self.taken = 0                  # taken ids still in order
+        self.taken_at = {}      # id -> when it was taken, for tuples kept for a join
+        self.joins = {}         # cutoff -> when to forget it
+        self.horizon = {}       # sender -> last event seen from it
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def write(self, tupl, event=None):
+        with self.lock:
+            self.saw(event)
+            tuple_id = next(self.ids)
+            self.tuples[tuple_id] = tupl
+            self.order.append(tuple_id)
+            self.index.setdefault(self.key(tupl), {})[tuple_id] = tupl
+            self.by_value.setdefault(json.dumps(tupl), []).append(tuple_id)
+
+    def take(self, tupl, event=None):
+        with self.lock:
+            self.saw(event)
+            value = json.dumps(tupl)
+            ids = self.by_value.get(value)
+            if not ids:
+                return
+            tuple_id = ids.pop(0)
+            if not ids:
+                del self.by_value[value]
+            if any(tuple_id < cutoff for cutoff in self.live_joins()):
+                # live at the cutoff of a node still joining
+                self.taken_at[tuple_id] = next(self.ids)
+            else:
+                self.discard(tuple_id)
+
+    def saw(self, event):
+        if event:
+            sender, seq = event
+            self.horizon[sender] = seq
+
+    def discard(self, tuple_id):
+        tupl = self.tuples.pop(tuple_id)
+        bucket = self.index[self.key(tupl)]
+        del bucket[tuple_id]
+        if not bucket:
+            del self.index[self.key(tupl)]
+        self.taken += 1
+        if self.taken > PAGE and self.taken * 2 > len(self.order):
+            # tuples keeps ids in the order they were written
+            self.order = array.array('q', self.tuples)
+            self.taken = 0
+
+    def live_joins(self):
+        now = time.monotonic()
+        for cutoff, deadline in list(self.joins.items()):
+            if deadline <= now:
+                del self.joins[cutoff]
+        return self.joins
+
+    def begin(self):
+        """The cutoff for a node joining now, and the last event seen
+        from each sender before it
+
+        """
+        with self.lock:
+            self.prune()
+            cutoff = next(self.ids)
+            self.joins[cutoff] = time.monotonic() + JOIN_TIMEOUT
+            return [cutoff, dict(self.horizon)]
+
+    def end(self, cutoff):
+        """Forget the tuples kept for a join that has finished"""
+        with self.lock:
+            self.joins.pop(cutoff, None)
+            self.prune()
+        return True
+
+    def prune(self):
+        """Drop the tuples kept for joins that have ended or timed out"""
+        joins = self.live_joins()
+        for tuple_id, taken_at in list(self.taken_at.items()):
+            if not any(tuple_id < cutoff <= taken_at for cutoff in joins):
+                del self.taken_at[tuple_id]
+                self.discard(tuple_id)
+
+    def visible(self, tuple_id, cutoff):
+        """True if the tuple was live at cutoff"""
+        return tuple_id < cutoff and self.taken_at.get(tuple_id, cutoff) >= cutoff
+
+    def rdall(self, template, cutoff):
+        tupleserver.check_template(template)
+        with self.lock:
+            arity = len(template)
+            first = template[0] if template else None
+            if template and not tupleserver.is_template_item(first) and \
+               tupleserver.index_key(first) is not tupleserver.ANY:
+                buckets = [self.index.get((arity, tupleserver.index_key(first)), {}),
+                           self.index.get((arity, tupleserver.ANY), {})]
+            else:
+                buckets = [bucket for key, bucket in self.index.items() if key[0] == arity]
+            return sorted([tuple_id, tupl] for bucket in buckets
+                          for tuple_id, tupl in bucket.items()
+                          if self.visible(tuple_id, cutoff) and tupleserver.matches(template, tupl))
+
+    def recent(self, count, cutoff):
+        """The last count tuples with id < cutoff, in order"""
+        with self.lock:
+            found = []
+            for tuple_id in reversed(self.tuples):
+                if self.visible(tuple_id, cutoff):
+                    found.append([tuple_id, self.tuples[tuple_id]])
+                    if len(found) == count:
+                        break
+            return found[::-1]
+
+    def page(self, after, count, cutoff):
+        """Up to count tuples with after < id < cutoff, in order"""
+        with self.lock:
+            found = []
+            for i in range(bisect.bisect_right(self.order, after), len(self.order)):
+                tuple_id = self.order[i]
+                if tuple_id >= cutoff or len(found) == count:
+                    break
+                if tuple_id in self.tuples and self.visible(tuple_id, cutoff):
+                    found.append([tuple_id, self.tuples[tuple_id]])
+            return found
+
+    def key(self, tupl):
+        return (len(tupl), tupleserver.index_key(tupl[0]) if tupl else tupleserver.ANY)
+
+
+def follow(state, notif_dict, event, name):
+    """Applies a notification to state, if it is from the tuplespace
+    followed or is a write or take of a PREFETCH tuple on NAMESERV
+
+    """
+    if notif_dict['event'] not in ('write', 'take'):
+        return
+    tupl = json.loads(notif_dict['message'])
+    if notif_dict['name'] != name and not (
+            notif_dict['name'] == NAMESERV and
+            any(tupleserver.matches(template, tupl) for template in PREFETCH)):
+        return
+    if notif_dict['event'] == 'write':
+        state.write(tupl, event)
+    else:
+        state.take(tupl, event)
+
+
+class ThreadedXMLRPCServer(socketserver.ThreadingMixIn, xmlrpc.server.SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+def serve_state(state, host, port):
+    server = ThreadedXMLRPCServer((host, port), allow_none=True, logRequests=False)
+    server.register_function(state.begin, 'begin')
+    server.register_function(state.end, 'end')
+    server.register_function(state.rdall, 'rdall')
+    server.register_function(state.recent, 'recent')
+    server.register_function(state.page, 'page')
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+class Joiner:
+    """Fetches the tuples of an existing node into a joining TupleSpace"""
+
+    def __init__(self, uri, prefetch=PREFETCH, recent=RECENT, page=PAGE):
+        self.uri = uri
+        self.prefetch = prefetch
+        self.recent = recent
+        self.page_size = page
+        self.cutoff = None
+        self.horizon = {}       # sender -> last event included in the transfer
+        self.ready = None       # set once begin() has answered
+        self.seen = set()       # ids of the tuples already transferred
+        self.covered = set()    # JSON of templates already fetched
+        self.synced = False
+        self.task = None
+
+    def covers(self, template):
+        return self.synced or json.dumps(template) in self.covered
+
+    def transferred(self, event):
+        """True if the effect of an event, as given by last_id of a
+        multicast.Receiver, is part of the transfer; only once ready
+
+        """
+        if not event:
+            return False
+        sender, seq = event
+        return seq <= self.horizon.get(sender, 0)
+
+    def start(self, ts):
+        self.started = time.perf_counter()
+        self.ready = asyncio.Event()
+        self.task = asyncio.ensure_future(self.run(ts))
+
+    async def run(self, ts):
+        try:
+            self.cutoff, self.horizon = await self.call('begin')
+        except (OSError, xmlrpc.client.Error) as e:
+            print(f'Could not join from {self.uri}: {e}')
+            self.synced = True  # carry on without the existing tuples
+            return
+        finally:
+            self.ready.set()
+
+        for template in self.prefetch:
+            ts.transfer(await self.fetch(template))
+        ts.transfer(self.fresh(await self.call('recent', self.recent, self.cutoff)))
+        print(f'Joined from {self.uri}, prefetched {len(self.seen)} tuples')
+
+        after = 0
+        while True:
+            items = await self.call('page', after, self.page_size, self.cutoff)
+            if not items:
+                break
+            ts.transfer(self.fresh(items))
+            after = items[-1][0]
+        self.synced = True
+        elapsed = time.perf_counter() - self.started
+        print(f'Synced {len(self.seen)} tuples from {self.uri} in {elapsed:.2f} s')
+
+        try:
+            await self.call('end', self.cutoff)
+        except (OSError, xmlrpc.client.Error) as e:
+            # it forgets the join after JOIN_TIMEOUT anyway
+            print(f'Could not end the join with {self.uri}: {e}')
+
+    async def fetch(self, template):
+        """Tuples matching template that haven't been transferred yet"""
+        await self.ready.wait()
+        key = json.dumps(template)
+        try:
+            items = await self.call('rdall', template, self.cutoff)
+        except (OSError, xmlrpc.client.Error) as e:
+            print(f'Could not fetch {key} from {self.uri}: {e}')
+            items = []
+        self.covered.add(key)
+        return self.fresh(items)
+
+    def fresh(self, items):
+        tuples = []
+        for tuple_id, tupl in items:
+            if tuple_id not in self.seen:
+                self.seen.add(tuple_id)
+                tuples.append(tupl)
+        return tuples
+
+    async def call(self, method, *params):
+        # ServerProxy blocks, and isn't safe to share between threads
+        def request():
+            proxy = xmlrpc.client.ServerProxy(self.uri, allow_none=True)
+            return getattr(proxy, method)(*params)
+        return await asyncio.get_running_loop().run_in_executor(None, request)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('address', help='multicast address, or endpoint')
+    parser.add_argument('port', nargs='?', help='multicast port, or topic')
+    parser.add_argument('-s', '--serve', type=int, default=8500,
+                        help='port to serve joining nodes on')
+    parser.add_argument('-n', '--name', required=True,
+                        help='the tuplespace joining nodes take over')
+    args = parser.parse_args()
+
+    state = LiveState()
+    serve_state(state, 'localhost', args.serve)
+    receiver = multicast.open_receiver(args.address, args.port, SUBSCRIPTIONS)
+
+    print(f'Listening on {receiver.uri}, serving state on http://localhost:{args.serve}')
+
+    try:
+        for notification in receiver:
+            follow(state, multicast.notif_to_dict(notification), receiver.last_id, args.name)
+    except Exception as e:
+        print(e)
+        print(receiver.stats())
+        receiver.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
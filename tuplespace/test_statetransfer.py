@@ -0,0 +1,68 @@
+# test_statetransfer.py
+
+import asyncio
+import json
+
+import statetransfer
+
+
+def notification(name, event, tupl):
+    return {'name': name, 'event': event, 'message': json.dumps(tupl)}
+
+
+class Recorder:
+    """Stands in for the joining TupleSpace, keeping each transfer"""
+
+    def __init__(self):
+        self.transfers = []
+
+    def transfer(self, tuples):
+        self.transfers.append(list(tuples))
+
+
+def join(state):
+    server = statetransfer.serve_state(state, 'localhost', 0)
+    try:
+        joiner = statetransfer.Joiner(f'http://localhost:{server.server_address[1]}')
+        ts = Recorder()
+
+        async def run():
+            joiner.start(ts)
+            await joiner.task
+        asyncio.run(run())
+        return joiner, ts
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_follows_the_named_tuplespace_and_the_users_bindings():
+    state = statetransfer.LiveState()
+    users = ['users', {'alice': 'http://localhost:8080'}]
+    statetransfer.follow(state, notification('nameserv', 'write', ['users', {}]), ['ns', 1], 'alice')
+    statetransfer.follow(state, notification('nameserv', 'take', ['users', {}]), ['ns', 2], 'alice')
+    statetransfer.follow(state, notification('nameserv', 'write', users), ['ns', 3], 'alice')
+    statetransfer.follow(state, notification('nameserv', 'write', ['alice', 'adapter', 'x']), ['ns', 4], 'alice')
+    statetransfer.follow(state, notification('alice', 'write', ['alice', 'hello']), ['a', 1], 'alice')
+    statetransfer.follow(state, notification('bob', 'write', ['alice', 'hello']), ['b', 1], 'alice')
+
+    cutoff, _ = state.begin()
+    assert [tupl for _, tupl in state.rdall([None, None], cutoff)] == [users, ['alice', 'hello']]
+    assert state.rdall([None, None, None], cutoff) == []
+
+
+def test_prefetch_returns_the_users_tuple():
+    state = statetransfer.LiveState()
+    users = ['users', {'alice': 'http://localhost:8080'}]
+    statetransfer.follow(state, notification('nameserv', 'write', users), ['ns', 1], 'alice')
+    for i in range(3):
+        statetransfer.follow(state, notification('alice', 'write', ['alice', i]), ['a', i + 1], 'alice')
+
+    joiner, ts = join(state)
+
+    # the first transfer is the prefetch, before the recent writes
+    assert ts.transfers[0] == [users]
+    assert joiner.covers(['users', None])
+    assert joiner.synced
+    assert sorted(map(json.dumps, sum(ts.transfers, []))) == \
+        sorted(map(json.dumps, [users, ['alice', 0], ['alice', 1], ['alice', 2]]))
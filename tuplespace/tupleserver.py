@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+
+# tupleserver.py
+
+# A tuplespace and its XML-RPC adapter in a single Python process, in
+# place of a tuplespace.rb/adapter.rb pair.
+#
+# The Ruby adapter serves each request on a thread, up to max_clients
+# at a time, so a client blocked in _in(tuple, None) holds on to one
+# of them for as long as it waits. This server runs on asyncio
+# instead. It speaks HTTP/1.1 with keep-alive, and a blocked _in or _rd
+# is parked as a small Waiter holding a Future, which is resolved when
+# a matching tuple is written or its timeout expires. Waiting costs an
+# open connection and under 2 KB, not a thread, so there is no limit
+# on how many clients can wait at once (see bench_waiters.py).
+#
+# The handlers are the same as adapter.rb's (_in, _rd, _rdall, _out,
+# with the same marshaling of templates, see proxy.py), plus
+# system.multicall, so proxy.TupleSpaceAdapter works unchanged. _in
+# and _out also take the id of the event they replay, when
+# tuplespaceManager.py forwards one to a joining node:
+#
+#     $ ./tupleserver.py -c alice.yaml
+#
+# Notifications (start, adapter, write, take) are sent to the
+# multicast addresses in `notify` with multicast.Notifier, for tuples
+# matching `filters`, as tuplespace.rb does. ZeroMQ entries are not
+# supported.
+#
+# Tuples and waiters are indexed by arity and first field, so a write
+# only looks at the waiters that could match it.
+#
+# With `join: URI` in the configuration, the server starts empty and
+# serves right away, fetching the existing tuples from a
+# statetransfer.py service as they are needed (see statetransfer.py).
+
+import asyncio
+import heapq
+import itertools
+import json
+import re
+import resource
+import sys
+import time
+import xmlrpc.client
+
+import multicast
+import tuplestore
+
+# Ruby classes that may appear in templates, as sent by proxy.py
+CLASSES = {
+    'String': (str,),
+    'Numeric': (int, float),
+    'Integer': (int,),
+    'Float': (float,),
+    'Array': (list,),
+    'Hash': (dict,),
+}
+
+ANY = object()                  # index key for items that aren't hashable literals
+
+HEARTBEAT_INTERVAL = 1
+EXPIRE_INTERVAL = 1
+
+
+def is_template_item(item):
+    """True for marshaled classes, regexps and ranges (see proxy.py)"""
+    return isinstance(item, dict) and 'symbol' not in item
+
+
+def index_key(item):
+    if item is None or isinstance(item, (dict, list)):
+        return ANY
+    return item
+
+
+def check_template(template):
+    """Raises the errors adapter.rb would for a malformed template"""
+    for item in template:
+        if not is_template_item(item):
+            continue
+        if 'class' in item:
+            if item['class'] not in CLASSES:
+                raise NameError(f"uninitialized constant {item['class']}")
+        elif 'regexp' in item:
+            re.compile(item['regexp'])
+        elif not ('from' in item and 'to' in item):
+            raise ArgumentError(f'Unexpected tuple item: {item!r}')
+
+
+def match_item(template, value):
+    if template is None:
+        return True
+    if not is_template_item(template):
+        return template == value
+    if 'class' in template:
+        return isinstance(value, CLASSES[template['class']]) and not isinstance(value, bool)
+    if 'regexp' in template:
+        return isinstance(value, str) and re.search(template['regexp'], value) is not None
+    try:
+        return template['from'] <= value <= template['to']
+    except TypeError:
+        return False
+
+
+def matches(template, tupl):
+    return (len(template) == len(tupl)
+            and all(match_item(t, v) for t, v in zip(template, tupl)))
+
+
+class ArgumentError(ValueError):
+    pass
+
+
+class Waiter:
+    """A blocked _in or _rd"""
+
+    __slots__ = ('seq', 'template', 'take', 'future', 'timer')
+
+    def __init__(self, seq, template, take, future):
+        self.seq = seq
+        self.template = template
+        self.take = take
+        self.future = future
+        self.timer = None
+
+
+class TupleSpace:
+    """Tuples and blocked requests, indexed by (arity, first field)
+
+    take() and read() return a tuple, None, or a Future for a tuple
+    (or None, when it times out). Tuples are kept in store, a
+    tuplestore.Store, which is unbounded by default.
+
+    """
+
+    def __init__(self, on_event=None, source=None, store=None):
+        self.tuples = store if store is not None else tuplestore.Store()
+        self.waiters = {}       # (arity, key) -> {seq: Waiter}
+        self.seq = itertools.count()
+        self.on_event = on_event or (lambda event, tupl: None)
+        self.source = source    # a statetransfer.Joiner, while joining
+
+    def __len__(self):
+        return len(self.tuples)
+
+    def waiting(self):
+        return sum(len(bucket) for bucket in self.waiters.values())
+
+    def write(self, tupl, announce=True, sec=None):
+        """Adds a tuple, which expires after sec seconds unless sec is
+        None; announce=False for tuples transferred from elsewhere,
+        which are not new events
+
+        """
+        if announce:
+            self.on_event('write', tupl)
+        arity = len(tupl)
+        key = index_key(tupl[0]) if tupl else ANY
+
+        # every matching reader gets it, then the oldest matching taker
+        taker = None
+        for bucket_key in {(arity, key), (arity, ANY)}:
+            bucket = self.waiters.get(bucket_key, {})
+            for seq, waiter in list(bucket.items()):
+                if not matches(waiter.template, tupl):
+                    continue
+                if not waiter.take:
+                    self.wake(bucket_key, waiter, tupl)
+                elif taker is None or waiter.seq < taker[1].seq:
+                    taker = (bucket_key, waiter)
+
+        if taker:
+            self.on_event('take', tupl)
+            self.wake(*taker, tupl)
+        else:
+            expires = time.monotonic() + sec if sec is not None else None
+            self.tuples.add((arity, key), next(self.seq), tupl, expires)
+
+    def take(self, template, sec=None):
+        return self.find(template, sec, take=True)
+
+    def read(self, template, sec=None):
+        return self.find(template, sec, take=False)
+
+    def read_all(self, template):
+        check_template(template)
+        if self.source and not self.source.covers(template):
+            return asyncio.ensure_future(self.fetch_and_read_all(template))
+        self.tuples.expire()
+        found = []
+        for bucket_key, _, tupl in self.candidates(template):
+            if matches(template, tupl):
+                self.tuples.touch(bucket_key)
+                found.append(tupl)
+        return found
+
+    def find(self, template, sec, take):
+        check_template(template)
+        self.tuples.expire()
+        tupl = self.lookup(template, take)
+        if tupl is not None:
+            return tupl
+
+        if self.source and not self.source.covers(template):
+            # it may not have been transferred yet
+            return asyncio.ensure_future(self.fetch_and_find(template, sec, take))
+
+        if sec is not None and sec <= 0:
+            return None
+
+        loop = asyncio.get_running_loop()
+        waiter = Waiter(next(self.seq), template, take, loop.create_future())
+        bucket_key = (len(template), self.template_key(template))
+        self.waiters.setdefault(bucket_key, {})[waiter.seq] = waiter
+        if sec is not None:
+            waiter.timer = loop.call_later(sec, self.wake, bucket_key, waiter, None)
+        # a client that hangs up stops waiting
+        waiter.future.add_done_callback(lambda _: self.forget(bucket_key, waiter))
+        return waiter.future
+
+    def lookup(self, template, take):
+        for bucket_key, seq, tupl in self.candidates(template):
+            if matches(template, tupl):
+                self.tuples.touch(bucket_key)
+                if take:
+                    self.tuples.remove(bucket_key, seq)
+                    self.on_event('take', tupl)
+                return tupl
+        return None
+
+    async def fetch_and_find(self, template, sec, take):
+        self.transfer(await self.source.fetch(template))
+        result = self.find(template, sec, take)
+        if isinstance(result, asyncio.Future):
+            return await result
+        return result
+
+    async def fetch_and_read_all(self, template):
+        self.transfer(await self.source.fetch(template))
+        return self.read_all(template)
+
+    def transfer(self, tuples):
+        for tupl in tuples:
+            self.write(tupl, announce=False)
+
+    def forwarded(self, event, operation):
+        """Runs operation() for an event forwarded from another node,
+        with the event's id, unless the join in progress transferred
+        its effect already; then it is a no-op, returning None
+
+        """
+        if self.source is None or event is None:
+            return operation()
+        if not self.source.ready.is_set():
+            return asyncio.ensure_future(self.forward_when_ready(event, operation))
+        if self.source.transferred(event):
+            return None
+        return operation()
+
+    async def forward_when_ready(self, event, operation):
+        await self.source.ready.wait()
+        result = self.forwarded(event, operation)
+        if isinstance(result, asyncio.Future):
+            return await result
+        return result
+
+    def candidates(self, template):
+        """Stored tuples that could match, oldest first"""
+        arity = len(template)
+        key = self.template_key(template)
+        if key is not ANY:
+            keys = [(arity, key), (arity, ANY)]
+        else:
+            keys = [k for k in self.tuples.keys() if k[0] == arity]
+        # each bucket is already in order
+        buckets = [self.bucket(k) for k in keys if k in self.tuples]
+        return heapq.merge(*buckets, key=lambda candidate: candidate[1])
+
+    def bucket(self, bucket_key):
+        for seq, tupl in self.tuples.bucket(bucket_key):
+            yield bucket_key, seq, tupl
+
+    def template_key(self, template):
+        if not template or is_template_item(template[0]):
+            return ANY
+        return index_key(template[0])
+
+    def wake(self, bucket_key, waiter, tupl):
+        if not waiter.future.done():
+            waiter.future.set_result(tupl)
+        self.forget(bucket_key, waiter)
+
+    def forget(self, bucket_key, waiter):
+        if waiter.timer:
+            waiter.timer.cancel()
+            waiter.timer = None
+        bucket = self.waiters.get(bucket_key)
+        if bucket and bucket.pop(waiter.seq, None) and not bucket:
+            del self.waiters[bucket_key]
+
+
+class Adapter:
+    """XML-RPC handlers for a TupleSpace, as in adapter.rb"""
+
+    def __init__(self, ts):
+        self.ts = ts
+        self.handlers = {
+            '_in': lambda tupl, sec=None, event=None:
+                self.ts.forwarded(event, lambda: self.ts.take(tupl, sec)),
+            '_rd': lambda tupl, sec=None: self.ts.read(tupl, sec),
+            '_rdall': lambda tupl: self.ts.read_all(tupl),
+            '_out': lambda tupl, sec=None, event=None:
+                self.ts.forwarded(event, lambda: self.ts.write(tupl, sec=sec)),
+            'system.multicall': self.multicall,
+        }
+
+    def call(self, method, params):
+        """Returns the result, or a Future for it"""
+        handler = self.handlers.get(method)
+        if handler is None:
+            raise xmlrpc.client.Fault(-32601, f'no such method {method!r}')
+        return handler(*params)
+
+    def multicall(self, calls):
+        results = []
+        for i, call in enumerate(calls):
+            try:
+                result = self.call(call['methodName'], call['params'])
+            except Exception as e:
+                results.append(fault_dict(e))
+                continue
+            if isinstance(result, asyncio.Future):
+                # finish the rest once this one has its answer
+                return asyncio.ensure_future(self.finish_multicall(calls[i + 1:], results, result))
+            results.append([result])
+        return results
+
+    async def finish_multicall(self, calls, results, pending):
+        results.append([await pending])
+        for call in calls:
+            try:
+                result = self.call(call['methodName'], call['params'])
+                if isinstance(result, asyncio.Future):
+                    result = await result
+                results.append([result])
+            except Exception as e:
+                results.append(fault_dict(e))
+        return results
+
+
+def fault_dict(e):
+    if isinstance(e, xmlrpc.client.Fault):
+        return {'faultCode': e.faultCode, 'faultString': e.faultString}
+    return {'faultCode': 1, 'faultString': f'{type(e).__name__}: {e}'}
+
+
+def encode_result(result):
+    return xmlrpc.client.dumps((result,), methodresponse=True, allow_none=True)
+
+
+def encode_fault(e):
+    return xmlrpc.client.dumps(xmlrpc.client.Fault(**fault_dict(e)), allow_none=True)
+
+
+class HttpProtocol(asyncio.Protocol):
+    """One keep-alive HTTP connection, answering XML-RPC requests in order"""
+
+    def __init__(self, adapter):
+        self.adapter = adapter
+        self.transport = None
+        self.buffer = bytearray()
+        self.pending = None     # Future for the request being answered
+        self.keep_alive = True
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        if self.pending and not self.pending.done():
+            self.pending.cancel()
+        self.pending = None
+
+    def data_received(self, data):
+        self.buffer += data
+        self.process()
+
+    def process(self):
+        while self.pending is None and self.transport and not self.transport.is_closing():
+            end = self.buffer.find(b'\r\n\r\n')
+            if end < 0:
+                return
+            request_line, *lines = self.buffer[:end].decode('latin-1').split('\r\n')
+            headers = {}
+            for line in lines:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            if len(self.buffer) < end + 4 + length:
+                return
+            body = bytes(self.buffer[end + 4:end + 4 + length])
+            del self.buffer[:end + 4 + length]
+
+            method, _, version = request_line.split(' ', 2)
+            connection = headers.get('connection', '').lower()
+            self.keep_alive = (connection == 'keep-alive' if version == 'HTTP/1.0'
+                               else connection != 'close')
+
+            if method != 'POST':
+                self.respond(b'', status='405 Method Not Allowed')
+                continue
+            self.handle(body)
+
+    def handle(self, body):
+        try:
+            params, method = xmlrpc.client.loads(body, use_builtin_types=True)
+            result = self.adapter.call(method, params)
+        except Exception as e:
+            self.respond(encode_fault(e).encode())
+            return
+
+        if isinstance(result, asyncio.Future):
+            self.pending = result
+            result.add_done_callback(self.finish)
+        else:
+            self.respond(encode_result(result).encode())
+
+    def finish(self, future):
+        self.pending = None
+        if future.cancelled():
+            return
+        if future.exception():
+            self.respond(encode_fault(future.exception()).encode())
+        else:
+            self.respond(encode_result(future.result()).encode())
+        self.process()
+
+    def respond(self, body, status='200 OK'):
+        if self.transport.is_closing():
+            return
+        self.transport.write(
+            f'HTTP/1.1 {status}\r\n'
+            f'Content-Type: text/xml\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if self.keep_alive else "close"}\r\n'
+            f'\r\n'.encode() + body)
+        if not self.keep_alive:
+            self.transport.close()
+
+
+def raise_fd_limit():
+    """Each waiting client holds a connection open"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def serve(conf):
+    ts_name = conf['name']
+    host = conf['adapter']['host']
+    port = conf['adapter']['port']
+    adapter_uri = f'http://{host}:{port}'
+
+    notify_addrs = [dest for dest in conf.get('notify', []) if 'address' in dest]
+    notifier = multicast.Notifier(notify_addrs, conf.get('history', 1024))
+    filters = conf.get('filters', [])
+
+    def notify(notification):
+        notifier.notify_all(notification)
+        print(notification)
+
+    def on_event(event, tupl):
+        if any(matches(pattern, tupl) for pattern in filters):
+            notify(f'{ts_name} {event} {json.dumps(tupl, separators=(",", ":"))}')
+
+    loop = asyncio.get_running_loop()
+    loop.add_reader(notifier.fileno(), notifier.handle_requests)
+
+    def heartbeat():
+        notifier.heartbeat()
+        loop.call_later(HEARTBEAT_INTERVAL, heartbeat)
+    heartbeat()
+
+    storage = conf.get('storage', {})
+    memory = storage.get('memory')
+    store = tuplestore.Store(tuplestore.parse_size(memory) if memory is not None else None,
+                             storage.get('policy', 'lru'), storage.get('spill'))
+    ts = TupleSpace(on_event, store=store)
+
+    def expire():
+        store.expire()
+        loop.call_later(EXPIRE_INTERVAL, expire)
+    expire()
+
+    if conf.get('join'):
+        # serve right away, and fetch the existing tuples as they are needed
+        import statetransfer
+        ts.source = statetransfer.Joiner(conf['join'])
+        print(f"Joining from {conf['join']}")
+        ts.source.start(ts)
+
+    adapter = Adapter(ts)
+    server = await loop.create_server(lambda: HttpProtocol(adapter), host, port,
+                                      backlog=4096)
+
+    print(f'Tuplespace {ts_name} and adapter started at {adapter_uri}')
+    for dest in notify_addrs:
+        print(f"Sending notifications to udp://{dest['address']}:{dest['port']}")
+    if store.memory is not None:
+        print(f'Keeping {store.memory} bytes of tuples in memory ({store.policy}), '
+              f"spilling to {store.path or 'a temporary file'}")
+    notify(f'{ts_name} start {adapter_uri}')
+    notify(f'{ts_name} adapter {adapter_uri}')
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        store.close()
+
+
+def main():
+    import config
+    raise_fd_limit()
+    try:
+        asyncio.run(serve(config.read_config()))
+    except KeyboardInterrupt:
+        print()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -21,33 +21,65 @@ def map_symbols_out(tuple)
   end
 end
 
+# event and tuple let a ReliableNotifier send the notification only to
+# matching subscribers
+def notify(notifiers, notification, event = nil, tuple = nil)
+  notifiers.each do |notifier|
+    notifier.notify_all notification, event, tuple
+  end
+  puts notification
+end
+
 config = read_config
 
 ts_name = config['name']
 ts_uri  = config['uri']
 
-notify_addrs = config['notify']
+# entries with a `zmq` endpoint are published over ZeroMQ, the rest
+# are multicast
+multicast_addrs = config['notify'].select { |dest| dest.key? 'address' }
+zmq_addrs       = config['notify'].select { |dest| dest.key? 'zmq' }
+
+# listeners may also subscribe to just the events they want
+subscription_port = config.dig('subscriptions', 'port')
 
 ts = start_tuplespace ts_name, ts_uri
 
 begin
-  sock = open_multicast_socket
-  notify_addrs.each do |dest|
-    puts "Sending notifications to udp://#{dest['address']}:#{dest['port']}"
+  notifiers = []
+  if !multicast_addrs.empty? || subscription_port
+    notifiers << ReliableNotifier.new(multicast_addrs, config.fetch('history', 1024),
+                                      port: subscription_port) do |notification|
+      # announced by our adapter
+      _, event, = notification.split(' ', 3)
+      notify notifiers, notification, event
+    end
+    multicast_addrs.each do |dest|
+      puts "Sending notifications to udp://#{dest['address']}:#{dest['port']}"
+    end
+    puts "Accepting subscriptions on udp port #{subscription_port}" if subscription_port
+  end
+  unless zmq_addrs.empty?
+    require './zmqnotify'
+    notifiers << ZmqNotifier.new(zmq_addrs)
+    zmq_addrs.each do |dest|
+      puts "Publishing notifications on #{dest['zmq']}"
+    end
   end
-  notify_all notify_addrs, sock, "#{ts_name} start #{ts_uri}"
+  notify notifiers, "#{ts_name} start #{ts_uri}", 'start'
 
   mn = MultipleNotify.new ts, nil, config['filters']
   loop do
     event, tuple = mn.pop
     json = JSON.generate(map_symbols_out(tuple))
-    notify_all notify_addrs, sock, "#{ts_name} #{event} #{json}"
+    # subscriptions are matched against the tuple as listeners see it
+    notify notifiers, "#{ts_name} #{event} #{json}", event, JSON.parse(json)
   end
 
   DRb.thread.join
 rescue Interrupt
   puts
 ensure
-  sock.close
+  notifiers.each(&:close)
   DRb.stop_service
 end
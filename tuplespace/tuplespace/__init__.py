@@ -0,0 +1,26 @@
+# tuplespace/__init__.py
+
+# One entry point for the Python commands in this directory:
+#
+#     $ python3 -m tuplespace workshop -c alice.yaml
+#     $ python3 -m tuplespace manager 224.0.0.1 54321 -c alice.yaml
+#     $ python3 -m tuplespace mblog alice distsys "hello, world!"
+#
+# Each command runs its script as if it had been started directly, so
+# arguments and output are the same. Only the script for the command
+# given is imported, and it is imported when the command runs, so a
+# short-lived command doesn't pay for loading the others (or yaml,
+# zmq, and xmlrpc.client, when it doesn't need them).
+
+# command -> (module, description)
+COMMANDS = {
+    'workshop':      ('workshop', 'interactive client for a tuplespace'),
+    'mblog':         ('mblog', 'post a message to every user'),
+    'manager':       ('tuplespaceManager', 'replicate writes and takes into a tuplespace'),
+    'recovery':      ('recovery', 'log events, and replay them to joining adapters'),
+    'nameserver':    ('nameserver', 'record tuplespace and adapter bindings'),
+    'subscribe':     ('subscribe', 'print notifications'),
+    'statetransfer': ('statetransfer', 'serve live tuples to joining nodes'),
+    'server':        ('tupleserver', 'tuplespace and adapter in one asyncio process'),
+    'raft':          ('raftspace', 'Raft replication for a tuplespace'),
+}
@@ -0,0 +1,31 @@
+# tuplespace/__main__.py
+
+import runpy
+import sys
+
+from tuplespace import COMMANDS
+
+PROGRAM = 'python3 -m tuplespace'
+
+
+def usage(file=sys.stderr):
+    print(f'Usage: {PROGRAM} COMMAND [ARGUMENTS...]\n\nCommands:', file=file)
+    for command, (module, description) in COMMANDS.items():
+        print(f'  {command:<15}{description} ({module}.py)', file=file)
+
+
+def main(argv):
+    if len(argv) > 1 and argv[1] in ('-h', '--help'):
+        usage(sys.stdout)
+        return 0
+    if len(argv) < 2 or argv[1] not in COMMANDS:
+        usage()
+        return 1
+
+    module, _ = COMMANDS[argv[1]]
+    sys.argv = [f'{module}.py', *argv[2:]]
+    runpy.run_module(module, run_name='__main__', alter_sys=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
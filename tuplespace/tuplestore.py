@@ -0,0 +1,317 @@
+# tuplestore.py
+
+# Storage for the tuples of a tupleserver.py node, in a bounded amount
+# of memory.
+#
+# Rinda (and TupleSpace, by default) keeps every tuple in memory until
+# it is taken. Microblog posts are written and read but hardly ever
+# taken, so a long-running node grows without limit.
+#
+# A Store keeps tuples in memory until they take up more than `memory`
+# bytes. Then it spills the coldest of them to a SpillFile, until
+# they're back under 90% of the budget:
+#
+#   lru: the oldest tuples of the shape (arity and first field) that
+#        was least recently written or matched, and then the next one,
+#   age: the oldest tuples, whatever their shape.
+#
+# A SpillFile is a log: records are only ever appended, and an index in
+# memory says where each tuple is. A removed tuple leaves a gap, and the
+# log is rewritten once more than half of it is gaps.
+#
+# Matching sees both tiers. Since the oldest tuples of a shape are always
+# the ones spilled, every spilled tuple of a shape is older than every
+# one in memory, and bucket() returns the spilled ones first, so tuples
+# are still found oldest first. Spilled tuples are read from disk each
+# time they are looked at, and stay there until they are taken.
+#
+# Tuples written with a lease (add(..., expires=deadline)) are removed
+# by expire() once time.monotonic() passes their deadline, from either
+# tier.
+#
+#     store = tuplestore.Store(memory=tuplestore.parse_size('64M'))
+#     ts = tupleserver.TupleSpace(on_event, store=store)
+
+import array
+import bisect
+import heapq
+import os
+import pickle
+import sys
+import time
+
+POLICIES = ('lru', 'age')
+LOW_WATER = 0.9                 # spill down to this fraction of the budget
+ENTRY = 100                     # bytes of bookkeeping per tuple in memory
+COMPACT_MIN = 1 << 20           # smallest amount of gaps worth rewriting the log for
+UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+
+def parse_size(value):
+    """Bytes in a size such as 65536, '64K', '512M' or '2G'"""
+    if isinstance(value, str) and value[-1:].upper() in UNITS:
+        return int(float(value[:-1]) * UNITS[value[-1].upper()])
+    return int(value)
+
+
+def footprint(value):
+    """Approximate bytes of memory held by a tuple, or an item of one"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(footprint(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(footprint(k) + footprint(v) for k, v in value.items())
+    return size
+
+
+class SpillFile:
+    """Tuples on disk: an append-only log, and an index into it
+
+    There is an index entry for every tuple spilled, so it is kept small:
+    (arity, key) -> [seqs, offsets, lengths, count], where seqs and
+    offsets are arrays of 64-bit ints, and lengths of 32-bit ones.
+    Tuples are spilled oldest first, so seqs is in order. A removed
+    tuple's offset is set to -1 until the log is compacted.
+
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            import tempfile
+            fd, path = tempfile.mkstemp(prefix='tuplespace-', suffix='.spill')
+        else:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        self.path = path
+        self.fd = fd
+        self.index = {}
+        self.size = 0           # bytes in the log
+        self.dead = 0           # bytes of removed records
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def extend(self, items):
+        """Appends (bucket_key, seq, tuple) items, in a single write
+
+        The index is only updated once the write has succeeded, so if it
+        fails, the log is as it was.
+
+        """
+        items = [(bucket_key, seq, pickle.dumps(tupl, pickle.HIGHEST_PROTOCOL))
+                 for bucket_key, seq, tupl in items]
+        os.pwrite(self.fd, b''.join(record for _, _, record in items), self.size)
+        for bucket_key, seq, record in items:
+            entry = self.index.get(bucket_key)
+            if entry is None:
+                entry = self.index[bucket_key] = [array.array('q'), array.array('q'),
+                                                  array.array('I'), 0]
+            entry[0].append(seq)
+            entry[1].append(self.size)
+            entry[2].append(len(record))
+            entry[3] += 1
+            self.size += len(record)
+        self.count += len(items)
+
+    def read(self, offset, length):
+        return pickle.loads(os.pread(self.fd, length, offset))
+
+    def bucket(self, bucket_key):
+        """(seq, tuple) pairs, oldest first"""
+        if bucket_key not in self.index:
+            return
+        seqs, offsets, lengths, _ = self.index[bucket_key]
+        for seq, offset, length in zip(seqs, offsets, lengths):
+            if offset >= 0:
+                yield seq, self.read(offset, length)
+
+    def remove(self, bucket_key, seq):
+        entry = self.index.get(bucket_key)
+        if entry is None:
+            return False
+        seqs, offsets, lengths, _ = entry
+        i = bisect.bisect_left(seqs, seq)
+        if i == len(seqs) or seqs[i] != seq or offsets[i] < 0:
+            return False
+        self.dead += lengths[i]
+        offsets[i] = -1
+        entry[3] -= 1
+        if not entry[3]:
+            del self.index[bucket_key]
+        self.count -= 1
+        if self.dead > COMPACT_MIN and self.dead * 2 > self.size:
+            try:
+                self.compact()
+            except OSError:
+                pass    # the gaps stay; it is tried again on the next removal
+        return True
+
+    def compact(self):
+        """Rewrites the log without the removed records
+
+        The new log and its index are built on the side, and only
+        replace the old ones once the rewrite has succeeded.
+
+        """
+        compacted = SpillFile(f'{self.path}.compact')
+        try:
+            for bucket_key, (seqs, offsets, lengths, _) in self.index.items():
+                compacted.extend((bucket_key, seq, self.read(offset, length))
+                                 for seq, offset, length in zip(seqs, offsets, lengths)
+                                 if offset >= 0)
+            os.replace(compacted.path, self.path)
+        except BaseException:
+            compacted.close()
+            raise
+        os.close(self.fd)
+        self.fd = compacted.fd
+        self.index = compacted.index
+        self.size = compacted.size
+        self.count = compacted.count
+        self.dead = 0
+
+    def close(self):
+        os.close(self.fd)
+        os.unlink(self.path)
+
+
+class Store:
+    """The tuples of a TupleSpace, by (arity, key), in at most memory
+    bytes (None for no limit), with the rest in a SpillFile at path (a
+    temporary file by default)
+
+    """
+
+    def __init__(self, memory=None, policy='lru', path=None):
+        if policy not in POLICIES:
+            raise ValueError(f'unknown eviction policy {policy!r}, not one of {POLICIES}')
+        self.memory = memory
+        self.policy = policy
+        self.path = path
+        self.hot = {}           # (arity, key) -> {seq: tuple}, least recently used first
+        self.cold = None        # SpillFile, once something has been spilled
+        self.used = 0           # bytes held by the tuples in hot
+        self.in_memory = 0
+        self.order = []         # heap of (seq, bucket_key) in hot, for the age policy
+        self.leases = []        # heap of (deadline, seq, bucket_key)
+        self.spilled = 0
+        self.expired = 0
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.hot.values()) + len(self.cold or ())
+
+    def __contains__(self, bucket_key):
+        return bucket_key in self.hot or (self.cold is not None and bucket_key in self.cold.index)
+
+    def keys(self):
+        if self.cold is None:
+            return list(self.hot)
+        return list(self.hot.keys() | self.cold.index.keys())
+
+    def bucket(self, bucket_key):
+        """(seq, tuple) pairs, oldest first"""
+        if self.cold is not None:
+            yield from self.cold.bucket(bucket_key)
+        yield from self.hot.get(bucket_key, {}).items()
+
+    def add(self, bucket_key, seq, tupl, expires=None):
+        self.hot.setdefault(bucket_key, {})[seq] = tupl
+        if expires is not None:
+            heapq.heappush(self.leases, (expires, seq, bucket_key))
+        if self.memory is None:
+            return
+        self.touch(bucket_key)
+        self.used += footprint(tupl) + ENTRY
+        self.in_memory += 1
+        if self.policy == 'age':
+            heapq.heappush(self.order, (seq, bucket_key))
+            if len(self.order) > 2 * self.in_memory + 1024:
+                # mostly tuples that have been taken since
+                self.order = [(s, k) for k, bucket in self.hot.items() for s in bucket]
+                heapq.heapify(self.order)
+        if self.used > self.memory:
+            self.spill()
+
+    def remove(self, bucket_key, seq):
+        bucket = self.hot.get(bucket_key)
+        if bucket and seq in bucket:
+            tupl = bucket.pop(seq)
+            if not bucket:
+                del self.hot[bucket_key]
+            if self.memory is not None:
+                self.used -= footprint(tupl) + ENTRY
+                self.in_memory -= 1
+            return True
+        return self.cold is not None and self.cold.remove(bucket_key, seq)
+
+    def touch(self, bucket_key):
+        """Marks a shape as recently used"""
+        if self.memory is not None and self.policy == 'lru' and bucket_key in self.hot:
+            self.hot[bucket_key] = self.hot.pop(bucket_key)
+
+    def spill(self):
+        victims = []
+        excess = self.used - self.memory * LOW_WATER
+        for bucket_key, seq in self.coldest():
+            tupl = self.hot[bucket_key][seq]
+            excess -= footprint(tupl) + ENTRY
+            victims.append((bucket_key, seq, tupl))
+            if excess <= 0:
+                break
+        if not victims:
+            return
+
+        try:
+            if self.cold is None:
+                self.cold = SpillFile(self.path)
+            self.cold.extend(victims)
+        except BaseException:
+            # nothing was spilled, so the victims stay where they are
+            if self.policy == 'age':
+                for bucket_key, seq, _ in victims:
+                    heapq.heappush(self.order, (seq, bucket_key))
+            raise
+
+        for bucket_key, seq, tupl in victims:
+            bucket = self.hot[bucket_key]
+            del bucket[seq]
+            if not bucket:
+                del self.hot[bucket_key]
+            self.used -= footprint(tupl) + ENTRY
+            self.in_memory -= 1
+        self.spilled += len(victims)
+
+    def coldest(self):
+        """(bucket_key, seq) of the tuples in memory, coldest first"""
+        if self.policy == 'lru':
+            for bucket_key, bucket in self.hot.items():
+                for seq in bucket:
+                    yield bucket_key, seq
+            return
+        while self.order:
+            # entries for tuples taken since are skipped
+            seq, bucket_key = heapq.heappop(self.order)
+            if seq in self.hot.get(bucket_key, ()):
+                yield bucket_key, seq
+
+    def expire(self, now=None):
+        """Removes the tuples whose lease has run out"""
+        if not self.leases:
+            return
+        now = time.monotonic() if now is None else now
+        while self.leases and self.leases[0][0] <= now:
+            _, seq, bucket_key = heapq.heappop(self.leases)
+            if self.remove(bucket_key, seq):
+                self.expired += 1
+
+    def stats(self):
+        return {'memory': len(self) - len(self.cold or ()),
+                'spilled': len(self.cold or ()),
+                'used': self.used,
+                'spill_file': self.cold.size if self.cold else 0,
+                'expired': self.expired}
+
+    def close(self):
+        if self.cold is not None:
+            self.cold.close()
+            self.cold = None
@@ -5,16 +5,22 @@ import code
 import proxy
 import config
 
-config = config.read_config()
 
-ts_name      = config['name']
-adapter_host = config['adapter']['host']
-adapter_port = config['adapter']['port']
+def main():
+    conf = config.read_config()
 
-adapter_uri = f'http://{adapter_host}:{adapter_port}'
+    ts_name      = conf['name']
+    adapter_host = conf['adapter']['host']
+    adapter_port = conf['adapter']['port']
 
-ts = proxy.TupleSpaceAdapter(adapter_uri)
+    adapter_uri = f'http://{adapter_host}:{adapter_port}'
 
-print(f'Connected to tuplespace {ts_name} on {adapter_uri}')
+    ts = proxy.TupleSpaceAdapter(adapter_uri)
 
-code.interact(local=locals())
+    print(f'Connected to tuplespace {ts_name} on {adapter_uri}')
+
+    code.interact(local=locals())
+
+
+if __name__ == '__main__':
+    main()
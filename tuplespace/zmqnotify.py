@@ -0,0 +1,104 @@
+# zmqnotify.py
+
+# Receives tuplespace notifications published over ZeroMQ (see
+# zmqnotify.rb), with the same API as multicast.Receiver.
+#
+# Each message is a whole "name event payload" notification, followed
+# by its sequence number in a second frame. ZeroMQ subscriptions match
+# on prefixes of the first frame, so topics such as "alice " (every
+# event from alice) or "alice write " (only her writes) are filtered by
+# the socket itself and never reach Python.
+#
+#     receiver = zmqnotify.Receiver('tcp://localhost:5560', ['alice write '])
+#     for notification in receiver:
+#         print(notification)
+
+import zmq
+
+
+def whole_streams(topic):
+    """True if topic matches every notification of the "name event"
+    streams it matches at all, so that gaps in them can be counted
+
+    """
+    spaces = topic.count(' ')
+    return spaces < 2 or (spaces == 2 and topic.endswith(' '))
+
+
+class Receiver:
+    """Delivers notifications from a ZeroMQ publisher
+
+    A publisher drops messages for a subscriber whose queue is full,
+    unless it was configured with nodrop; rcvhwm bounds how many
+    messages are queued here. Dropped messages are not recovered, but
+    every "name event" stream is numbered by the publisher, so gaps are
+    counted as lost.
+
+    Topics narrower than a stream (such as 'alice write ["alice"')
+    skip numbers that were never meant for us, so with any of them,
+    losses can't be counted and stats() reports them as None.
+
+    As for multicast.Receiver, last_id is [stream, seq] while a
+    notification is handled.
+
+    """
+    OPTIONS = ('rcvhwm',)
+
+    def __init__(self, endpoint, topics=None, rcvhwm=None):
+        self.ctx = zmq.Context.instance()
+        self.sock = self.ctx.socket(zmq.SUB)
+        if rcvhwm:
+            self.sock.setsockopt(zmq.RCVHWM, rcvhwm)
+        self.sock.connect(endpoint)
+        self.uri = endpoint
+
+        topics = topics or ['']
+        for topic in topics:
+            self.sock.setsockopt_string(zmq.SUBSCRIBE, topic)
+
+        self.counting = all(whole_streams(topic) for topic in topics)
+        self.next_seq = {}      # "name event" -> next sequence number
+        self.last_id = None
+        self.delivered = 0
+        self.lost = 0
+
+    def __iter__(self):
+        while True:
+            frames = self.sock.recv_multipart()
+            notification = frames[0].decode()
+            self.last_id = None
+            if len(frames) > 1:
+                self.count(notification, int(frames[1]))
+            self.delivered += 1
+            yield notification
+
+    def count(self, notification, seq):
+        stream = ' '.join(notification.split(' ', 2)[:2])
+        expected = self.next_seq.get(stream)
+        # a lower number means the publisher restarted
+        if expected is not None and seq > expected:
+            self.lost += seq - expected
+        self.next_seq[stream] = seq + 1
+        self.last_id = [stream, seq]
+
+    def run(self, callback):
+        for notification in self:
+            callback(notification)
+
+    def close(self):
+        self.sock.close()
+
+    def stats(self):
+        # the same keys as multicast.Receiver.stats()
+        if self.counting:
+            expected = self.delivered + self.lost
+            lost, loss_rate = self.lost, self.lost / expected if expected else 0.0
+        else:
+            lost, loss_rate = None, None
+        return { "received": self.delivered,
+                 "delivered": self.delivered,
+                 "duplicates": 0,
+                 "nacked": 0,
+                 "lost": lost,
+                 "loss_rate": loss_rate
+        }
@@ -0,0 +1,64 @@
+require 'ffi-rzmq'
+
+# libzmq option number, for versions of ffi-rzmq that don't define it;
+# libzmq itself only has it from 4.1 on, see ZmqNotifier#initialize
+XPUB_NODROP = ZMQ.const_defined?(:XPUB_NODROP) ? ZMQ::XPUB_NODROP : 69
+
+# Publishes notifications on ZeroMQ PUB sockets, as an alternative to
+# multicast for the `notify` entries that have a `zmq` endpoint:
+#
+#   notify:
+#     - zmq: tcp://*:5560
+#       hwm: 1000
+#       nodrop: true
+#
+# Each notification is a single "name event payload" message, so
+# subscribers can filter by tuplespace ("alice ") or by tuplespace and
+# event ("alice write ") with a ZeroMQ subscription. Unlike a UDP
+# datagram, a message can be of any size.
+#
+# A second frame carries the notification's sequence number within its
+# "name event" stream, so that subscribers, which receive whole streams,
+# can count the messages they missed.
+#
+# `hwm` limits how many messages are queued for each slow subscriber.
+# Past it, ZeroMQ drops messages for that subscriber, unless `nodrop`
+# is set, in which case notify_all blocks until the subscriber catches
+# up.
+class ZmqNotifier
+  def initialize(addrs)
+    @context = ZMQ::Context.new
+    @seqs = Hash.new(0)
+    @socks = addrs.map do |dest|
+      sock = @context.socket(ZMQ::PUB)
+      sock.setsockopt(ZMQ::SNDHWM, dest['hwm']) if dest['hwm']
+      if dest['nodrop']
+        # a libzmq without the option would silently drop messages
+        rc = sock.setsockopt(XPUB_NODROP, 1)
+        unless ZMQ::Util.resultcode_ok?(rc)
+          raise "nodrop is not supported for #{dest['zmq']}: #{ZMQ::Util.error_string}"
+        end
+      end
+      sock.bind(dest['zmq'])
+      sock
+    end
+  end
+
+  def notify_all(notification, *)
+    stream = notification.split(' ', 3).first(2).join(' ')
+    seq = (@seqs[stream] += 1).to_s
+    @socks.each do |sock|
+      loop do
+        rc = sock.send_strings [notification, seq]
+        break if ZMQ::Util.resultcode_ok?(rc) || ZMQ::Util.errno != ZMQ::EAGAIN
+        # with nodrop, a full queue fails with EAGAIN instead of dropping
+        sleep 0.001
+      end
+    end
+  end
+
+  def close
+    @socks.each(&:close)
+    @context.terminate
+  end
+end
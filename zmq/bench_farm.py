@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+# bench_farm.py
+
+# Compares the makespan (time until the last result is in) of the
+# PUSH/PULL farm of farmer.py/worker.py with the credit-based broker of
+# taskfarm.py, when the work is skewed.
+#
+# Two kinds of skew are applied at once: job sizes follow a Pareto
+# distribution, so a few jobs are much longer than the rest, and the
+# first worker runs --slow times slower than the others. Jobs "run" by
+# sleeping, so the comparison holds on a single core.
+#
+#     $ ./bench_farm.py --jobs 200 --workers 4 --slow 4
+
+import argparse
+import multiprocessing
+import pickle
+import random
+import sys
+import time
+
+import zmq
+import taskfarm
+from const import *
+
+SINK_PORT = FARM_PORT + 1
+
+
+def workloads(args):
+    rng = random.Random(args.seed)
+    return [min(rng.paretovariate(1.5), 50) * args.unit for _ in range(args.jobs)]
+
+
+def speed(worker, args):
+    return args.slow if worker == 0 else 1
+
+
+# PUSH/PULL, as in farmer.py and worker.py, with results pushed to a sink
+# ----------------------------------------------------------------------
+
+def pushpull_worker(me, args):
+    context = zmq.Context()
+    r = context.socket(zmq.PULL)
+    r.connect(f"tcp://{HOST}:{PORT1}")
+    s = context.socket(zmq.PUSH)
+    s.connect(f"tcp://{HOST}:{SINK_PORT}")
+    while True:
+        job, workload = pickle.loads(r.recv())
+        time.sleep(workload * speed(me, args))
+        s.send(pickle.dumps(job))
+
+
+def pushpull(args):
+    context = zmq.Context()
+    s = context.socket(zmq.PUSH)
+    s.bind(f"tcp://{HOST}:{PORT1}")
+    sink = context.socket(zmq.PULL)
+    sink.bind(f"tcp://{HOST}:{SINK_PORT}")
+
+    workers = start(pushpull_worker, args)
+    time.sleep(1)                       # let every worker connect first
+
+    start_time = time.perf_counter()
+    for job, workload in enumerate(workloads(args)):
+        s.send(pickle.dumps((job, workload)))
+    for _ in range(args.jobs):
+        sink.recv()
+    makespan = time.perf_counter() - start_time
+
+    stop(workers)
+    s.close(linger=0)
+    sink.close(linger=0)
+    return makespan
+
+
+# credit-based broker, from taskfarm.py
+# ----------------------------------------------------------------------
+
+def run_broker():
+    taskfarm.Broker().serve()
+
+
+def broker_worker(me, args):
+    taskfarm.Worker(credit=args.credit).serve(
+        lambda workload: time.sleep(workload * speed(me, args)))
+
+
+def broker(args):
+    brokers = [multiprocessing.Process(target=run_broker, daemon=True)]
+    brokers[0].start()
+    workers = start(broker_worker, args)
+    farmer = taskfarm.Farmer()
+    time.sleep(1)
+
+    start_time = time.perf_counter()
+    farmer.map(workloads(args))
+    makespan = time.perf_counter() - start_time
+
+    stop(workers + brokers)
+    return makespan
+
+
+def start(target, args):
+    workers = [multiprocessing.Process(target=target, args=(me, args), daemon=True)
+               for me in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+def stop(processes):
+    for process in processes:
+        process.terminate()
+        process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-j', '--jobs', type=int, default=200)
+    parser.add_argument('-w', '--workers', type=int, default=4)
+    parser.add_argument('--slow', type=float, default=4,
+                        help='how many times slower the first worker is')
+    parser.add_argument('--credit', type=int, default=1,
+                        help='jobs each broker worker may hold at once')
+    parser.add_argument('--unit', type=float, default=0.005,
+                        help='seconds of work in a job of size 1')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    total = sum(workloads(args))
+    print(f'{args.jobs} jobs, {total:.2f} s of work, {args.workers} workers '
+          f'(one {args.slow:g}x slower)')
+
+    for name, bench in (('push/pull', pushpull), ('broker', broker)):
+        print(f'{name:>10}: makespan {bench(args):.2f} s')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
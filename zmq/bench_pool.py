@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+# bench_pool.py
+
+# Measures the throughput, in jobs/s and MB/s, of a single worker
+# process like worker.py (which unpickles every job it receives) and
+# of the worker pool in pool.py, with payloads from 100 B to 10 MB.
+#
+# The pool is run twice: once as it is, with large payloads handed to
+# workers through shared memory, and once forwarding every payload
+# over the local socket (--inline), to show what shared memory saves.
+#
+# Each job computes the CRC-32 of its payload and sends it to a sink;
+# a run ends when the sink has every result.
+#
+#     $ ./bench_pool.py --sizes 100 10000 1000000 10000000 --processes 4
+
+import argparse
+import multiprocessing
+import os
+import pickle
+import sys
+import time
+import zlib
+
+import zmq
+import pool
+from const import *
+
+SOURCE = f"tcp://{HOST}:{PORT1}"
+SINK = f"tcp://{HOST}:{FARM_PORT + 1}"
+
+
+def checksum(header, payload):
+    return zlib.crc32(payload)
+
+
+def run_single():
+    """One process, as in worker.py"""
+    context = zmq.Context()
+    r = context.socket(zmq.PULL)
+    r.connect(SOURCE)
+    s = context.socket(zmq.PUSH)
+    s.connect(SINK)
+    while True:
+        header, payload = pickle.loads(r.recv())
+        s.send(pickle.dumps(checksum(header, payload)))
+
+
+def run_pool(processes, inline_limit):
+    pool.Pool(checksum, processes, sources=[SOURCE], sink=SINK,
+              inline_limit=inline_limit).serve()
+
+
+def bench(target, args, size, jobs, pickled):
+    context = zmq.Context()
+    s = context.socket(zmq.PUSH)
+    s.bind(SOURCE)
+    sink = context.socket(zmq.PULL)
+    sink.bind(SINK)
+
+    process = multiprocessing.Process(target=target, args=args)
+    process.start()
+    time.sleep(1)                       # let it connect first
+
+    payload = os.urandom(size)
+    start_time = time.perf_counter()
+    for job in range(jobs):
+        if pickled:
+            s.send(pickle.dumps((job, payload)))
+        else:
+            pool.send_job(s, job, payload, copy=False)
+    for _ in range(jobs):
+        sink.recv()
+    elapsed = time.perf_counter() - start_time
+
+    process.terminate()
+    process.join()
+    s.close(linger=0)
+    sink.close(linger=0)
+    context.term()
+    return jobs / elapsed, jobs * size / elapsed / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--sizes', type=int, nargs='+',
+                        default=[100, 10_000, 1_000_000, 10_000_000])
+    parser.add_argument('-p', '--processes', type=int, default=os.cpu_count())
+    parser.add_argument('-j', '--jobs', type=int, default=5000,
+                        help='jobs per run, fewer for large payloads')
+    parser.add_argument('-m', '--megabytes', type=int, default=500,
+                        help='data sent per run, at most')
+    args = parser.parse_args()
+
+    modes = (('single', run_single, (), True),
+             ('pool', run_pool, (args.processes, pool.INLINE_LIMIT), False),
+             ('pool --inline', run_pool, (args.processes, sys.maxsize), False))
+
+    print(f'{args.processes} processes in the pool')
+    for size in args.sizes:
+        jobs = max(10, min(args.jobs, args.megabytes * 1_000_000 // size))
+        for name, target, target_args, pickled in modes:
+            rate, throughput = bench(target, target_args, size, jobs, pickled)
+            print(f'{size:>10} B {name:>14}: {rate:9.1f} jobs/s {throughput:9.1f} MB/s')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
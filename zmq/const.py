@@ -1,3 +1,4 @@
 SRC1 = SRC2 = HOST  = '127.0.0.1'
 PORT1 = PORT = 50007
 PORT2 = 50008
+FARM_PORT = 50009
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+
+# pool.py
+
+# Runs a pool of worker processes (one per core by default) in place of
+# a single worker.py.
+#
+# The supervisor pulls jobs from the task sources, just like worker.py,
+# and deals them out over a local ROUTER socket (ipc://) to whichever
+# worker process has room, the one with the fewest jobs first. Each
+# worker is sent at most DEPTH jobs ahead, so it has the next one at
+# hand when it finishes, but jobs don't pile up behind a busy process
+# while others are idle. The supervisor only takes a job from the
+# sources when a worker has room for it.
+#
+# Frames are received with copy=False. Small payloads are forwarded to
+# the worker as the same zmq.Frame, without copying them into Python.
+# Larger ones are written once into one of the shared memory segments
+# belonging to that worker (one per job it may hold), which the worker
+# reads in place: it is handed a memoryview, so nothing is unpickled or
+# copied on its side. A segment grows (to the next power of two) when
+# a payload doesn't fit.
+#
+# A job is either a single pickled frame (source, workload), as sent
+# by farmer.py, or two frames: a pickled header, and the payload as
+# raw bytes (see send_job).
+#
+# A job whose handler raises is finished all the same: its result is a
+# RuntimeError with the traceback. A worker process that dies anyway
+# is started again; the jobs it held are lost, and counted in lost.
+# The new process takes over the identity of the old one, but not its
+# generation, which every message carries, so that a DONE the old one
+# sent just before it died can't free a slot the new one is using.
+#
+#     $ ./pool.py NAME [PROCESSES]
+#
+# Messages between the supervisor and its workers:
+#
+#     worker -> supervisor   READY generation        at startup
+#                            DONE generation result  after each job
+#     supervisor -> worker   JOB header INLINE payload
+#                            JOB header SHM slot name size
+
+import collections
+import multiprocessing
+import os
+import pickle
+import signal
+import sys
+import tempfile
+import time
+import traceback
+from multiprocessing import shared_memory
+
+import zmq
+from const import *
+
+INLINE_LIMIT = 64 * 1024        # payloads up to this size are forwarded as they are
+MIN_SEGMENT = 1024 * 1024
+DEPTH = 2                       # jobs sent to a worker before it finishes the first
+
+
+def send_job(sock, header, payload=b'', copy=True):
+    """Sends a job as a pickled header and a raw payload"""
+    sock.send_multipart([pickle.dumps(header), payload], copy=copy)
+
+
+def pretend_to_work(header, payload):
+    """What worker.py does with a job"""
+    source, workload = header
+    print(f'{os.getpid()} received {workload} ({len(payload)} bytes) from {source}')
+    time.sleep(workload * 0.01)
+
+
+class Pool:
+    """Supervises worker processes behind a local ZeroMQ device"""
+
+    def __init__(self, handler=pretend_to_work, processes=None,
+                 sources=(f"tcp://{SRC1}:{PORT1}", f"tcp://{SRC2}:{PORT2}"),
+                 sink=None, inline_limit=INLINE_LIMIT, depth=DEPTH):
+        self.handler = handler
+        self.processes = processes or os.cpu_count()
+        self.inline_limit = inline_limit
+        self.depth = depth
+
+        context = zmq.Context.instance()
+        self.frontend = context.socket(zmq.PULL)
+        for source in sources:
+            self.frontend.connect(source)
+
+        self.backend = context.socket(zmq.ROUTER)
+        self.backend_address = f"ipc://{tempfile.gettempdir()}/pool-{os.getpid()}"
+        self.backend.bind(self.backend_address)
+
+        self.sink = None
+        if sink:
+            self.sink = context.socket(zmq.PUSH)
+            self.sink.connect(sink)
+
+        self.workers = {}       # worker identity -> Process
+        self.generations = {}   # worker identity -> times its process was started
+        self.segments = {}      # worker identity -> a SharedMemory per slot
+        self.in_use = {}        # worker identity -> slots of the jobs it was sent
+        self.idle = {}          # worker identity -> slots free for another job, once READY
+        self.room = 0           # free slots, over all workers
+        self.done = 0
+        self.lost = 0           # jobs held by workers that died
+        self.restarted = 0
+
+    def start(self):
+        for me in range(self.processes):
+            identity = f'worker-{me}'.encode()
+            # created before forking, so workers share our resource tracker
+            self.segments[identity] = [shared_memory.SharedMemory(create=True, size=MIN_SEGMENT)
+                                       for _ in range(self.depth)]
+            self.in_use[identity] = collections.deque()
+            self.spawn(identity)
+
+    def spawn(self, identity):
+        generation = self.generations[identity] = self.generations.get(identity, 0) + 1
+        worker = multiprocessing.Process(
+            target=run_worker,
+            args=(self.backend_address, identity, generation, self.handler),
+            daemon=True)
+        worker.start()
+        self.workers[identity] = worker
+
+    def restart(self, identity):
+        """Replaces a worker process that died, giving up its jobs"""
+        self.workers[identity].join()
+        self.lost += len(self.in_use[identity])
+        self.in_use[identity].clear()
+        self.room -= len(self.idle.pop(identity, ()))
+        self.restarted += 1
+        self.spawn(identity)
+
+    def serve(self):
+        # stop the workers and free the shared memory when terminated
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        self.start()
+        poller = zmq.Poller()
+        poller.register(self.backend, zmq.POLLIN)
+        poller.register(self.frontend, zmq.POLLIN)
+        for worker in self.workers.values():
+            poller.register(worker.sentinel, zmq.POLLIN)
+        try:
+            while True:
+                # only take jobs when someone is free to run them
+                poller.modify(self.frontend, zmq.POLLIN if self.room else 0)
+                events = dict(poller.poll())
+
+                while True:
+                    try:
+                        self.handle_worker(self.backend.recv_multipart(zmq.NOBLOCK, copy=False))
+                    except zmq.Again:
+                        break
+                for identity, worker in list(self.workers.items()):
+                    if worker.sentinel in events:
+                        poller.unregister(worker.sentinel)
+                        self.restart(identity)
+                        poller.register(self.workers[identity].sentinel, zmq.POLLIN)
+                while self.room:
+                    try:
+                        self.dispatch(self.frontend.recv_multipart(zmq.NOBLOCK, copy=False))
+                    except zmq.Again:
+                        break
+        finally:
+            self.close()
+
+    def handle_worker(self, frames):
+        identity, kind, generation, *fields = frames
+        identity = identity.bytes
+        if int(generation.bytes) != self.generations[identity]:
+            # sent by a process that has been restarted since; its jobs
+            # were counted as lost
+            return
+
+        if kind.bytes == b'READY':
+            self.idle[identity] = collections.deque(range(self.depth))
+            self.room += self.depth
+            return
+
+        # each worker runs its jobs in the order they were sent
+        slot = self.in_use[identity].popleft()
+        self.idle[identity].append(slot)
+        self.room += 1
+        self.done += 1
+        if self.sink:
+            self.sink.send(fields[0], copy=False)
+
+    def dispatch(self, frames):
+        if len(frames) == 1:
+            header, payload = frames[0], zmq.Frame(b'')
+        else:
+            header, payload = frames
+
+        # the least loaded worker, so a burst is spread over all of them
+        identity = min((identity for identity, slots in self.idle.items() if slots),
+                       key=lambda identity: len(self.in_use[identity]))
+        slot = self.idle[identity].popleft()
+        self.room -= 1
+        self.in_use[identity].append(slot)
+        size = len(payload.buffer)
+        if size <= self.inline_limit:
+            self.backend.send_multipart([identity, b'JOB', header, b'INLINE', payload],
+                                        copy=False)
+            return
+
+        segment = self.segments[identity][slot]
+        if segment.size < size:
+            segment = self.grow(identity, slot, size)
+        segment.buf[:size] = payload.buffer
+        self.backend.send_multipart([identity, b'JOB', header, b'SHM', str(slot).encode(),
+                                     segment.name.encode(), str(size).encode()])
+
+    def grow(self, identity, slot, size):
+        old = self.segments[identity][slot]
+        old.close()
+        old.unlink()
+        new_size = 1 << (size - 1).bit_length()
+        new = self.segments[identity][slot] = shared_memory.SharedMemory(create=True,
+                                                                         size=new_size)
+        return new
+
+    def close(self):
+        for worker in self.workers.values():
+            worker.terminate()
+            worker.join()
+        for segments in self.segments.values():
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+        self.segments = {}
+
+
+def run_worker(address, identity, generation, handler):
+    generation = str(generation).encode()
+    sock = zmq.Context().socket(zmq.DEALER)
+    sock.setsockopt(zmq.IDENTITY, identity)
+    sock.connect(address)
+    sock.send_multipart([b'READY', generation])
+
+    segments = {}               # slot -> SharedMemory
+    while True:
+        _, header, where, *fields = sock.recv_multipart(copy=False)
+        header = pickle.loads(header.buffer)
+
+        if where.bytes == b'INLINE':
+            payload = fields[0].buffer
+        else:
+            slot, name, size = fields[0].bytes, fields[1].bytes.decode(), int(fields[2].bytes)
+            segment = segments.get(slot)
+            if segment is None or segment.name != name:
+                # new, or grown since we last used it
+                if segment:
+                    segment.close()
+                segment = segments[slot] = shared_memory.SharedMemory(name)
+            payload = segment.buf[:size]
+
+        try:
+            result = pickle.dumps(handler(header, payload))
+        except Exception:
+            # the job failed, not the worker
+            result = pickle.dumps(RuntimeError(traceback.format_exc()))
+        payload.release()
+
+        sock.send_multipart([b'DONE', generation, result])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(f'Usage: {sys.argv[0]} NAME [PROCESSES]', file=sys.stderr)
+        sys.exit(1)
+
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    pool = Pool(processes=processes)
+    print(f'{sys.argv[1]} started with {pool.processes} processes')
+    pool.serve()
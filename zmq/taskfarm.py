@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+# taskfarm.py
+
+# A task farm in which workers pull their jobs, instead of having them
+# pushed round-robin (see farmer.py and worker.py).
+#
+# Farmers _out jobs and _in their results; workers _in jobs and _out
+# results, like processes sharing a tuplespace. A broker sits between
+# them. Each worker gives the broker credit for a few jobs at a time
+# (READY n) and earns one back with every result, so the broker only
+# hands a job to a worker with room for it. Fast workers come back for
+# more sooner, and a slow worker never builds up a backlog that idle
+# workers could have taken.
+#
+# If a job's result doesn't come back before its timeout, the broker
+# puts it back at the head of the queue for another worker, and takes
+# away the credit of the worker that held it, which may be dead: it
+# gets no more jobs until it returns a result, which gives it back all
+# the credit it had not used. Whichever result arrives first is passed
+# on; a later one is dropped, as is a result for a farmer that has
+# disconnected. A job sent to a worker that has disconnected is queued
+# again at once.
+#
+#     $ ./taskfarm.py broker
+#
+#     farmer = taskfarm.Farmer()
+#     results = farmer.map([1, 2, 3], timeout=10)
+#
+#     taskfarm.Worker(credit=2).serve(lambda workload: workload * 2)
+#
+# Messages are multipart: a kind (JOB, READY or RESULT), then its
+# fields. Payloads and results are pickled.
+
+import collections
+import itertools
+import pickle
+import sys
+import time
+
+import zmq
+from const import *
+
+FARM_ADDRESS = f"tcp://{HOST}:{FARM_PORT}"
+
+
+class Broker:
+    """Queues jobs from farmers and deals them to workers with credit"""
+
+    def __init__(self, address=FARM_ADDRESS, timeout=None):
+        self.sock = zmq.Context.instance().socket(zmq.ROUTER)
+        # fail, rather than silently drop, sends to a worker that is gone
+        self.sock.setsockopt(zmq.ROUTER_MANDATORY, 1)
+        self.sock.bind(address)
+        self.timeout = timeout          # default per-job timeout, or None
+
+        self.key = itertools.count()
+        self.queue = collections.deque()  # keys of jobs waiting for a worker
+        self.jobs = {}                  # key -> (farmer, job id, payload, timeout)
+        self.running = {}               # key -> deadline, for jobs with a timeout
+        self.assigned = {}              # key -> worker, for jobs sent out
+        self.credits = {}               # worker -> jobs it will still accept
+        self.granted = {}               # worker -> credit it gave with READY
+        self.stalled = set()            # workers whose jobs timed out
+
+        self.redispatched = 0
+        self.undeliverable = 0          # results whose farmer had gone
+
+    def serve(self):
+        while True:
+            timeout = None
+            if self.running:
+                timeout = max(0, min(self.running.values()) - time.monotonic()) * 1000
+            if self.sock.poll(timeout):
+                while True:
+                    try:
+                        frames = self.sock.recv_multipart(zmq.NOBLOCK)
+                    except zmq.Again:
+                        break
+                    self.handle(frames)
+            self.expire()
+            self.dispatch()
+
+    def handle(self, frames):
+        sender, kind, *fields = frames
+
+        if kind == b"JOB":
+            job_id, payload, timeout = fields
+            timeout = float(timeout) if timeout else self.timeout
+            key = next(self.key)
+            self.jobs[key] = (sender, job_id, payload, timeout)
+            self.queue.append(key)
+
+        elif kind == b"READY":
+            self.credits[sender] = self.credits.get(sender, 0) + int(fields[0])
+            self.granted[sender] = self.granted.get(sender, 0) + int(fields[0])
+
+        elif kind == b"RESULT":
+            key, result = int(fields[0]), fields[1]
+            self.running.pop(key, None)
+            self.assigned.pop(key, None)
+            if sender in self.stalled:
+                # back from the dead, with room for all but the jobs it
+                # still holds
+                self.stalled.discard(sender)
+                held = sum(1 for worker in self.assigned.values() if worker == sender)
+                self.credits[sender] = max(0, self.granted.get(sender, 0) - held)
+            else:
+                # a late result for a job that timed out was already
+                # counted when its worker came back
+                self.credits[sender] = min(self.credits.get(sender, 0) + 1,
+                                           self.granted.get(sender, 0))
+            job = self.jobs.pop(key, None)
+            if job:
+                farmer, job_id, _, _ = job
+                try:
+                    self.sock.send_multipart([farmer, b"RESULT", job_id, result])
+                except zmq.ZMQError:
+                    # EHOSTUNREACH: the farmer has gone, and nobody
+                    # else wants its result
+                    self.undeliverable += 1
+
+    def dispatch(self):
+        while self.queue:
+            # the worker with the most room left gets the next job
+            worker = max(self.credits, key=self.credits.get, default=None)
+            if worker is None or self.credits[worker] == 0:
+                return
+
+            key = self.queue.popleft()
+            if key not in self.jobs:
+                continue  # finished while waiting to be dispatched again
+
+            _, _, payload, timeout = self.jobs[key]
+            try:
+                self.sock.send_multipart([worker, b"JOB", str(key).encode(), payload])
+            except zmq.ZMQError:
+                # EHOSTUNREACH: the worker has gone, and its credit with it
+                del self.credits[worker]
+                self.granted.pop(worker, None)
+                self.stalled.discard(worker)
+                self.queue.appendleft(key)
+                continue
+            self.credits[worker] -= 1
+            self.assigned[key] = worker
+            if timeout:
+                self.running[key] = time.monotonic() + timeout
+
+    def expire(self):
+        now = time.monotonic()
+        for key, deadline in list(self.running.items()):
+            if deadline <= now:
+                # the worker may be dead: send it nothing more until it
+                # returns a result, which restores its credit
+                del self.running[key]
+                worker = self.assigned.pop(key, None)
+                if worker in self.credits:
+                    self.credits[worker] = 0
+                    self.stalled.add(worker)
+                self.queue.appendleft(key)
+                self.redispatched += 1
+
+
+class Farmer:
+    """Submits jobs to the broker and collects their results"""
+
+    def __init__(self, address=FARM_ADDRESS):
+        self.sock = zmq.Context.instance().socket(zmq.DEALER)
+        self.sock.connect(address)
+        self.ids = itertools.count()
+        self.unclaimed = collections.deque()  # results received by map() for other jobs
+
+    def _out(self, payload, timeout=None):
+        """Submits a job, returning its id"""
+        job_id = next(self.ids)
+        self.sock.send_multipart([b"JOB", str(job_id).encode(), pickle.dumps(payload),
+                                  str(timeout).encode() if timeout else b""])
+        return job_id
+
+    def _in(self):
+        """Waits for the next result, returning (job id, result)"""
+        if self.unclaimed:
+            return self.unclaimed.popleft()
+        return self.receive()
+
+    def receive(self):
+        _, job_id, result = self.sock.recv_multipart()
+        return int(job_id), pickle.loads(result)
+
+    def map(self, payloads, timeout=None):
+        """Farms out every payload, returning their results in order"""
+        ids = [self._out(payload, timeout) for payload in payloads]
+        wanted = set(ids)
+        results = {}
+        while len(results) < len(ids):
+            job_id, result = self.receive()
+            if job_id in wanted:
+                results[job_id] = result
+            else:
+                self.unclaimed.append((job_id, result))
+        return [results[job_id] for job_id in ids]
+
+
+class Worker:
+    """Takes jobs from the broker, credit jobs at a time"""
+
+    def __init__(self, address=FARM_ADDRESS, credit=1):
+        self.sock = zmq.Context.instance().socket(zmq.DEALER)
+        self.sock.connect(address)
+        self.sock.send_multipart([b"READY", str(credit).encode()])
+
+    def _in(self):
+        """Waits for a job, returning (key, payload)"""
+        _, key, payload = self.sock.recv_multipart()
+        return key, pickle.loads(payload)
+
+    def _out(self, key, result):
+        """Returns the result of the job with the given key"""
+        self.sock.send_multipart([b"RESULT", key, pickle.dumps(result)])
+
+    def serve(self, function):
+        while True:
+            key, payload = self._in()
+            self._out(key, function(payload))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'broker':
+        print(f'Usage: {sys.argv[0]} broker [TIMEOUT]', file=sys.stderr)
+        sys.exit(1)
+
+    timeout = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    Broker(timeout=timeout).serve()